@@ -9,6 +9,13 @@ __version__ = '1.0'
 __all__ = ['mate', 'microscope', 'utils']
 name = "nOmicron"
 
-from .mate import *
-from .microscope import *
-from .utils import *
+import importlib as _importlib
+
+
+def __getattr__(name):
+    # Subpackages are imported on first use, so that importing nOmicron does not load MATE or talk to the hardware
+    if name in __all__:
+        return _importlib.import_module('.' + name, __name__)
+    if name in ('MATE', 'objects'):
+        return getattr(_importlib.import_module('.mate', __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
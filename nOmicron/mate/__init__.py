@@ -10,4 +10,12 @@ __version__ = '1.0'
 
 __all__ = ['MATE','objects']
 
-from .mate import *
+import importlib as _importlib
+
+
+def __getattr__(name):
+    # objects creates the MATE instance, so is only imported when asked for
+    if name in __all__:
+        module = _importlib.import_module('.' + name.lower(), __name__)
+        return getattr(module, name) if name == 'MATE' else module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,199 @@
+# Oliver Gordon, 2019
+
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+from nOmicron.mate import objects as mo
+from nOmicron.utils.errors import MatrixUnexpectedResponseError
+
+Packet = namedtuple('Packet', ['name', 'index', 'timestamp', 'data'])
+
+
+class AcquisitionEngine(object):
+    """
+    Pumps Matrix events on a background thread, copying the data of each into a preallocated buffer, and hands the
+    packets to a consumer function on a second thread. A slow consumer then only makes the queue of packets longer,
+    rather than holding up the next event.
+
+    Register the events to capture with engine.capture as their callback, in place of a function that reads
+    mo.sample_data(). Buffers are reused once the consumer returns, so the consumer must copy packet.data if it keeps it.
+
+    Parameters
+    ----------
+    consumer : function
+        Called as consumer(packet) on the consumer thread for each packet, in order of arrival
+    samples : int
+        Number of samples in each buffer, normally the points per line or per spectrum
+    depth : int, optional
+        Number of buffers to preallocate, i.e. how many packets can be queued before the queue is full. Default is 64
+    on_full : str, optional
+        What the pump does when every buffer is queued: 'block' to wait for the consumer, leaving events queued in the
+        Matrix (default), 'drop' to discard the packet, or 'grow' to allocate another buffer, which leaves the queue
+        unbounded
+
+    Examples
+    --------
+    Process each line of a scan while the next is being acquired
+    >>> from nOmicron.mate.acquisition import AcquisitionEngine
+    >>> lines = []
+    >>> with AcquisitionEngine(lambda packet: lines.append(packet.data.copy()), mo.xy_scanner.Points()) as engine:
+    >>>     mo.view.Data(engine.capture)
+    >>>     mo.experiment.start()
+    >>>     engine.wait_for(256)
+    >>> mo.view.Data()
+    >>> engine.stats()
+    """
+
+    on_full_modes = ('grow', 'block', 'drop')
+
+    def __init__(self, consumer, samples, depth=64, on_full='block'):
+        if on_full not in self.on_full_modes:
+            raise ValueError(f"Unknown on_full '{on_full}', must be one of {self.on_full_modes}")
+        self.consumer = consumer
+        self.samples = samples
+        self.on_full = on_full
+        self.free = deque(np.empty(samples) for i in range(depth))
+        self.ready = deque()
+        self.ready_event = threading.Event()
+        self.free_event = threading.Event()
+        self.running = False
+        self.error = None
+        self.threads = []
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.grown = 0
+        self.max_queued = 0
+        self.blocked_time = 0.0
+
+    def stats(self):
+        """Backpressure counters since the last reset_counters(), as a dict."""
+        return dict(received=self.received, delivered=self.delivered, queued=len(self.ready), dropped=self.dropped,
+                    grown=self.grown, max_queued=self.max_queued, blocked_time=self.blocked_time)
+
+    def capture(self):
+        """Event callback, run on the pump thread: copies the data of the event just delivered into a free buffer and
+        queues it for the consumer."""
+        name = mo.event_out[0][len(mo.mate.scope) + 2:]
+        length = mo.event_out[2][0].values[0].realArray[0][0].length
+        buffer = self._free_buffer(length)
+        if buffer is None:
+            self.dropped += 1
+            return
+        data = buffer[:length]
+        data[:] = mo.sample_data(length)
+        self.ready.append(Packet(name, self.received, time.time(), data))
+        self.received += 1
+        self.max_queued = max(self.max_queued, len(self.ready))
+        self.ready_event.set()
+
+    def _free_buffer(self, length):
+        try:
+            buffer = self.free.popleft()
+        except IndexError:
+            if self.on_full == 'drop':
+                return None
+            if self.on_full == 'grow':
+                self.grown += 1
+                buffer = np.empty(max(self.samples, length))
+            else:
+                t = time.perf_counter()
+                while True:
+                    self.free_event.clear()
+                    if self.free or not self.running:
+                        break
+                    self.free_event.wait(0.1)
+                self.blocked_time += time.perf_counter() - t
+                if not self.free:
+                    return None
+                buffer = self.free.popleft()
+        if buffer.size < length:
+            self.grown += 1
+            buffer = np.empty(length)
+        return buffer
+
+    def _pump(self):
+        try:
+            while self.running and mo.mate.rc == mo.mate.rcs['RMT_SUCCESS']:
+                mo.event_wait.wait(until=lambda: not self.running)
+            if mo.mate.rc != mo.mate.rcs['RMT_SUCCESS']:
+                self.error = mo.mate.rc
+        except Exception as e:
+            self.error = e
+        self.running = False
+        self.ready_event.set()
+
+    def _consume(self):
+        while True:
+            self.ready_event.clear()
+            if self.ready:
+                packet = self.ready.popleft()
+                try:
+                    self.consumer(packet)
+                except Exception as e:
+                    self.error = e
+                    self.running = False
+                self.delivered += 1
+                self.free.append(packet.data.base if packet.data.base is not None else packet.data)
+                self.free_event.set()
+            elif not self.running and not self.threads[0].is_alive():
+                break
+            else:
+                self.ready_event.wait(0.1)
+
+    def start(self):
+        """Start the pump and consumer threads."""
+        self.running = True
+        self.error = None
+        self.threads = [threading.Thread(target=self._pump, name='nOmicron event pump', daemon=True),
+                        threading.Thread(target=self._consume, name='nOmicron packet consumer', daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """Stop pumping events, then wait for the consumer to finish the packets already queued. Raises any error from
+        either thread, including the Matrix returning a failing rc while pumping."""
+        self.running = False
+        self.free_event.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if isinstance(self.error, Exception):
+            raise self.error
+        if self.error is not None:
+            raise mo.mate.rc_errors.get(self.error, MatrixUnexpectedResponseError)
+
+    def wait_for(self, packets, timeout=None):
+        """
+        Block until a number of packets have been delivered to the consumer, or the engine stops.
+
+        Parameters
+        ----------
+        packets : int
+        timeout : float or None, optional
+            Seconds to wait at most. Default is None, to wait indefinitely
+
+        Returns
+        -------
+        done : bool
+            If all packets were delivered
+        """
+        end = None if timeout is None else time.perf_counter() + timeout
+        while self.delivered < packets and (self.running or self.ready):
+            if end is not None and time.perf_counter() > end:
+                break
+            time.sleep(1e-3)
+        return self.delivered >= packets
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
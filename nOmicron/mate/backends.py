@@ -0,0 +1,437 @@
+# Oliver Gordon, 2019
+
+"""
+Transports between MATE and the Matrix. MATE makes every call through a backend, which has the functions of
+RemoteAccess_API.dll with the same ctypes arguments, and is chosen when connecting:
+
+- CtypesBackend: the library itself, as loaded from the Matrix installation. Windows only, and the default
+- FakeBackend: the simulated Matrix of nOmicron.mate.simulator, in process, on any platform
+- RecordBackend: another backend, logging every call and what came back to a file
+- ReplayBackend: answers the calls from a file written by RecordBackend, on any platform
+
+Every backend times its calls with the shared CostModel, costs, when enabled, so the overhead of the hot path can be
+compared between them.
+
+Examples
+--------
+Record a session on the instrument, then replay it off the instrument
+>>> IO.connect(backend=RecordBackend('ctypes', "session.jsonl"))
+>>> ...
+>>> IO.connect(backend=ReplayBackend("session.jsonl"))
+
+Compare the cost of each library function on two backends
+>>> costs.enabled = True
+>>> IO.connect(backend='fake')
+>>> ...
+>>> costs.stats()
+"""
+
+import abc
+import ctypes
+import json
+import os
+import shutil
+import tempfile
+import time
+import weakref
+
+import numpy as np
+
+from nOmicron.utils.errors import MatrixReplayMismatchError
+
+RMT_NOEVENT = 0x00000020 | 0x00000003
+
+_Reference = type(ctypes.byref(ctypes.c_int()))
+
+# Where MATE reads experiment definitions from, relative to each of the Matrix paths
+_definition_directories = dict(experiments_directory=(),
+                               installation_directory=('Templates', 'default', 'Experiments'))
+
+
+class CostModel(object):
+    """
+    Number of calls to, and seconds spent in, each library function, over all backends.
+
+    Attributes
+    ----------
+    enabled : bool
+        Time every call. Off by default, as timing adds to the cost of each call
+    latency : dict
+        Seconds to add to each call of a function, as {function: seconds}, or {None: seconds} for every function, on
+        backends that do not reach the Matrix (fake and replay), to model the cost of the real library. Assign a new
+        dict for a change to take effect on backends already in use
+    """
+
+    def __init__(self):
+        self.backends = weakref.WeakSet()
+        self._enabled = False
+        self._latency = {}
+        self.reset()
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, enabled):
+        self._enabled = enabled
+        self._rebind()
+
+    @property
+    def latency(self):
+        return self._latency
+
+    @latency.setter
+    def latency(self, latency):
+        self._latency = latency
+        self._rebind()
+
+    def _rebind(self):
+        # Backends bind each function once, timed or not, so must bind again to follow the change
+        for backend in list(self.backends):
+            backend._unbind()
+
+    def reset(self):
+        self.calls = {}
+        self.seconds = {}
+
+    def add(self, name, seconds):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def delay(self, name):
+        """The modelled latency of a function, in seconds."""
+        return self.latency.get(name, self.latency.get(None, 0.0))
+
+    def stats(self):
+        """Per function, the calls, total seconds and mean seconds per call since the last reset(), as a dict."""
+        return {name: dict(calls=calls, seconds=self.seconds[name], mean=self.seconds[name] / calls)
+                for name, calls in self.calls.items()}
+
+
+costs = CostModel()
+
+
+class Backend(abc.ABC):
+    """
+    The functions of the library, looked up on the object loaded by open(), and timed with costs when enabled. Each
+    function is looked up and wrapped once, on its first call, and then called directly.
+
+    Attributes
+    ----------
+    paths : dict or None
+        The Matrix paths to connect with, as from MATE.discover, or None if they must be discovered
+    simulated : bool
+        If calls do not reach the Matrix, so have costs.latency added
+    """
+
+    name = ''
+    paths = None
+    simulated = False
+
+    def __init__(self):
+        self.library = None
+        self._bound = set()
+
+    @abc.abstractmethod
+    def open(self, paths):
+        """Load the library for a set of Matrix paths, raising OSError if it cannot be loaded."""
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('_') or self.__dict__.get('library') is None:
+            raise AttributeError(name)
+        function = self._timed(name, self._function(name))
+        self.__dict__[name] = function
+        self._bound.add(name)
+        costs.backends.add(self)
+        return function
+
+    def _function(self, name):
+        """The library function to call."""
+        return getattr(self.library, name)
+
+    def _unbind(self):
+        """Forget the functions bound so far, e.g. when the library is (re)loaded."""
+        for name in self._bound:
+            self.__dict__.pop(name, None)
+        self._bound.clear()
+
+    def _timed(self, name, function):
+        """The function as is, or timed and delayed as set in costs."""
+        delay = costs.delay(name) if self.simulated else 0.0
+        if not costs.enabled and not delay:
+            return function
+
+        def timed(*args):
+            t = time.perf_counter()
+            rc = function(*args)
+            if delay:
+                # Spin rather than sleep, as sleeps are far coarser than a library call
+                while time.perf_counter() - t < delay:
+                    pass
+            if costs.enabled:
+                costs.add(name, time.perf_counter() - t)
+            return rc
+        return timed
+
+
+class CtypesBackend(Backend):
+    """RemoteAccess_API.dll, through ctypes. Only loads on Windows, with the Matrix installed."""
+
+    name = 'ctypes'
+
+    def open(self, paths):
+        self._unbind()
+        self.library = ctypes.cdll.LoadLibrary(paths['library_path'])
+        self.library.setHost(b'localhost')
+
+
+class FakeBackend(Backend):
+    """
+    The simulated Matrix, in process.
+
+    Parameters
+    ----------
+    simulator : Simulator or None, optional
+        Default is None, for Simulator()
+    """
+
+    name = 'fake'
+    simulated = True
+
+    def __init__(self, simulator=None):
+        super().__init__()
+        if simulator is None:
+            from nOmicron.mate.simulator import Simulator
+            simulator = Simulator()
+        self.simulator = simulator
+        self.paths = simulator.paths
+
+    def open(self, paths):
+        self._unbind()
+        self.library = self.simulator
+        self.library.setHost(b'localhost')
+
+
+# What the library writes to the arguments passed by reference, as saved by RecordBackend and restored by
+# ReplayBackend. Simple values and strings are saved whole, flat values by field or as their array of reals
+
+def _dump(arg):
+    if not isinstance(arg, _Reference):
+        if isinstance(arg, bytes):
+            return arg.decode('latin-1')
+        if isinstance(arg, ctypes._SimpleCData):
+            return arg.value
+        return arg if isinstance(arg, (int, float)) else None
+    obj = arg._obj
+    if isinstance(obj, ctypes._SimpleCData):
+        return obj.value.decode('latin-1') if isinstance(obj.value, bytes) else obj.value
+    if isinstance(obj, ctypes._Pointer) and hasattr(obj.contents, 'text'):
+        return obj.contents.text[:obj.contents.length].decode('latin-1')
+    if isinstance(obj, ctypes._Pointer) and hasattr(obj.contents, 'values'):
+        real_array = obj.contents.values[0].realArray[0][0]
+        return np.ctypeslib.as_array(real_array.values)[:real_array.length].tolist()
+    if hasattr(obj, 'pairX'):
+        return dict(type=obj.type, boolean=obj.boolean, integer=obj.integer, enumeration=obj.enumeration,
+                    real=obj.real, pairX=obj.pairX, pairY=obj.pairY)
+    return None
+
+
+def _load(arg, value):
+    if value is None or not isinstance(arg, _Reference):
+        return
+    obj = arg._obj
+    if isinstance(obj, ctypes._SimpleCData):
+        obj.value = value.encode('latin-1') if isinstance(obj.value, bytes) else value
+    elif isinstance(obj, ctypes._Pointer) and hasattr(obj.contents, 'text'):
+        obj.contents.text = value.encode('latin-1')
+        obj.contents.length = len(value)
+    elif isinstance(obj, ctypes._Pointer) and hasattr(obj.contents, 'values'):
+        real_array = obj.contents.values[0].realArray[0][0]
+        n = min(len(value), len(real_array.values))
+        np.ctypeslib.as_array(real_array.values)[:n] = value[:n]
+        real_array.length = n
+    elif hasattr(obj, 'pairX'):
+        for field, v in value.items():
+            setattr(obj, field, v)
+
+
+def _experiment_files(paths):
+    """The experiment definitions that MATE reads, as {Matrix path: {file name: (text, mtime)}}."""
+    files = {}
+    for key, sub_path in _definition_directories.items():
+        directory = os.path.join(paths[key], *sub_path)
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith(('.expd', '.exps'))]
+        except OSError:
+            continue
+        files[key] = {}
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, encoding='utf-8', errors='replace') as f:
+                files[key][name] = (f.read(), os.path.getmtime(path))
+    return files
+
+
+class RecordBackend(Backend):
+    """
+    Another backend, with every call written to a file of JSON lines: the function, its arguments and what the library
+    wrote back to them, the return code, and the seconds taken. The first line holds the Matrix paths and experiment
+    definitions, so the session can be replayed elsewhere. The file is flushed on disconnecting, and closed by close().
+
+    Parameters
+    ----------
+    backend : Backend, str or Simulator
+        The backend to record, as for get_backend
+    path : str
+        File to write
+    """
+
+    name = 'record'
+
+    def __init__(self, backend, path):
+        super().__init__()
+        self.backend = get_backend(backend)
+        self.path = path
+        self.paths = self.backend.paths
+        self.simulated = self.backend.simulated
+        self.file = None
+
+    def open(self, paths):
+        self._unbind()
+        self.backend.open(paths)
+        self.library = self.backend.library
+        self.file = open(self.path, 'w')
+        self.file.write(json.dumps(dict(paths=paths, files=_experiment_files(paths))) + '\n')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.backend.close()
+
+    def _function(self, name):
+        function = getattr(self.library, name)
+
+        def recorded(*args):
+            t = time.perf_counter()
+            rc = function(*args)
+            t = time.perf_counter() - t
+            outputs = [_dump(arg) for arg in args]
+            if name == 'getDoubleArrayProperty':
+                outputs[3] = np.ctypeslib.as_array(args[3]._obj, shape=(args[2]._obj.value,)).tolist()
+            elif name == 'setDoubleArrayProperty':
+                outputs[3] = np.ctypeslib.as_array(args[3], shape=(args[2],)).tolist()
+            self.file.write(json.dumps(dict(call=name, args=outputs, rc=rc, seconds=t)) + '\n')
+            if name == 'rundown':
+                self.file.flush()
+            return rc
+        return recorded
+
+
+class ReplayBackend(Backend):
+    """
+    Answers calls from a file written by RecordBackend, in the order recorded. The experiment definitions are restored
+    to a temporary directory.
+
+    Polls for events that came up empty are skipped over or repeated as needed, as how many there are depends on timing.
+    Any other call that differs from the recording, by function or descriptor, raises MatrixReplayMismatchError.
+
+    Parameters
+    ----------
+    path : str
+        File written by RecordBackend
+    """
+
+    name = 'replay'
+    simulated = True
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        with open(path) as f:
+            header = json.loads(f.readline())
+            self.records = [json.loads(line) for line in f]
+        self.position = 0
+        self.directory = tempfile.mkdtemp(prefix='nOmicron_replay_')
+        self.paths = dict(header['paths'], installation_directory=os.path.join(self.directory, 'MATRIX'),
+                          experiments_directory=os.path.join(self.directory, 'Experiments'))
+        for key, files in header['files'].items():
+            directory = os.path.join(self.paths[key], *_definition_directories[key])
+            os.makedirs(directory, exist_ok=True)
+            for name, (text, mtime) in files.items():
+                path = os.path.join(directory, name)
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                # Experiments are probed in order of modification, so keep it
+                os.utime(path, (mtime, mtime))
+
+    def __del__(self):
+        if getattr(self, 'directory', None) is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def open(self, paths):
+        self._unbind()
+        self.library = self
+
+    def _is_empty_poll(self, record):
+        return record['call'] == 'getEntityEventByDesc' and record['rc'] == RMT_NOEVENT
+
+    def _replay(self, name, args):
+        if name == 'getEntityEventByDesc':
+            if self.position >= len(self.records) or self.records[self.position]['call'] != name:
+                return RMT_NOEVENT
+        else:
+            while self.position < len(self.records) and self._is_empty_poll(self.records[self.position]):
+                self.position += 1
+        if self.position >= len(self.records):
+            raise MatrixReplayMismatchError(f"{name} was called after the end of the recording")
+        record = self.records[self.position]
+        # The installation directory passed to init moves with the experiment definitions, so is not compared
+        desc = _dump(args[0]) if args and isinstance(args[0], bytes) and name != 'init' else None
+        if record['call'] != name or (desc is not None and record['args'][0] != desc):
+            raise MatrixReplayMismatchError(f"Call {self.position + 1} is {name}({desc or ''}), but "
+                                            f"{record['call']}({record['args'][0] if record['args'] else ''}) was "
+                                            f"recorded")
+        self.position += 1
+        if name == 'getDoubleArrayProperty':
+            # The count passed in is the size of the buffer, so no more values are written than fit, as by the library
+            size = args[2]._obj.value
+        for arg, value in zip(args, record['args']):
+            _load(arg, value)
+        if name == 'getDoubleArrayProperty':
+            values = record['args'][3][:size]
+            args[2]._obj.value = len(values)
+            if values:
+                np.ctypeslib.as_array(args[3]._obj, shape=(len(values),))[:] = values
+        return record['rc']
+
+    def _function(self, name):
+        return lambda *args: self._replay(name, args)
+
+
+backends = dict(ctypes=CtypesBackend, fake=FakeBackend)
+
+
+def get_backend(backend=None):
+    """
+    A backend from its name, e.g. 'ctypes' or 'fake', a Simulator to run in a FakeBackend, or a backend itself.
+
+    Parameters
+    ----------
+    backend : str, Backend, Simulator or None, optional
+        Default is None, for CtypesBackend
+    """
+    if backend is None:
+        return CtypesBackend()
+    if isinstance(backend, str):
+        try:
+            return backends[backend]()
+        except KeyError:
+            raise ValueError(f"Unknown backend '{backend}', must be one of {list(backends)}")
+    if isinstance(backend, Backend):
+        return backend
+    return FakeBackend(backend)
@@ -2,16 +2,17 @@
 #   MATE, (20-08-2018).
 #   Additional changes by Oliver Gordon, 2019
 import ctypes
+import json
 import os
 import re
-import sys
+import threading
 import time
 import xml.etree.ElementTree as ET
+from collections import OrderedDict, namedtuple
 
-import pefile
-import psutil
-from natsort import natsort
+import numpy as np
 
+from nOmicron.mate.backends import get_backend
 from nOmicron.utils import errors
 
 
@@ -25,35 +26,67 @@ class MATE(object):
         vt_PAIR = 6
         vt_ARRAY_OF_DOUBLE = 7
 
+    rc_exceptions = dict(RMT_UNEXPECTEDRESPONSE=errors.MatrixUnexpectedResponseError,
+                         RMT_LIBNOTLOADABLE=errors.MateLibNotLoadableError,
+                         RMT_INTERNALFAILURE=errors.MatrixCriticalHardwareFailureError,
+                         RMT_NOSERVER=errors.MatrixNotInitialisedError,
+                         RMT_INCOMPATIBLEPROTOCOL=errors.MatrixIncompatibleProtocolError,
+                         RMT_UNSUPPORTEDREQ=errors.MatrixUnsupportedReqError,
+                         RMT_UNKNOWNOBJECT=errors.MatrixUnsupportedOperationError,
+                         RMT_UNKNOWNPROPERTY=errors.MatrixUnsupportedOperationError,
+                         RMT_INVALIDTYPE=errors.MatrixInvalidDataTypeError,
+                         RMT_REJECTED=errors.MatrixRejectedError)
+
+    # PE machine types of 32 and 64 bit Windows, keyed by pointer size
+    machines = {4: 0x014c, 8: 0x8664}
+
+    Channel = namedtuple('Channel', ['name', 'trigger', 'directions', 'spectroscopy'])
+
     class String(ctypes.Structure):
         _fields_ = [('length', ctypes.c_int),
                     ('text', ctypes.c_char * 256)]
 
-    def flat_values(self, string_length, array_length, length):
-        pack = 4 * (1 + int(self.machine == 34404))
-
-        class RealArray(ctypes.Structure):
-            _pack_ = pack
-            _fields_ = [('length', ctypes.c_int),
-                        ('values', ctypes.c_double * array_length)]
-
-        class FlatValue(ctypes.Structure):
-            _pack_ = pack
-            _fields_ = [('type', ctypes.c_int),
-                        ('boolean', ctypes.c_int),
-                        ('integer', ctypes.c_int),
-                        ('enumeration', ctypes.c_int),
-                        ('real', ctypes.c_double),
-                        ('string', ctypes.POINTER(ctypes.POINTER(self.String))),
-                        ('pairX', ctypes.c_double),
-                        ('pairY', ctypes.c_double),
-                        ('realArray',
-                         ctypes.POINTER(ctypes.POINTER(RealArray)))]
-
-        class FlatValues(ctypes.Structure):
-            _fields_ = [('length', ctypes.c_int),
-                        ('values', FlatValue * length)]
+    flat_value_types_maxsize = 32
+
+    def flat_value_types(self, string_length, array_length, length):
+        """The (RealArray, FlatValues) structure types for a shape, generated once and kept in an LRU cache."""
+        key = (string_length, array_length, length)
+        cache = self.flat_value_types_cache
+        try:
+            types = cache.pop(key)
+        except KeyError:
+            pack = 4 * (1 + int(self.machine == 34404))
 
+            class RealArray(ctypes.Structure):
+                _pack_ = pack
+                _fields_ = [('length', ctypes.c_int),
+                            ('values', ctypes.c_double * array_length)]
+
+            class FlatValue(ctypes.Structure):
+                _pack_ = pack
+                _fields_ = [('type', ctypes.c_int),
+                            ('boolean', ctypes.c_int),
+                            ('integer', ctypes.c_int),
+                            ('enumeration', ctypes.c_int),
+                            ('real', ctypes.c_double),
+                            ('string', ctypes.POINTER(ctypes.POINTER(self.String))),
+                            ('pairX', ctypes.c_double),
+                            ('pairY', ctypes.c_double),
+                            ('realArray',
+                             ctypes.POINTER(ctypes.POINTER(RealArray)))]
+
+            class FlatValues(ctypes.Structure):
+                _fields_ = [('length', ctypes.c_int),
+                            ('values', FlatValue * length)]
+
+            types = RealArray, FlatValues
+            if len(cache) >= self.flat_value_types_maxsize:
+                cache.popitem(last=False)
+        cache[key] = types
+        return types
+
+    def flat_values(self, string_length, array_length, length):
+        RealArray, FlatValues = self.flat_value_types(string_length, array_length, length)
         flat_values = FlatValues(length)
         for i in range(length):
             o = flat_values.values[i]
@@ -64,6 +97,34 @@ class MATE(object):
             flat_values.values[i] = o
         return flat_values
 
+    def shared_flat_values(self, string_length, array_length, length):
+        """A preallocated flat_values instance for a shape, reused between calls and reset to the same contents as a new
+        instance before being returned. Each thread has its own.
+
+        Only valid until the next call with the same shape on the same thread, so use for the short-lived argument and
+        return values of function calls rather than for anything kept."""
+        key = (string_length, array_length, length)
+        try:
+            cache = self.shared_flat_values_cache.cache
+        except AttributeError:
+            cache = self.shared_flat_values_cache.cache = {}
+        try:
+            flat_values = cache[key]
+        except KeyError:
+            flat_values = cache[key] = self.flat_values(*key)
+            return flat_values
+        flat_values.length = length
+        for o in flat_values.values:
+            o.type = o.boolean = o.integer = o.enumeration = 0
+            o.real = o.pairX = o.pairY = 0.0
+            string = o.string[0][0]
+            string.length = string_length
+            ctypes.memset(ctypes.addressof(string) + self.String.text.offset, 0, self.String.text.size)
+            real_array = o.realArray[0][0]
+            real_array.length = array_length
+            ctypes.memset(real_array.values, 0, ctypes.sizeof(real_array.values))
+        return flat_values
+
     def __init__(self, log, exit_handler2, testmode):
         self.log = log
         self.exit_handler2 = exit_handler2
@@ -82,17 +143,44 @@ class MATE(object):
                         RMT_UNKNOWNPROPERTY=(0x00000020 | 0x00000004),
                         RMT_INVALIDTYPE=(0x00000020 | 0x00000006),
                         RMT_REJECTED=(0x00000020 | 0x00000008))
+        self.rc_names = {v: k for k, v in self.rcs.items()}
+        self.rcs_ok = {self.rcs['RMT_SUCCESS'], self.rcs['RMT_NOEVENT']}
+        self.rcs_quiet = self.rcs_ok | {self.rcs['RMT_UNKNOWNOBJECT']}
+        self.rc_errors = {self.rcs[k]: v for k, v in self.rc_exceptions.items()}
+        self.descriptors = {}
+        self.flat_value_types_cache = OrderedDict()
+        self.shared_flat_values_cache = threading.local()
+        self.deployment_indices = {}
+        self.channels = None
+        self.channel_views = {}
+        self.probe_timings = OrderedDict()
+        self.lock = threading.RLock()
+        self.operations = {'getString': self._get_string,
+                           'getBoolean': self._get_boolean,
+                           'getInteger': self._get_integer,
+                           'getEnum': self._get_enum,
+                           'getDouble': self._get_double,
+                           'getDoubleArray': self._get_double_array,
+                           'getPair': self._get_pair,
+                           'getEvent': self._get_event,
+                           'trigger': self._trigger,
+                           'setString': self._set_string,
+                           'setBoolean': self._set_boolean,
+                           'setInteger': self._set_integer,
+                           'setEnum': self._set_enum,
+                           'setDouble': self._set_double,
+                           'setDoubleArray': self._set_double_array,
+                           'setPair': self._set_pair,
+                           'setObserved': self._set_observed,
+                           'function': self._function}
         self.experiments_directory = ''
         self.online = False
         self.is_ran_down = True
         self.rc = self.rcs['RMT_SUCCESS']
-        pe = pefile.PE(sys.executable, fast_load=True)
-        self.machine = pe.FILE_HEADER.Machine
-        pe.close()
+        self.machine = self.machines[ctypes.sizeof(ctypes.c_void_p)]
 
     def rc_key(self, rc):
-        rc_key = list(self.rcs.keys())[list(self.rcs.values()).index(rc)]
-        return rc_key
+        return self.rc_names[rc]
 
     def exit_handler(self, rc):
         if rc != self.rcs['RMT_SUCCESS'] and rc != self.rcs['RMT_NOEVENT']:
@@ -101,112 +189,124 @@ class MATE(object):
             self.log.AppendText('Active MATRIX experiment/project closed or '
                                 'MATRIX software terminated.\n')
 
+    def descriptor(self, prop):
+        """Byte string descriptor of a property, encoded once and cached for the session."""
+        try:
+            return self.descriptors[prop]
+        except KeyError:
+            desc = self.descriptors[prop] = prop.encode()
+            return desc
+
+    def _get_string(self, p, desc):
+        s = self.String(255)
+        p_s = ctypes.pointer(s)
+        rc = self.lib_mate.getStringPropertyByDesc(desc, -1, ctypes.byref(p_s))
+        return s.text[:].decode(), rc
+
+    def _get_boolean(self, p, desc):
+        b = ctypes.c_char()
+        rc = self.lib_mate.getBooleanProperty(desc, -1, ctypes.byref(b))
+        return bool(ord(b.value)), rc
+
+    def _get_integer(self, p, desc):
+        if len(p) == 4:
+            i = p[3]
+        else:
+            i = ctypes.c_int()
+        rc = self.lib_mate.getIntegerProperty(desc, -1, ctypes.byref(i))
+        return i.value, rc
+
+    def _get_enum(self, p, desc):
+        e = ctypes.c_int()
+        rc = self.lib_mate.getEnumProperty(desc, -1, ctypes.byref(e))
+        return e.value, rc
+
+    def _get_double(self, p, desc):
+        d = ctypes.c_double()
+        rc = self.lib_mate.getDoubleProperty(desc, -1, ctypes.byref(d))
+        return d.value, rc
+
+    def _get_double_array(self, p, desc):
+        values = p[0]
+        count = ctypes.c_int(values.size)
+        p_values = values.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
+        rc = self.lib_mate.getDoubleArrayProperty(desc, -1, ctypes.byref(count),
+                                                  ctypes.byref(p_values))
+        address = ctypes.cast(p_values, ctypes.c_void_p).value
+        if address and address != values.ctypes.data:
+            values = np.ctypeslib.as_array(p_values, shape=(count.value,)).copy()
+        return values[:count.value], rc
+
+    def _get_pair(self, p, desc):
+        d1 = ctypes.c_double()
+        d2 = ctypes.c_double()
+        rc = self.lib_mate.getPairProperty(desc, -1, ctypes.byref(d1),
+                                           ctypes.byref(d2))
+        return (d1.value, d2.value), rc
+
+    def _get_event(self, p, desc):
+        prop = self.String(255)
+        p_prop = ctypes.pointer(prop)
+        value_count = ctypes.c_int()
+        p_values = p[0][2]
+        rc = self.lib_mate.getEntityEventByDesc(ctypes.byref(p_prop),
+                                                ctypes.byref(value_count),
+                                                ctypes.byref(p_values), 0)
+        return (prop.text[:].decode(), value_count.value, p_values), rc
+
+    def _trigger(self, p, desc):
+        return None, self.lib_mate.triggerProperty(desc, -1)
+
+    def _set_string(self, p, desc):
+        return None, self.lib_mate.setStringProperty(desc, -1, p[3].encode())
+
+    def _set_boolean(self, p, desc):
+        return None, self.lib_mate.setBooleanProperty(desc, -1, p[3])
+
+    def _set_integer(self, p, desc):
+        return None, self.lib_mate.setIntegerProperty(desc, -1, p[3])
+
+    def _set_enum(self, p, desc):
+        return None, self.lib_mate.setEnumProperty(desc, -1, p[3])
+
+    def _set_double(self, p, desc):
+        return None, self.lib_mate.setDoubleProperty(desc, -1, ctypes.c_double(p[3]))
+
+    def _set_double_array(self, p, desc):
+        values = np.ascontiguousarray(p[3], dtype=np.float64)
+        p_values = values.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
+        return None, self.lib_mate.setDoubleArrayProperty(desc, -1, values.size, p_values)
+
+    def _set_pair(self, p, desc):
+        d1 = ctypes.c_double(p[3])
+        d2 = ctypes.c_double(p[4])
+        return None, self.lib_mate.setPairProperty(desc, -1, d1, d2)
+
+    def _set_observed(self, p, desc):
+        return None, self.lib_mate.setObservedEntity(desc, p[3])
+
+    def _function(self, p, desc):
+        flat_value = p[0]
+        p_args = p[3]
+        rc = self.lib_mate.callFunctionByDesc(desc, ctypes.byref(flat_value),
+                                              ctypes.byref(p_args))
+        return flat_value, rc
+
     def remote_access(self, p, rc):
-        if rc == self.rcs['RMT_SUCCESS'] or rc == self.rcs['RMT_NOEVENT']:
-            if len(p) > 2:
-                p[2] = p[2].encode()
-            if p[1] == 'getString':
-                s = self.String(255)
-                p_s = ctypes.pointer(s)
-                rc = self.lib_mate.getStringPropertyByDesc(p[2], -1,
-                                                           ctypes.byref(p_s))
-                out = s.text[:].decode()
-            elif p[1] == 'getBoolean':
-                b = ctypes.c_char()
-                rc = self.lib_mate.getBooleanProperty(p[2], -1,
-                                                      ctypes.byref(b))
-                out = bool(ord(b.value))
-            elif p[1] == 'getInteger':
-                if len(p) == 4:
-                    i = p[3]
-                else:
-                    i = ctypes.c_int()
-                rc = self.lib_mate.getIntegerProperty(p[2], -1,
-                                                      ctypes.byref(i))
-                out = i.value
-            elif p[1] == 'getEnum':
-                e = ctypes.c_int()
-                rc = self.lib_mate.getEnumProperty(p[2], -1,
-                                                   ctypes.byref(e))
-                out = e.value
-            elif p[1] == 'getDouble':
-                d = ctypes.c_double()
-                rc = self.lib_mate.getDoubleProperty(p[2], -1,
-                                                     ctypes.byref(d))
-                out = d.value
-            elif p[1] == 'getDoubleArray':
-                count = ctypes.c_int(len(p[0]))
-                p_values = ctypes.pointer(list(map(ctypes.c_double, p[0])))
-                rc = self.lib_mate.getDoubleArrayProperty(p[2], -1,
-                                                          ctypes.byref(count),
-                                                          ctypes.byref(p_values)
-                                                          )
-                out = p_values[0][:count]
-            elif p[1] == 'getPair':
-                d1 = ctypes.c_double()
-                d2 = ctypes.c_double()
-                rc = self.lib_mate.getPairProperty(p[2], -1,
-                                                   ctypes.byref(d1),
-                                                   ctypes.byref(d2))
-                out = d1.value, d2.value
-            elif p[1] == 'getEvent':
-                prop = self.String(255)
-                p_prop = ctypes.pointer(prop)
-                value_count = ctypes.c_int()
-                p_values = p[0][2]
-                rc = self.lib_mate.getEntityEventByDesc(ctypes.byref(p_prop),
-                                                        ctypes.
-                                                        byref(value_count),
-                                                        ctypes.
-                                                        byref(p_values), 0)
-                out = prop.text[:].decode(), value_count.value, p_values
-            elif p[1] == 'trigger':
-                rc = self.lib_mate.triggerProperty(p[2], -1)
-                out = None
-            elif p[1] == 'setString':
-                rc = self.lib_mate.setStringProperty(p[2], -1,
-                                                     p[3].encode())
-                out = None
-            elif p[1] == 'setBoolean':
-                rc = self.lib_mate.setBooleanProperty(p[2], -1, p[3])
-                out = None
-            elif p[1] == 'setInteger':
-                rc = self.lib_mate.setIntegerProperty(p[2], -1, p[3])
-                out = None
-            elif p[1] == 'setEnum':
-                rc = self.lib_mate.setEnumProperty(p[2], -1, p[3])
-                out = None
-            elif p[1] == 'setDouble':
-                d = ctypes.c_double(p[3])
-                rc = self.lib_mate.setDoubleProperty(p[2], -1, d)
-                out = None
-            elif p[1] == 'setDoubleArray':
-                count = len(p[3])
-                p_value = ctypes.pointer(list(map(ctypes.c_double, p[3])))
-                rc = self.lib_mate.setDoubleArrayProperty(p[2], -1,
-                                                          count, p_value)
-                out = None
-            elif p[1] == 'setPair':
-                d1 = ctypes.c_double(p[3])
-                d2 = ctypes.c_double(p[4])
-                rc = self.lib_mate.setPairProperty(p[2], -1, d1, d2)
-                out = None
-            elif p[1] == 'setObserved':
-                rc = self.lib_mate.setObservedEntity(p[2], p[3])
-                out = None
-            elif p[1] == 'function':
-                flat_value = p[0]
-                p_args = p[3]
-                rc = self.lib_mate.callFunctionByDesc(p[2],
-                                                      ctypes.byref(flat_value),
-                                                      ctypes.byref(p_args))
-                out = flat_value
+        if rc in self.rcs_ok:
+            operation = self.operations.get(p[1])
+            if operation is not None:
+                desc = (self.descriptors.get(p[2]) or self.descriptor(p[2])) if len(p) > 2 else None
+                # acquire/release rather than a with block, which costs as much again as the lock itself
+                self.lock.acquire()
+                try:
+                    out, rc = operation(p, desc)
+                finally:
+                    self.lock.release()
             else:
                 rc = 0
                 out = p[0]
-            if (rc != self.rcs['RMT_SUCCESS'] and
-                    rc != self.rcs['RMT_NOEVENT'] and
-                    rc != self.rcs['RMT_UNKNOWNOBJECT']):
+            if rc not in self.rcs_quiet:
                 out = p[0]
                 self.log.AppendText('MATRIX error, response: ' +
                                     self.rc_key(rc) + '.\n')
@@ -215,26 +315,111 @@ class MATE(object):
         self.check_for_response_error(rc)
         return out, rc
 
-    def deployment_parameter(self, scope, eei_name, dp_name):
-        path = self.experiments_directory
+    def deployment_index(self, scope):
+        """Deployment parameters of every experiment element instance in a scope's .exps file, as
+        {element instance: {deployment parameter: value}}. Parsed once, and again only when the file changes."""
+        path = os.path.join(self.experiments_directory, scope + '.exps')
         try:
-            tree = ET.parse(os.path.join(path, scope + '.exps'))
-            root = tree.getroot()
-            tag = 'ExperimentElementInstance'
-            p = re.compile(r'^{.*?}(.*)')
-            elements = [i for i in root if p.match(i.tag).group(1) == tag]
-            eei = [i for i in elements if i.get('name') == eei_name]
-            if len(eei) == 1:
-                dp = [i for i in eei[0] if i.get('name') == dp_name]
-                if len(dp) == 1:
-                    value = dp[0].get('value').split('::')[0]
-                else:
-                    value = ''
-            else:
-                value = ''
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return {}
+        cached = self.deployment_indices.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        index = {}
+        duplicates = set()
+        try:
+            root = ET.parse(path).getroot()
         except:
-            value = ''
-        return value
+            root = []
+        tag = 'ExperimentElementInstance'
+        p = re.compile(r'^{.*?}(.*)')
+        for i in root:
+            m = p.match(i.tag)
+            if m is None or m.group(1) != tag:
+                continue
+            eei_name = i.get('name')
+            if eei_name in index:
+                duplicates.add(eei_name)
+            dps = {}
+            repeated = set()
+            for dp in i:
+                dp_name = dp.get('name')
+                if dp_name in dps:
+                    repeated.add(dp_name)
+                dps[dp_name] = (dp.get('value') or '').split('::')[0]
+            for dp_name in repeated:
+                dps[dp_name] = ''
+            index[eei_name] = dps
+        for eei_name in duplicates:
+            index[eei_name] = {}
+        self.deployment_indices[path] = (mtime, index)
+        return index
+
+    def deployment_parameter(self, scope, eei_name, dp_name):
+        return self.deployment_index(scope).get(eei_name, {}).get(dp_name, '')
+
+    def channel_registry(self):
+        """The channels of the active experiment, as {name: Channel}. Read once per connection from the ChannelControl
+        panels of the experiment's template .expd, with a streaming parse."""
+        if self.channels is None:
+            path = os.path.join(self.installation_directory, 'Templates', 'default', 'Experiments',
+                                self.scope + '.expd')
+            from lxml import etree
+
+            names = []
+            try:
+                for _, element in etree.iterparse(path, events=('end',)):
+                    if element.get('panelType') == 'ChannelControl':
+                        names.append(element.get('experimentElementInstanceName'))
+                    element.clear()
+            except (OSError, etree.XMLSyntaxError):
+                pass
+            self.channels = {}
+            self.channel_views = {}
+            for name in names:
+                channel = self.channels[name] = self._make_channel(name)
+                for direction in channel.directions:
+                    self.channel_views[name + '_' + direction] = channel
+                if channel.spectroscopy:
+                    self.channel_views[channel.spectroscopy] = channel
+        return self.channels
+
+    def _make_channel(self, name):
+        trigger = self.deployment_parameter(self.scope, name, 'Trigger')
+        if name.endswith('_t'):
+            return self.Channel(name, trigger, (), '')
+        elif '_' in name:
+            return self.Channel(name, trigger, (), name + '_Spec')
+        else:
+            return self.Channel(name, trigger, ('Fw', 'Bw'), '')
+
+    def channel(self, name):
+        """The Channel for a channel (e.g. I_t) or view (e.g. Z_Fw, I_V_Spec) name, from the channel registry. Channels
+        missing from the template are looked up in the deployment parameters."""
+        channels = self.channel_registry()
+        try:
+            return channels[name]
+        except KeyError:
+            pass
+        try:
+            return self.channel_views[name]
+        except KeyError:
+            return self._make_channel(name)
+
+    def probe_order(self, experiments):
+        """Orders experiment names for probing: the scope of the last successful connection first, then the most
+        recently changed experiment definitions."""
+        last_scope = self.read_settings().get('scope')
+
+        def changed(experiment):
+            try:
+                return os.path.getmtime(os.path.join(self.experiments_directory, experiment + '.expd'))
+            except OSError:
+                return 0
+
+        return sorted(experiments, key=lambda e: (e != last_scope, -changed(e)))
 
     def experiment(self):
         path = self.experiments_directory
@@ -243,27 +428,29 @@ class MATE(object):
                            if s.endswith('.expd')]
         except:
             experiments = []
-        l = len(experiments)
-        e = enumerate(experiments)
+        self.probe_timings = OrderedDict()
+        scope = None
         rc = 1
         state = 'closed'
-        flag = (l != 0)
-        while flag:
-            i = next(e)
-            prop = i[1] + '::' + i[1] + '.State'
+        for scope in self.probe_order(experiments):
+            prop = scope + '::' + scope + '.State'
             func_params = ['', 'getString', prop]
+            t = time.perf_counter()
             state, rc = self.remote_access(func_params, 1)
-            flag = (((rc == self.rcs['RMT_SUCCESS']) or
-                     (rc == self.rcs['RMT_UNKNOWNOBJECT'])) and i[0] < l - 1 and
-                    ((state == 'closed') or (state == '')))
-        if ((rc == self.rcs['RMT_SUCCESS']) and (state != 'closed')) or \
-                self.testmode:
-            self.scope = i[1]
-            self.lib_mate.setScopeName(i[1].encode())
+            self.probe_timings[scope] = time.perf_counter() - t
+            if not (((rc == self.rcs['RMT_SUCCESS']) or (rc == self.rcs['RMT_UNKNOWNOBJECT'])) and
+                    ((state == 'closed') or (state == ''))):
+                break
+        self.log.AppendText(''.join(f'Probed experiment {k}: {v * 1e3:.1f} ms.\n'
+                                    for k, v in self.probe_timings.items()))
+        if scope is not None and (((rc == self.rcs['RMT_SUCCESS']) and (state != 'closed')) or
+                                  self.testmode):
+            self.scope = scope
+            self.lib_mate.setScopeName(scope.encode())
             name = 'testmode'
             rfn = time.strftime('%Y%m%d-%H%M%S', time.localtime()) + \
                   '_' + name
-            rfp = os.path.join(os.environ['USERPROFILE'], 'SPM-data')
+            rfp = os.path.join(os.environ.get('USERPROFILE', os.path.expanduser('~')), 'SPM-data')
             if not os.path.exists(rfp):
                 try:
                     os.mkdir(rfp)
@@ -286,33 +473,91 @@ class MATE(object):
             self.online = False
         self.check_for_response_error(rc)
 
-    def connect(self):
+    settings_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'utils',
+                                 'nOmicronrc.json')
+    connection_settings = ('installation_directory', 'library_path', 'matrix_dir', 'experiments_directory')
+
+    def read_settings(self):
+        """The settings saved in nOmicronrc.json, or an empty dict if there are none or they cannot be read."""
+        try:
+            with open(self.settings_path) as f:
+                settings = json.load(f)
+        except (OSError, ValueError):
+            settings = {}
+        return settings if isinstance(settings, dict) else {}
+
+    def write_settings(self, **settings):
+        """Updates nOmicronrc.json with the given settings, keeping the rest. Failing to write is not an error."""
+        saved = self.read_settings()
+        saved.update(settings)
+        try:
+            with open(self.settings_path, 'w') as f:
+                json.dump(saved, f, indent=4)
+        except OSError:
+            pass
+
+    def cached_paths(self):
+        """The paths from the last successful connection, if they all still exist and are those of the MATRIX running
+        now, unchanged since, else None."""
+        settings = self.read_settings()
+        paths = {k: settings.get(k) for k in self.connection_settings}
+        if all(isinstance(v, str) and v for v in paths.values()) and \
+                os.path.isfile(paths['library_path']) and os.path.isdir(paths['experiments_directory']):
+            running = self.running_matrix()
+            if running is not None and os.path.normcase(running) == os.path.normcase(self.matrix_exe(paths)) and \
+                    settings.get('matrix_stamp') == self.matrix_stamp(paths):
+                return paths
+        return None
+
+    @staticmethod
+    def matrix_exe(paths):
+        return os.path.join(paths['installation_directory'], 'Bin', 'Matrix.exe')
+
+    def matrix_stamp(self, paths):
+        """The size and modification time of Matrix.exe, to tell if MATRIX has been reinstalled or upgraded, or None if
+        it does not exist."""
+        try:
+            stat = os.stat(self.matrix_exe(paths))
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime]
+
+    @staticmethod
+    def running_matrix():
+        """The path of the running Matrix.exe, or None if MATRIX is not running."""
+        import psutil
+
+        for p in psutil.process_iter(['name']):
+            if p.info['name'] == 'Matrix.exe':
+                try:
+                    return p.exe()
+                except psutil.Error:
+                    continue
+        return None
+
+    def discover(self):
+        """Finds the paths of the running MATRIX from its process, or None if it is not running or unusable."""
+        import pefile
+        import psutil
+        from natsort import natsort
+
         bin_sub_path = 'Bin\\Matrix.exe'
         library_sub_path = 'SDK\\RemoteAccess\\RemoteAccess_API.dll'
         name = os.path.basename(bin_sub_path)
         ok = False
-        ps = psutil.process_iter()
-        p = next(ps)
-        go = True
-        while go and not ok:
+        for p in psutil.process_iter(['name']):
+            if p.info['name'] != name:
+                continue
             try:
                 p_path = p.exe()
-                p_name = p.name()
-            except:
-                p_path = ''
-                p_name = ''
-            if p_name == name:
-                installation_directory = p_path[:-(len(bin_sub_path) + 1)]
-                library_path = os.path.join(installation_directory,
-                                            library_sub_path)
-                self.installation_directory = installation_directory
-                self.library_path = library_path
-                ok = os.path.exists(library_path)
-            try:
-                p = next(ps)
-            except StopIteration:
-                go = False
-        ps.close()
+            except psutil.Error:
+                continue
+            installation_directory = p_path[:-(len(bin_sub_path) + 1)]
+            library_path = os.path.join(installation_directory,
+                                        library_sub_path)
+            ok = os.path.exists(library_path)
+            if ok:
+                break
         co = ''
         if ok:
             try:
@@ -334,36 +579,73 @@ class MATE(object):
                     if st_entries:
                         co = st_entries[0].entries[b'CompanyName'].decode()
                 pe.close()
-        if co:
-            user_config_dir = os.environ['APPDATA']
-            all_default_paths = natsort.natsorted(os.listdir(f"{user_config_dir}\\{co}\\MATRIX"))
-            self.matrix_dir = all_default_paths[-1]
-            exp_sub_path = f'MATRIX\\{all_default_paths[-1]}\\Experiments'
-            self.experiments_directory = os.path.join(user_config_dir, co,
-                                                      exp_sub_path)
-            self.lib_mate = ctypes.cdll.LoadLibrary(library_path)
-            self.library_path = library_path
-            self.lib_mate.setHost(b'localhost')
-            self.disconnect()
-            if self.is_ran_down or self.testmode:
-                rc = self.lib_mate.init(installation_directory.encode())
-                self.log.AppendText('Connecting to the MATRIX, response: ' +
-                                    self.rc_key(rc) + '.\n')
-                if (rc == self.rcs['RMT_SUCCESS']) or self.testmode:
-                    self.is_ran_down = False
-                    self.experiment()
-                    if not self.online:
-                        self.disconnect()
-                    else:
-                        self.rc = self.rcs['RMT_SUCCESS']
-                else:
-                    self.rc = rc
-        else:
+        if not co:
+            return None
+        user_config_dir = os.environ['APPDATA']
+        all_default_paths = natsort.natsorted(os.listdir(f"{user_config_dir}\\{co}\\MATRIX"))
+        exp_sub_path = f'MATRIX\\{all_default_paths[-1]}\\Experiments'
+        return dict(installation_directory=installation_directory,
+                    library_path=library_path,
+                    matrix_dir=all_default_paths[-1],
+                    experiments_directory=os.path.join(user_config_dir, co, exp_sub_path))
+
+    def connect(self, warm_start=True, backend=None):
+        """Connects to the running MATRIX, through a backend (see nOmicron.mate.backends).
+
+        With warm_start, the paths saved in nOmicronrc.json by the last successful connection are used as long as they
+        still exist and belong to the running Matrix.exe, and MATRIX is only searched for again if they are missing,
+        stale, or fail to connect to an open experiment. Backends that bring their own paths, e.g. 'fake', connect with those."""
+        self.channels = None
+        backend = get_backend(backend)
+        if backend.paths is not None:
+            self._connect(backend.paths, backend)
+            self.check_for_response_error(self.rc)
+            return
+        paths = self.cached_paths() if warm_start else None
+        warm = paths is not None
+        if not warm:
+            paths = self.discover()
+        if paths:
+            self._connect(paths, backend)
+            if warm and (self.rc != self.rcs['RMT_SUCCESS'] or not self.online):
+                self.log.AppendText('Saved MATRIX paths are stale, searching again.\n')
+                paths = self.discover()
+                if paths:
+                    self._connect(paths, backend)
+            if paths and self.online:
+                self.write_settings(scope=self.scope, matrix_stamp=self.matrix_stamp(paths), **paths)
+        if not paths:
             self.log.AppendText('Connecting to the MATRIX, response: '
                                 '---.\n')
 
         self.check_for_response_error(self.rc)
 
+    def _connect(self, paths, backend):
+        self.installation_directory = paths['installation_directory']
+        self.library_path = paths['library_path']
+        self.matrix_dir = paths['matrix_dir']
+        self.experiments_directory = paths['experiments_directory']
+        try:
+            backend.open(paths)
+        except OSError:
+            self.rc = self.rcs['RMT_LIBNOTLOADABLE']
+            return
+        self.lib_mate = backend
+        self.disconnect()
+        if self.is_ran_down or self.testmode:
+            rc = self.lib_mate.init(self.installation_directory.encode())
+            self.log.AppendText('Connecting to the MATRIX, response: ' +
+                                self.rc_key(rc) + '.\n')
+            if (rc == self.rcs['RMT_SUCCESS']) or self.testmode:
+                self.is_ran_down = False
+                self.experiment()
+                if not self.online:
+                    self.disconnect()
+                else:
+                    self.rc = self.rcs['RMT_SUCCESS']
+            else:
+                self.rc = rc
+
     def disconnect(self):
         if not self.is_ran_down:
             rc = self.lib_mate.rundown()
@@ -376,23 +658,6 @@ class MATE(object):
             self.check_for_response_error(self.rc)
 
     def check_for_response_error(self, rc):
-        rc_key = self.rc_key(rc)
-
-        if rc_key == "RMT_UNEXPECTEDRESPONSE":
-            raise errors.MatrixUnexpectedResponseError
-        elif rc_key == "RMT_LIBNOTLOADABLE":
-            raise errors.MateLibNotLoadableError
-        elif rc_key == "RMT_INTERNALFAILURE":
-            raise errors.MatrixCriticalHardwareFailureError
-        elif rc_key == "RMT_NOSERVER":
-            raise errors.MatrixNotInitialisedError
-        elif rc_key == "RMT_INCOMPATIBLEPROTOCOL":
-            raise errors.MatrixIncompatibleProtocolError
-        elif rc_key == "RMT_UNSUPPORTEDREQ":
-            raise errors.MatrixUnsupportedReqError
-        elif rc_key in ["RMT_UNKNOWNOBJECT", "RMT_UNKNOWNPROPERTY"]:
-            raise errors.MatrixUnsupportedOperationError
-        elif rc_key == "RMT_INVALIDTYPE":
-            raise errors.MatrixInvalidDataTypeError
-        elif rc_key == "RMT_REJECTED":
-            raise errors.MatrixRejectedError
+        error = self.rc_errors.get(rc)
+        if error is not None:
+            raise error
@@ -5,14 +5,19 @@
 import ctypes as _ctypes
 import inspect as _inspect
 import time as _time
-from msvcrt import getch, kbhit
+import warnings as _warnings
+from contextlib import contextmanager as _contextmanager
 from random import random
 from time import sleep
 
+import numpy as _np
+
 from nOmicron.utils.utils import is_parameter_allowable
 
 from .mate import MATE as _MATE
-from ..utils.errors import MatrixNotInitialisedError
+from ..utils.errors import MatrixNotInitialisedError, MatrixWriteNotConfirmedWarning
+
+_MISSING = object()
 
 
 class _Text(object):
@@ -70,6 +75,8 @@ class _Clock(object):
 class _Experiment(object):
     """Core features of the experiment. Can read/change the state of the experiment."""
 
+    _volatile = ('Bricklet_Ready', 'Bricklet_Written', 'State')
+
     def Bricklet_Ready(self, test=''):
         p = 'string'
         a = _process(p, [self, "Bricklet_Ready"], None, test)
@@ -248,6 +255,8 @@ class _PiezoControl(object):
 class _Regulator(object):
     """Controls the Z position of the probe."""
 
+    _volatile = ('Z_Out', 'Setpoint_Detected')
+
     def TP_Disable(self, a=None, test=False):
         p = 'boolean'
         a = _process(p, [self, "TP_Disable"], a, test)
@@ -349,6 +358,12 @@ class _View(object):
     """Allows for the delivery of data. Open the channel with IO.py, set Deliver_Data to True and return data
     with Data() and a callback if desired."""
 
+    _volatile = ('Data_Size', 'Run_Count', 'Cycle_Count', 'Packet_Count')
+
+    def __init__(self, channel_name=None):
+        # None follows the module channel_name, set by IO.enable_channel. See get_view for a view fixed to a channel
+        self.channel_name = channel_name
+
     def Data(self, f=None, *args, **kwargs):
         p = 'set_observed'
         out = _process(p, [self, "Data"], f, *args, **kwargs)
@@ -384,6 +399,8 @@ class _View(object):
 class _XYScanner(object):
     """Controls general scan parameters, tip relocation, and triggering of functions after tip relocation"""
 
+    _volatile = ('Target_Position', 'XY_Position_Report')
+
     def Angle(self, a=None, test=0):
         """Integer describing angle of scan"""
         p = 'integer'
@@ -422,7 +439,7 @@ class _XYScanner(object):
     def Points_Lines_Constrained(self, a=None, test=False):
         """Boolean of if scan points and lines should be locked together"""
         p = 'boolean'
-        a = _process(p, "Points_Lines_Constrained", a, test)
+        a = _process(p, [self, "Points_Lines_Constrained"], a, test)
         return a
 
     def Enable_Scan(self, a=None, test=False):
@@ -757,7 +774,7 @@ class _Spectroscopy:
         """Spectroscopy points on channel 2"""
         p = 'unsigned_integer'
         is_parameter_allowable(a, self.__class__.__name__, "Device_2_Points", test)
-        a = _process(p, [self, "ASDASDASDASD"], a, test)
+        a = _process(p, [self, "Device_2_Points"], a, test)
         return a
 
     def Raster_Time_2(self, a=None, test=0):
@@ -789,6 +806,8 @@ class _CRTCService(object):
 class _PLLControl(object):
     """Controls the PLL regulator"""
 
+    _volatile = ('Amplitude', 'Delta_f', 'Sensor_Frequency', 'Damping', 'PLL_Locked')
+
     def Enable_Tip_Protection(self, a=None, test=False):
         is_parameter_allowable(a, self.__class__.__name__, "Enable_Tip_Protection", test)
         p = 'boolean'
@@ -928,67 +947,358 @@ class _PLLControl(object):
         return a
 
 
+# The type of every readable property of each experiment element, as used by its accessor
+property_types = dict(
+    _Channel=dict(Enable='boolean'),
+    _Clock=dict(Enable='boolean', Period='double', Samples='unsigned_integer'),
+    _Experiment=dict(Bricklet_Ready='string', Bricklet_Written='string', Name='string', Result_File_Name='string',
+                     Result_File_Path='string', State='string'),
+    _GapVoltageControl=dict(Preamp_Range='enum', Voltage='double', Tip_Cond_Enable_Feedback_Loop='boolean',
+                            Tip_Cond_Pulse_Time='double', Tip_Cond_Pulse_Voltage='double',
+                            Tip_Cond_Pulse_Preamp_Range='enum'),
+    _PiezoControl=dict(Approach='unsigned_integer', Move_Auto='boolean', Move_Backward='boolean',
+                       Move_Forward='boolean', Move_Tip_X_Minus='unsigned_integer',
+                       Move_Tip_X_Plus='unsigned_integer', Move_Tip_Y_Minus='unsigned_integer',
+                       Move_Tip_Y_Plus='unsigned_integer', Retract='unsigned_integer'),
+    _Regulator=dict(TP_Disable='boolean', Enable_Z_Offset_Slew_Rate='boolean', Z_Ramp='double', Z_Ramp_Delay='double',
+                    Enable_Z_Ramp_Slew_Rate='boolean', Z_Ramp_Slew_Rate='double', Feedback_Loop_Enabled='boolean',
+                    Loop_Gain_1_I='double', Loop_Gain_2_I='double', Preamp_Range_1='enum', Preamp_Range_2='enum',
+                    Setpoint_1='double', Setpoint_2='double', Z_Offset='double', Z_Offset_Slew_Rate='double',
+                    Z_Out='double', Setpoint_Detected='boolean'),
+    _View=dict(Data_Size='unsigned_integer', Deliver_Data='boolean', Run_Count='unsigned_integer',
+               Cycle_Count='unsigned_integer', Packet_Count='unsigned_integer'),
+    _XYScanner=dict(Angle='integer', Area='pair', Execute_Port_Colour='string', Points='unsigned_integer',
+                    Lines='unsigned_integer', Points_Lines_Constrained='boolean', Enable_Scan='boolean',
+                    Offset='pair', Enable_Drift_Compensation='boolean', Enable_Plane_Slope='boolean',
+                    Plane_X_Slope='double', Plane_Y_Slope='double', Move_Raster_Time_Constrained='boolean',
+                    Raster_Time='double', Move_Raster_Time='double', Speed_Adaption='enum', Scan_Speed='double',
+                    Enable_Execute_Port='boolean', Return_To_Stored_Position='boolean',
+                    Store_Current_Position='boolean', Target_Position='pair',
+                    Trigger_Execute_At_Target_Position='boolean', Width_Height_Constrained='boolean', Width='double',
+                    Height='double', XY_Position_Report='pair', X_Offset='double', X_Drift='double',
+                    X_Retrace='boolean', X_Retrace_Trigger='boolean', X_Trace_Trigger='boolean', Y_Drift='double',
+                    Y_Offset='double', Y_Retrace='boolean', Y_Retrace_Trigger='boolean', Y_Trace_Trigger='boolean'),
+    _Spectroscopy=dict(Enable_Feedback_Loop='boolean', Disable_Feedback_Loop='boolean', Spectroscopy_Mode='enum',
+                       Device_1_Repetitions='unsigned_integer', Device_1_Start='double', Device_1_End='double',
+                       Device_1_Points='unsigned_integer', Raster_Time_1='double', Device_1_Offset_Delay='double',
+                       Enable_Device_1_Ramp_Reversal='boolean', Device_2_Repetitions='unsigned_integer',
+                       Device_2_Start='double', Device_2_End='double', Device_2_Points='unsigned_integer',
+                       Raster_Time_2='double', Device_2_Offset_Delay='double',
+                       Enable_Device_2_Ramp_Reversal='boolean'),
+    _CRTCService=dict(RCSC='unsigned_integer'),
+    _PLLControl=dict(Enable_Tip_Protection='boolean', Enable_Constant_Excitation_Mode='boolean', PLL_Enable='boolean',
+                     Auto_Phase='boolean', PLL_Centre_Frequency='double', Amplitude_Detection_Mode='enum',
+                     Sensor_Resonance_Frequency_Range='enum', Non_Contact_Mode='enum',
+                     Excitation_Attenuation_Constant_Amplitude='enum',
+                     Excitation_Attenuation_Constant_Excitation='enum', Excitation_Attenuation_Self_Excitation='enum',
+                     Amplitude_Loop_Gain_I_Constant_Amplitude='double',
+                     Amplitude_Loop_Gain_P_Constant_Amplitude='double',
+                     Amplitude_Loop_Gain_I_Self_Excitation='double', Amplitude_Loop_Gain_P_Self_Excitation='double',
+                     PLL_Loop_Gain_I='double', PLL_Loop_Gain_P='double', Amplitude='double', Delta_f='double',
+                     Sensor_Frequency='double', Damping='double', PLL_Locked='boolean'))
+
+_type_defaults = dict(string='', boolean=False, integer=0, unsigned_integer=0, enum=0, double=0.0, pair=(0.0, 0.0))
+
+
+class _Snapshot(dict):
+    """Property values read by read_many(), keyed by 'element.Property', along with the error and time taken for each
+    read."""
+
+    def __init__(self):
+        super().__init__()
+        self.errors = {}
+        self.timings = {}
+        self.total_time = 0.0
+
+
+class _PropertyCache(object):
+    """Opt-in read cache of property values, saving a round trip to the Matrix for values that rarely change.
+
+    Writing a property through the API drops the cached values of its whole experiment element (as e.g. Points and
+    Lines may be constrained together), and the following read-back refreshes it. The cache is cleared whenever the
+    experiment changes state, on (dis)connection, and when any of the events in invalidating_events is delivered.
+    Properties named in an element class's _volatile are never cached.
+
+    Examples
+    --------
+    >>> mo.property_cache.enabled = True
+    >>> mo.property_cache.invalidating_events.add("XYScanner.Y_Trace_Done")
+    >>> ...
+    >>> mo.property_cache.hits, mo.property_cache.misses
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.invalidating_events = set()
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, obj):
+        """Drop the cached values of the experiment element a property belongs to."""
+        if self.values:
+            element = obj[:obj.rfind('.') + 1]
+            for key in [key for key in self.values if key.startswith(element)]:
+                del self.values[key]
+
+    def event(self, obj):
+        if obj in self.invalidating_events:
+            self.clear()
+
+    def clear(self):
+        self.values.clear()
+
+    def reset_counters(self):
+        self.hits = self.misses = 0
+
+
+class _WriteMode(object):
+    """How setters in _process write to the Matrix. See fast_writes()."""
+
+    def __init__(self):
+        self.readback = True
+        self.elide = False
+        self.verify = False
+        self.elided = 0
+        self.pending = {}
+
+    def confirm(self):
+        """Read back all writes pending verification once each, warning of any that did not take the value sent. The
+        values read back, not those sent, are then held in the property cache.
+
+        Returns
+        -------
+        mismatches : dict
+            Maps each mismatched property to (sent, read) values
+        """
+        pending, self.pending = self.pending, {}
+        mismatches = {}
+        for obj, (get_params, value, cacheable) in pending.items():
+            read, mate.rc = mate.remote_access(list(get_params), mate.rc)
+            if cacheable and mate.rc == mate.rcs['RMT_SUCCESS']:
+                property_cache.values[obj] = read
+            if isinstance(value, (bool, str)):
+                confirmed = value == read
+            else:
+                confirmed = _np.allclose(value, read)
+            if not confirmed:
+                mismatches[obj] = (value, read)
+        if mismatches:
+            _warnings.warn(f"Matrix did not confirm the values written to {mismatches}", MatrixWriteNotConfirmedWarning)
+        return mismatches
+
+
+class _SampleBuffers(object):
+    """Double-buffered sample memory for event delivery. Grows to the largest capture requested so far, and is reused
+    by any later capture of the same size or smaller. While the callback for one event reads its buffer, the next event
+    is delivered into the other."""
+
+    def __init__(self):
+        self.buffers = []
+        self.capacity = -1
+        self.samples = 0
+        self.index = 0
+        self.allocations = 0
+
+    def acquire(self, samples):
+        """Get the sample memory for a capture of a number of samples, only allocating if it is larger than any
+        capture so far."""
+        if samples > self.capacity:
+            self.buffers = [_ctypes.pointer(mate.flat_values(0, samples, 1)) for i in range(2)]
+            self.capacity = samples
+            self.allocations += 1
+        self.samples = samples
+        for p_values in self.buffers:
+            p_values[0].values[0].realArray[0][0].length = samples
+        self.index = 0
+        return self.buffers[0]
+
+    def swap(self):
+        """Switch delivery to the other buffer, leaving the one just delivered into untouched."""
+        self.index ^= 1
+        p_values = self.buffers[self.index]
+        p_values[0].values[0].realArray[0][0].length = self.samples
+        return p_values
+
+    @property
+    def nbytes(self):
+        """Total bytes of sample memory currently allocated."""
+        return sum(_ctypes.sizeof(p_values[0]) + _ctypes.sizeof(p_values[0].values[0].realArray[0][0]) +
+                   _ctypes.sizeof(p_values[0].values[0].string[0][0]) for p_values in self.buffers)
+
+
+class _EventWait(object):
+    """How wait_for_event polls the Matrix for events, and counters of that polling to tune latency against CPU use.
+
+    Modes are
+    - 'spin': poll back to back. Lowest latency, but takes a whole CPU core.
+    - 'hybrid': spin for a number of empty polls, then sleep between polls, doubling from min_sleep up to max_sleep.
+      Latency is then bounded by max_sleep plus one poll.
+    - 'fixed': sleep for period between polls.
+
+    Every poll that finds an event keeps polling until there are none pending, dispatching each to its callback.
+    Latency is measured from the start of the last empty poll to the callback, an upper bound of how long each event
+    waited to be handled.
+
+    Examples
+    --------
+    >>> mo.event_wait.mode = 'fixed'
+    >>> mo.event_wait.period = 5e-3
+    >>> ...
+    >>> mo.event_wait.stats()
+    """
+    modes = ('spin', 'hybrid', 'fixed')
+
+    def __init__(self, mode='hybrid', spins=50, min_sleep=1e-4, max_sleep=2e-3, period=1e-3):
+        self.mode = mode
+        self.spins = spins
+        self.min_sleep = min_sleep
+        self.max_sleep = max_sleep
+        self.period = period
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.polls = 0
+        self.empty_polls = 0
+        self.events = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def stats(self):
+        """The counters since the last reset_counters(), as a dict."""
+        return dict(polls=self.polls, empty_polls=self.empty_polls, events=self.events,
+                    mean_latency=self.total_latency / self.events if self.events else 0.0,
+                    max_latency=self.max_latency)
+
+    def wait(self, until=None):
+        for delay in self.polls_for_event(until):
+            if delay:
+                sleep(delay)
+
+    def polls_for_event(self, until=None):
+        """Generator behind wait(): polls until an event arrives, dispatching it and any pending, yielding how long to
+        sleep after each empty poll. Lets other schedulers, e.g. an asyncio event loop, do the sleeping."""
+        if self.mode not in self.modes:
+            raise ValueError(f"Unknown wait mode '{self.mode}', must be one of {self.modes}")
+        empty = 0
+        since = _time.perf_counter()
+        try:
+            while True:
+                t = _time.perf_counter()
+                self.polls += 1
+                if _poll_event():
+                    break
+                if mate.rc != mate.rcs['RMT_NOEVENT']:
+                    return
+                self.empty_polls += 1
+                if until is not None and until():
+                    return
+                since = t
+                empty += 1
+                yield self.delay(empty)
+
+            self._dispatch(since)
+            while not mate.testmode and not (until is not None and until()):
+                self.polls += 1
+                if not _poll_event():
+                    self.empty_polls += 1
+                    break
+                self._dispatch(since)
+        finally:
+            # Also when abandoned mid-wait, so that callers' loops on RMT_SUCCESS carry on
+            if mate.rc == mate.rcs['RMT_NOEVENT']:
+                mate.rc = mate.rcs['RMT_SUCCESS']
+
+    def _dispatch(self, since):
+        latency = _time.perf_counter() - since
+        self.events += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        _dispatch_event()
+
+    def delay(self, empty):
+        """Seconds to sleep after a number of empty polls in a row."""
+        if self.mode == 'fixed':
+            return self.period
+        if self.mode == 'hybrid' and empty > self.spins:
+            return min(self.min_sleep * 2 ** min(empty - self.spins - 1, 32), self.max_sleep)
+        return 0
+
+
+def _object_name(element, name):
+    """The name of a property or function of an experiment element as the Matrix knows it, e.g. Clock1.Samples, which
+    for clocks, channels and views depends on the one in use. Has an empty part, e.g. .Samples, if none is."""
+    if element.__class__.__name__ == '_Experiment':
+        return mate.scope + '.' + name
+    elif element.__class__.__name__ == '_Channel':
+        return channel_name + '.' + name
+    elif element.__class__.__name__ == '_Clock':
+        return clock_name + '.' + name
+    elif element.__class__.__name__ == '_View':
+        return 'View.' + (element.channel_name or channel_name) + '.' + name
+    else:
+        return element.__class__.__name__[1:] + '.' + name
+
+
 def _process(p, caller, a, *args, **kwargs):
     global event_objects, _test_event_object
     if not hasattr(mate, "lib_mate"):
         raise MatrixNotInitialisedError()
 
-    if caller[0].__class__.__name__ == '_Experiment':
-        obj = mate.scope + '.' + caller[1]
-    elif caller[0].__class__.__name__ == '_Channel':
-        obj = channel_name + '.' + caller[1]
-    elif caller[0].__class__.__name__ == '_Clock':
-        obj = clock_name + '.' + caller[1]
-    elif caller[0].__class__.__name__ == '_View':
-        obj = 'View.' + channel_name + '.' + caller[1]
-    else:
-        obj = caller[0].__class__.__name__[1:] + '.' + caller[1]
+    obj = _object_name(caller[0], caller[1])
+    cacheable = property_cache.enabled and caller[1] not in getattr(caller[0], '_volatile', ())
     if p == 'string':
+        get_params = [args[0], 'getString', obj]
         if isinstance(a, str):
-            func_params = [None, 'setString', obj, a]
-            _, mate.rc = mate.remote_access(func_params, mate.rc)
-        func_params = [args[0], 'getString', obj]
-        a, mate.rc = mate.remote_access(func_params, mate.rc)
+            a = _write([None, 'setString', obj, a], a, get_params, cacheable)
+        else:
+            a = _read(get_params, cacheable)
     elif p == 'boolean':
+        get_params = [args[0], 'getBoolean', obj]
         if isinstance(a, bool):
-            func_params = [None, 'setBoolean', obj, a]
-            _, mate.rc = mate.remote_access(func_params, mate.rc)
-        func_params = [args[0], 'getBoolean', obj]
-        a, mate.rc = mate.remote_access(func_params, mate.rc)
+            a = _write([None, 'setBoolean', obj, a], a, get_params, cacheable)
+        else:
+            a = _read(get_params, cacheable)
     elif p == 'integer':
+        get_params = [args[0], 'getInteger', obj]
         if isinstance(a, int):
-            func_params = [None, 'setInteger', obj, a]
-            _, mate.rc = mate.remote_access(func_params, mate.rc)
-        func_params = [args[0], 'getInteger', obj]
-        a, mate.rc = mate.remote_access(func_params, mate.rc)
+            a = _write([None, 'setInteger', obj, a], a, get_params, cacheable)
+        else:
+            a = _read(get_params, cacheable)
     elif p == 'unsigned_integer':
+        get_params = [args[0], 'getInteger', obj, _ctypes.c_uint()]
         if isinstance(a, int):
-            func_params = [None, 'setInteger', obj, a]
-            _, mate.rc = mate.remote_access(func_params, mate.rc)
-        func_params = [args[0], 'getInteger', obj, _ctypes.c_uint()]
-        a, mate.rc = mate.remote_access(func_params, mate.rc)
+            a = _write([None, 'setInteger', obj, a], a, get_params, cacheable)
+        else:
+            a = _read(get_params, cacheable)
     elif p == 'enum':
+        get_params = [args[0], 'getEnum', obj]
         if isinstance(a, int):
-            func_params = [None, 'setEnum', obj, a]
-            _, mate.rc = mate.remote_access(func_params, mate.rc)
-        func_params = [args[0], 'getEnum', obj]
-        a, mate.rc = mate.remote_access(func_params, mate.rc)
+            a = _write([None, 'setEnum', obj, a], a, get_params, cacheable)
+        else:
+            a = _read(get_params, cacheable)
     elif p == 'double':
+        get_params = [args[0], 'getDouble', obj]
         if isinstance(a, (int, float)):
-            func_params = [None, 'setDouble', obj, a]
-            _, mate.rc = mate.remote_access(func_params, mate.rc)
-        func_params = [args[0], 'getDouble', obj]
-        a, mate.rc = mate.remote_access(func_params, mate.rc)
+            a = _write([None, 'setDouble', obj, a], a, get_params, cacheable)
+        else:
+            a = _read(get_params, cacheable)
     elif p == 'pair':
+        get_params = [args[0], 'getPair', obj]
         if (isinstance(a, (list, tuple)) and len(a) == 2 and
                 isinstance(a[0], (int, float)) and
                 isinstance(a[1], (int, float))):
-            func_params = [None, 'setPair', obj, a[0], a[1]]
+            a = _write([None, 'setPair', obj, a[0], a[1]], tuple(a), get_params, cacheable)
+        else:
+            a = _read(get_params, cacheable)
+    elif p == 'double_array':
+        if a is not None:
+            func_params = [None, 'setDoubleArray', obj, a]
             _, mate.rc = mate.remote_access(func_params, mate.rc)
-        func_params = [args[0], 'getPair', obj]
+        func_params = [args[0], 'getDoubleArray', obj]
         a, mate.rc = mate.remote_access(func_params, mate.rc)
     elif p == 'function':
-        flat_value = mate.flat_values(0, 0, 1).values[0]
+        flat_value = mate.shared_flat_values(0, 0, 1).values[0]
         if a and mate.testmode:
             if isinstance(args[0], bool):
                 flat_value.type = 4
@@ -1005,7 +1315,7 @@ def _process(p, caller, a, *args, **kwargs):
                 flat_value.type = 6
                 flat_value.pairX = args[0][0]
                 flat_value.pairY = args[0][1]
-        p_args = _ctypes.pointer(mate.flat_values(255, 0, 1))
+        p_args = _ctypes.pointer(mate.shared_flat_values(255, 0, 1))
         if a:
             if not isinstance(a, str):
                 a = ''
@@ -1015,6 +1325,8 @@ def _process(p, caller, a, *args, **kwargs):
             p_args[0].values[0].string[0][0].text = a
         func_params = [flat_value, p, obj, p_args]
         out, mate.rc = mate.remote_access(func_params, mate.rc)
+        if caller[0].__class__.__name__ == '_Experiment':
+            property_cache.clear()
         if a:
             if out.type == 1:
                 a = out.integer
@@ -1040,17 +1352,141 @@ def _process(p, caller, a, *args, **kwargs):
     return a
 
 
-def _no_event():
-    global event_out, esc
+def get_double_array(element, parameter, size, test=None):
+    """
+    Reads an array of doubles property in one call.
+
+    Parameters
+    ----------
+    element : object
+        The experiment element, e.g. mo.spectroscopy
+    parameter : str
+        The name of the array property
+    size : int
+        The maximum number of values to read
+    test : Numpy array or None, optional
+        Buffer to read into, and to return as-is if the read fails. Default is a new array of zeros
+
+    Returns
+    -------
+    values : Numpy array
+        float64 array of the values that were read
+    """
+    if test is None:
+        test = _np.zeros(size)
+    return _process('double_array', [element, parameter], None, test)
+
+
+def set_double_array(element, parameter, values, test=None):
+    """
+    Writes an array of doubles property in one call, and reads it back.
+
+    Parameters
+    ----------
+    element : object
+        The experiment element, e.g. mo.spectroscopy
+    parameter : str
+        The name of the array property
+    values : array_like
+        The values to write. Converted to contiguous float64 if they are not already
+    test : Numpy array or None, optional
+        Buffer to read back into. Default is a new array the same size as values
+
+    Returns
+    -------
+    values : Numpy array
+        float64 array of the values read back
+    """
+    values = _np.ascontiguousarray(values, dtype=_np.float64)
+    if test is None:
+        test = _np.zeros(values.size)
+    return _process('double_array', [element, parameter], values, test)
+
+
+def _read(func_params, cacheable):
+    """Get a property, answering from the property cache if enabled and already read."""
+    obj = func_params[2]
+    if cacheable:
+        try:
+            value = property_cache.values[obj]
+            property_cache.hits += 1
+            return value
+        except KeyError:
+            property_cache.misses += 1
+    value, mate.rc = mate.remote_access(func_params, mate.rc)
+    if cacheable and mate.rc == mate.rcs['RMT_SUCCESS']:
+        property_cache.values[obj] = value
+    return value
+
+
+def _write(func_params, value, get_params, cacheable):
+    """Set a property, dropping any cached values of its experiment element, and read it back unless write_mode says
+    otherwise. A value that was sent but not read back is never cached, as the Matrix may not have taken it."""
+    obj = func_params[2]
+    if write_mode.elide and cacheable and property_cache.values.get(obj, _MISSING) == value:
+        write_mode.elided += 1
+        return value
+    _, mate.rc = mate.remote_access(func_params, mate.rc)
+    property_cache.invalidate(obj)
+    if write_mode.readback:
+        return _read(get_params, cacheable)
+    if write_mode.verify:
+        write_mode.pending[obj] = (get_params, value, cacheable)
+    return value
+
+
+@_contextmanager
+def fast_writes(elide=True, verify=False):
+    """
+    Within the block, setters return the value sent instead of reading it back from the Matrix, halving the cost of
+    each write.
+
+    Parameters
+    ----------
+    elide : bool, optional
+        Skip writes of a value already held in the property cache, i.e. last read from the Matrix. Only has an effect
+        if property_cache.enabled. Default is True
+    verify : bool, optional
+        Read back every property written in the block once, at the end of the block, and cache the values read. If
+        the block raises, nothing is read back. Default is False
+
+    Examples
+    --------
+    >>> with fast_writes(verify=True):
+    >>>     mo.spectroscopy.Device_1_Start(0)
+    >>>     mo.spectroscopy.Device_1_End(1)
+    """
+    previous = write_mode.readback, write_mode.elide, write_mode.verify
+    write_mode.readback, write_mode.elide, write_mode.verify = False, elide, verify
+    try:
+        yield write_mode
+    except BaseException:
+        write_mode.pending.clear()
+        raise
+    finally:
+        write_mode.readback, write_mode.elide, write_mode.verify = previous
+    if verify:
+        write_mode.confirm()
+
+
+def _poll_event():
+    """Fetch one event into event_out, returning True if there is one to dispatch."""
+    global event_out, _p_values
     func_params = [(_test_event_object, 0, _p_values), 'getEvent']
     event_out, mate.rc = mate.remote_access(func_params, mate.rc)
-    no_event = mate.rc == mate.rcs['RMT_NOEVENT']
     if mate.rc == mate.rcs['RMT_SUCCESS'] or mate.testmode:
-        v = event_objects[event_out[0][len(mate.scope) + 2:]]
+        _p_values = sample_buffers.swap()
+        return True
+    return False
+
+
+def _dispatch_event():
+    name = event_out[0][len(mate.scope) + 2:]
+    property_cache.event(name)
+    v = event_objects.get(name)
+    # Events still queued for an observer that has since been unregistered are dropped
+    if v is not None and v[0] is not None:
         v[0](*v[1], **v[2])
-    # if kbhit():
-    #     esc = ord(getch()) == 27
-    return no_event# and not esc
 
 
 def _check_rc():
@@ -1062,32 +1498,152 @@ def _exit_handler():
     pass
 
 
-def wait_for_event():
+def wait_for_event(until=None):
+    """
+    Wait for the next event and dispatch it to its callback, along with any more already pending, polling as set in
+    event_wait.
+
+    Parameters
+    ----------
+    until : callable or None, optional
+        Stop waiting, or dispatching pending events, as soon as this returns True, e.g. once a callback has received
+        all the data wanted. Default is None, to wait for an event and dispatch all pending events
+    """
     log.AppendText('Waiting for event...\n')
-    while _no_event():
-        pass
-        # sleep(0.01)
+    event_wait.wait(until)
+
+
+def _element_name(element):
+    if isinstance(element, str):
+        return element
+    return next((k for k, v in elements.items() if v is element), element.__class__.__name__)
+
+
+def read_many(properties):
+    """
+    Reads a list of properties in one call, collecting errors for each instead of raising on the first.
+
+    Parameters
+    ----------
+    properties : list
+        (element, property) pairs, where element is an element name (e.g. "xy_scanner") or the element itself
+
+    Returns
+    -------
+    snapshot : dict
+        Values keyed by "element.Property", each of the type declared in property_types. Properties that could not be
+        read are missing, and their exceptions are in snapshot.errors. The seconds taken by each read are in
+        snapshot.timings, and by all of them in snapshot.total_time
+
+    Examples
+    --------
+    >>> state = read_many([("xy_scanner", "Width"), ("regulator", "Z_Out"), ("pll", "Delta_f")])
+    >>> state["xy_scanner.Width"], state.errors, state.total_time
+    """
+    snapshot = _Snapshot()
+    start = _time.perf_counter()
+    for element, prop in properties:
+        name = _element_name(element)
+        key = name + '.' + prop
+        read_start = _time.perf_counter()
+        try:
+            element = elements[name]
+            p = property_types[element.__class__.__name__][prop]
+            snapshot[key] = _process(p, [element, prop], None, _type_defaults[p])
+        except Exception as e:
+            snapshot.errors[key] = e
+        snapshot.timings[key] = _time.perf_counter() - read_start
+    snapshot.total_time = _time.perf_counter() - start
+    return snapshot
+
+
+def snapshot(element=None):
+    """
+    Reads every property of an experiment element, or of all elements, with read_many().
+
+    Parameters
+    ----------
+    element : str, object or None
+        The element name (e.g. "regulator") or the element itself. If None (default), dump all elements
+
+    Examples
+    --------
+    >>> state = snapshot("regulator")
+    """
+    if element is None:
+        names = list(elements)
+    else:
+        names = [_element_name(element)]
+    return read_many([(name, prop) for name in names
+                      for prop in property_types[elements[name].__class__.__name__]])
+
+
+def get_view(channel_name):
+    """
+    The view of a channel, independent of the channel enabled last, for observing several channels at once.
+
+    Parameters
+    ----------
+    channel_name : str
+        The full channel name, e.g. Z_Fw, I_Bw
+
+    Returns
+    -------
+    view : _View
+
+    Examples
+    --------
+    Record Z and I in the same pass
+    >>> IO.enable_channel("Z_Fw")
+    >>> IO.enable_channel("I_Fw")
+    >>> mo.get_view("Z_Fw").Data(z_callback)
+    >>> mo.get_view("I_Fw").Data(i_callback)
+    """
+    try:
+        return _channel_views[channel_name]
+    except KeyError:
+        view = _channel_views[channel_name] = _View(channel_name)
+        return view
 
 
 def get_clock_name(channel_name):
     global clock_name
-    clock_name = mate.deployment_parameter(mate.scope, channel_name, 'Trigger')
+    clock_name = mate.channel(channel_name).trigger
 
 
 def allocate_sample_memory(samples, test=None):
     global _p_values
-    _p_values = _ctypes.pointer(mate.flat_values(0, samples, 1))
+    _p_values = sample_buffers.acquire(samples)
     if mate.testmode:
         if not test:
             b = 0.001
             a = -0.001
             test = [(b - a) * random() + a for i in range(samples)]
-        _p_values[0].values[0].realArray[0][0].values = (_ctypes.c_double *
-                                                         len(test))(*test)
+        for p_values in sample_buffers.buffers:
+            _np.ctypeslib.as_array(p_values[0].values[0].realArray[0][0].values)[:len(test)] = test
+
+
+def sample_data(data_size, copy=False):
+    """
+    The samples delivered with the last event.
 
+    Parameters
+    ----------
+    data_size : int
+        The number of samples to return, normally from view.Data_Size()
+    copy : bool, optional
+        If False (default), return a view backed directly by the sample buffer, which is overwritten by the next
+        event. Set to True if the data is kept beyond the current callback.
 
-def sample_data(data_size):
-    return event_out[2][0].values[0].realArray[0][0].values[:data_size]
+    Returns
+    -------
+    data : Numpy array
+    """
+    values = event_out[2][0].values[0].realArray[0][0].values
+    data = _np.ctypeslib.as_array(values)[:data_size]
+    if copy:
+        data = data.copy()
+    return data
 
 
 log = _Text('Starting log on ' + _time.strftime('%A, %d %B %Y %H:%M:%S',
@@ -1095,7 +1651,11 @@ log = _Text('Starting log on ' + _time.strftime('%A, %d %B %Y %H:%M:%S',
 mate = _MATE(log, _exit_handler, False)
 event_objects = {}
 _test_event_object = ''
-_p_values = _ctypes.pointer(mate.flat_values(0, 0, 1))
+property_cache = _PropertyCache()
+write_mode = _WriteMode()
+sample_buffers = _SampleBuffers()
+event_wait = _EventWait()
+_p_values = sample_buffers.acquire(0)
 event_out = ('', 0, _p_values)
 channel_name = ''
 clock_name = ''
@@ -1107,8 +1667,12 @@ piezo_control = _PiezoControl()
 pll = _PLLControl()
 regulator = _Regulator()
 view = _View()
+_channel_views = {}
 xy_scanner = _XYScanner()
 spectroscopy = _Spectroscopy()
 crtcservice = _CRTCService()
+elements = dict(channel=channel, clock=clock, experiment=experiment, gap_voltage_control=gap_voltage_control,
+                piezo_control=piezo_control, pll=pll, regulator=regulator, view=view, xy_scanner=xy_scanner,
+                spectroscopy=spectroscopy, crtcservice=crtcservice)
 tot_packets = 0
 esc = False
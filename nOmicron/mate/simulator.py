@@ -0,0 +1,565 @@
+# Oliver Gordon, 2019
+
+"""
+A simulated Matrix, standing in for RemoteAccess_API.dll so that everything above MATE runs without the instrument.
+
+The simulator has the same functions as the library, taking the same ctypes arguments, and keeps a store of properties
+in place of the experiment elements. Starting the experiment scans a synthetic surface line by line, enabling a clock
+fills a buffer of a synthetic signal, and moving the tip with Trigger_Execute_At_Target_Position runs spectroscopy, each
+delivering its data as events once the raster time of the points has passed. Only observed views with Deliver_Data
+set receive events, as with the Matrix.
+
+Examples
+--------
+>>> from nOmicron.mate.simulator import Simulator
+>>> from nOmicron.microscope import IO, xy_scanner
+>>> IO.connect(backend=Simulator(speed=100))
+>>> z = xy_scanner.get_xy_scan("Z", "Forward", "Up", num_lines=10)
+"""
+
+import heapq
+import itertools
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+RMT_SUCCESS = 0x00000001
+RMT_NOEVENT = 0x00000020 | 0x00000003
+RMT_UNKNOWNOBJECT = 0x00000020 | 0x00000002
+
+# Channels of the simulated experiment, and what triggers them
+scan_channels = ('Z', 'I', 'Aux1', 'Aux2', 'Df')
+clock_channels = dict(I_t='Clock1', Z_t='Clock2', Aux1_t='Clock3', Aux2_t='Clock4', Df_t='Clock5')
+spectroscopy_channels = ('I_V', 'Z_V', 'Aux1_V', 'Aux2_V', 'I_Z', 'Aux1_Z')
+
+# Starting values of the properties used by the microscope modules. Anything else reads as zero until written
+default_properties = {
+    'XYScanner.Points': 128, 'XYScanner.Lines': 128, 'XYScanner.Raster_Time': 1e-3, 'XYScanner.Angle': 0,
+    'XYScanner.Width': 50e-9, 'XYScanner.Height': 50e-9, 'XYScanner.Area': (50e-9, 50e-9),
+    'XYScanner.X_Offset': 0.0, 'XYScanner.Y_Offset': 0.0, 'XYScanner.Offset': (0.0, 0.0),
+    'XYScanner.X_Retrace': True, 'XYScanner.Y_Retrace': False, 'XYScanner.Enable_Scan': True,
+    'XYScanner.Points_Lines_Constrained': True, 'XYScanner.Width_Height_Constrained': True,
+    'XYScanner.Move_Raster_Time': 1e-3, 'XYScanner.Target_Position': (0.0, 0.0),
+    'XYScanner.XY_Position_Report': (0.0, 0.0),
+    'Spectroscopy.Device_1_Points': 100, 'Spectroscopy.Device_1_Start': -1.0, 'Spectroscopy.Device_1_End': 1.0,
+    'Spectroscopy.Raster_Time_1': 1e-3, 'Spectroscopy.Device_1_Repetitions': 1,
+    'Spectroscopy.Device_2_Points': 100, 'Spectroscopy.Device_2_Start': 0.0, 'Spectroscopy.Device_2_End': 1e-9,
+    'Spectroscopy.Raster_Time_2': 1e-3, 'Spectroscopy.Device_2_Repetitions': 1,
+    'GapVoltageControl.Voltage': 1.0, 'Regulator.Setpoint_1': 100e-12, 'Regulator.Feedback_Loop_Enabled': True,
+    'PLLControl.PLL_Centre_Frequency': 25e3,
+}
+
+# Limits reported by the min and max functions, otherwise those of the property's type
+limits = {'XYScanner.Points': (2, 4096), 'XYScanner.Lines': (2, 4096), 'XYScanner.Raster_Time': (2e-5, 10.0),
+          'XYScanner.Angle': (-180, 180), 'XYScanner.Width': (1e-10, 5e-6), 'XYScanner.Height': (1e-10, 5e-6),
+          'GapVoltageControl.Voltage': (-10.0, 10.0), 'Spectroscopy.Device_1_Start': (-10.0, 10.0),
+          'Spectroscopy.Device_1_End': (-10.0, 10.0), 'Spectroscopy.Device_1_Points': (2, 100000),
+          'Spectroscopy.Device_2_Points': (2, 100000)}
+
+
+def _value(ref):
+    """The ctypes object passed by reference with ctypes.byref."""
+    return ref._obj
+
+
+class Surface(object):
+    """
+    A synthetic sample: a hexagonal atomic lattice on terraces separated by monatomic steps, with a few adsorbates.
+    Heights are in metres, at positions in metres.
+
+    Parameters
+    ----------
+    lattice : float, optional
+        Lattice constant. Default is 0.4 nm
+    corrugation : float, optional
+        Peak to peak height of the atomic lattice. Default is 20 pm
+    step : float, optional
+        Height of each terrace step. Default is 0.2 nm
+    seed : int, optional
+        For the positions of steps and adsorbates. Default is 0
+    """
+
+    def __init__(self, lattice=0.4e-9, corrugation=20e-12, step=0.2e-9, seed=0):
+        rng = np.random.default_rng(seed)
+        self.lattice = lattice
+        self.corrugation = corrugation
+        self.step = step
+        self.step_spacing = 40e-9
+        self.step_direction = rng.uniform(0, np.pi)
+        self.adsorbates = rng.uniform(-100e-9, 100e-9, (40, 2))
+        k = 4 * np.pi / (np.sqrt(3) * lattice)
+        self.wavevectors = k * np.array([[np.cos(a), np.sin(a)] for a in (0, 2 * np.pi / 3, 4 * np.pi / 3)])
+
+    def height(self, x, y):
+        lattice = sum(np.cos(kx * x + ky * y) for kx, ky in self.wavevectors)
+        z = self.corrugation * (lattice + 1.5) / 4.5
+        across = x * np.cos(self.step_direction) + y * np.sin(self.step_direction)
+        z = z + self.step * np.floor(across / self.step_spacing)
+        for ax, ay in self.adsorbates:
+            z = z + 0.15e-9 * np.exp(-((x - ax) ** 2 + (y - ay) ** 2) / (2 * 0.6e-9 ** 2))
+        return z
+
+
+class _Scan(object):
+    """Line by line events of an imaging scan, repeating frames until stopped."""
+
+    def __init__(self, simulator, start):
+        self.simulator = simulator
+        self.start = start
+        self.paused = None
+
+    def events(self):
+        s = self.simulator
+        t = 0.0
+        cycle = 0
+        while True:
+            points, lines = s.get('XYScanner.Points'), s.get('XYScanner.Lines')
+            pass_time = points * s.get('XYScanner.Raster_Time')
+            x_directions = ('Fw', 'Bw') if s.get('XYScanner.X_Retrace') else ('Fw',)
+            y_directions = ('Up', 'Down') if s.get('XYScanner.Y_Retrace') else ('Up',)
+            cycle += 1
+            packet = 0
+            for y_direction in y_directions:
+                for line in (range(lines) if y_direction == 'Up' else reversed(range(lines))):
+                    for x_direction in x_directions:
+                        t += pass_time
+                        packet += 1
+                        for channel in scan_channels:
+                            yield t, f'{channel}_{x_direction}', (cycle, packet), \
+                                  lambda c=channel, d=x_direction, l=line: s.scan_line(c, d, l)
+
+
+class _Clock(object):
+    """One buffer of a continuous signal, for the channels triggered by a clock."""
+
+    def __init__(self, simulator, start, clock):
+        self.simulator = simulator
+        self.start = start
+        self.paused = None
+        self.clock = clock
+
+    def events(self):
+        s = self.simulator
+        samples = s.get(f'{self.clock}.Samples')
+        period = s.get(f'{self.clock}.Period')
+        for channel, clock in clock_channels.items():
+            if clock == self.clock:
+                yield samples * period, channel, (1, 1), \
+                      lambda c=channel, t0=self.start: s.continuous_signal(c, t0, samples, period)
+
+
+class _Spectroscopy(object):
+    """Sweeps of the spectroscopy device set by Spectroscopy_Mode, and back if ramp reversal is enabled."""
+
+    def __init__(self, simulator, start):
+        self.simulator = simulator
+        self.start = start
+        self.paused = None
+
+    def events(self):
+        s = self.simulator
+        mode = s.get('Spectroscopy.Spectroscopy_Mode')
+        device = min(mode, 1) + 1
+        points = s.get(f'Spectroscopy.Device_{device}_Points')
+        sweep = np.linspace(s.get(f'Spectroscopy.Device_{device}_Start'), s.get(f'Spectroscopy.Device_{device}_End'),
+                            points)
+        sweep_time = points * s.get(f'Spectroscopy.Raster_Time_{device}')
+        directions = (sweep, sweep[::-1]) if s.get(f'Spectroscopy.Enable_Device_{device}_Ramp_Reversal') else (sweep,)
+        suffix = '_Z' if mode == 1 else '_V'
+        t = 0.0
+        for cycle in range(1, max(s.get(f'Spectroscopy.Device_{device}_Repetitions'), 1) + 1):
+            for packet, values in enumerate(directions, 1):
+                t += sweep_time
+                for channel in spectroscopy_channels:
+                    if channel.endswith(suffix):
+                        yield t, channel + '_Spec', (cycle, packet), \
+                              lambda c=channel, v=values: s.spectrum(c, v)
+
+
+class Simulator(object):
+    """
+    Stands in for RemoteAccess_API.dll, with the same functions and arguments. Pass to IO.connect as the backend, to
+    run in a FakeBackend.
+
+    Parameters
+    ----------
+    scope : str, optional
+        Name of the simulated experiment. Default is STM_Spectroscopy
+    speed : float, optional
+        Simulated seconds per second, to run acquisitions faster (or slower) than real time. Default is 1
+    noise : float, optional
+        Relative noise on all data. Default is 0.01
+    surface : Surface or None, optional
+        The sample to scan. Default is None, for Surface()
+    seed : int, optional
+        For the noise. Default is 0
+
+    Attributes
+    ----------
+    properties : dict
+        The property store, as {descriptor: value}, e.g. {"XYScanner.Points": 128}
+    calls : dict
+        Number of calls to each library function
+    """
+
+    def __init__(self, scope='STM_Spectroscopy', speed=1.0, noise=0.01, surface=None, seed=0):
+        self.scope = scope
+        self.speed = speed
+        self.noise = noise
+        self.surface = Surface() if surface is None else surface
+        self.rng = np.random.default_rng(seed)
+        self.properties = dict(default_properties)
+        self.properties.update({f'{scope}.State': 'idle', f'{scope}.Name': scope,
+                                f'{scope}.Result_File_Name': time.strftime('default_%Y%b%d-%H%M%S') + f'_{scope}',
+                                f'{scope}.Result_File_Path': '', f'{scope}.Bricklet_Ready': '',
+                                f'{scope}.Bricklet_Written': ''})
+        for clock in clock_channels.values():
+            self.properties.update({f'{clock}.Period': 1e-3, f'{clock}.Samples': 100, f'{clock}.Enable': False})
+        self.observed = set()
+        self.activities = {}
+        self.queue = []
+        self.order = itertools.count()
+        self.run_count = 0
+        self.calls = {}
+        self.t0 = time.perf_counter()
+        self.directory = None
+        self.paths = self._write_experiment()
+
+    def __del__(self):
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _write_experiment(self):
+        """The experiment definition files read by MATE.connect and MATE.channel_registry, in a temporary directory."""
+        self.directory = tempfile.mkdtemp(prefix='nOmicron_simulator_')
+        installation_directory = os.path.join(self.directory, 'MATRIX')
+        templates = os.path.join(installation_directory, 'Templates', 'default', 'Experiments')
+        experiments_directory = os.path.join(self.directory, 'Experiments')
+        os.makedirs(templates)
+        os.makedirs(experiments_directory)
+        triggers = dict({c: 'XYScanner' for c in scan_channels}, **clock_channels,
+                        **{c: 'Spectroscopy' for c in spectroscopy_channels})
+        with open(os.path.join(templates, self.scope + '.expd'), 'w') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<ExperimentDefinition>\n')
+            for name in triggers:
+                f.write(f'  <Panel panelType="ChannelControl" experimentElementInstanceName="{name}"/>\n')
+            f.write('</ExperimentDefinition>\n')
+        shutil.copy(os.path.join(templates, self.scope + '.expd'), experiments_directory)
+        with open(os.path.join(experiments_directory, self.scope + '.exps'), 'w') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<ExperimentStructure xmlns="http://www.omicron.de/ExperimentStructure">\n')
+            for name, trigger in triggers.items():
+                f.write(f'  <ExperimentElementInstance name="{name}">\n'
+                        f'    <DeploymentParameter name="Trigger" value="{trigger}::Trigger"/>\n'
+                        f'  </ExperimentElementInstance>\n')
+            f.write('</ExperimentStructure>\n')
+        return dict(installation_directory=installation_directory, library_path='',
+                    matrix_dir='simulated', experiments_directory=experiments_directory)
+
+    # Simulated time and events
+
+    def now(self):
+        """Simulated seconds since the simulator was made."""
+        return (time.perf_counter() - self.t0) * self.speed
+
+    def get(self, desc):
+        return self.properties.get(desc, 0)
+
+    def _begin(self, name, activity):
+        """Start an activity, replacing any of the same name, and queue its first event."""
+        self.activities[name] = activity
+        self._queue_next(name, activity, activity.events())
+
+    def _queue_next(self, name, activity, events):
+        event = next(events, None)
+        if event is not None:
+            t, view, counts, data = event
+            heapq.heappush(self.queue, (activity.start + t, next(self.order), name, activity, events, view, counts,
+                                        data))
+
+    def _end(self, name):
+        self.activities.pop(name, None)
+
+    def _next_event(self):
+        """The next event due, as (view, counts, data), skipping those of ended activities and unobserved views."""
+        while self.queue:
+            due, _, name, activity, events, view, counts, data = self.queue[0]
+            if self.activities.get(name) is not activity:
+                heapq.heappop(self.queue)
+                continue
+            if due > self.now():
+                return None
+            heapq.heappop(self.queue)
+            self._queue_next(name, activity, events)
+            if f'View.{view}.Data' in self.observed and self.get(f'View.{view}.Deliver_Data'):
+                return view, counts, data
+        return None
+
+    def _function(self, desc, arg):
+        if desc is None:
+            return None
+        element, function = desc.rsplit('.', 1)
+        now = self.now()
+        if element == self.scope:
+            scan = self.activities.get('scan')
+            if function in ('start', 'restart') or (function == 'resume' and scan is None):
+                self.run_count += 1
+                self._begin('scan', _Scan(self, now))
+                self.properties[f'{self.scope}.State'] = 'running'
+            elif function == 'stop':
+                self._end('scan')
+                self.properties[f'{self.scope}.State'] = 'idle'
+            elif function == 'pause' and scan is not None and scan.paused is None:
+                # Hold back the events still to come until resumed
+                scan.paused = now
+                scan.held = [e for e in self.queue if e[3] is scan]
+                self.queue = [e for e in self.queue if e[3] is not scan]
+                heapq.heapify(self.queue)
+                self.properties[f'{self.scope}.State'] = 'paused'
+            elif function == 'resume' and scan.paused is not None:
+                shift = now - scan.paused
+                scan.start += shift
+                for e in scan.held:
+                    heapq.heappush(self.queue, (e[0] + shift,) + e[1:])
+                scan.paused = None
+                self.properties[f'{self.scope}.State'] = 'running'
+        elif function in ('min', 'max'):
+            prop = f'{element}.{arg}'
+            value = self.get(prop)
+            lower, upper = limits.get(prop, (-2 ** 31, 2 ** 31 - 1) if isinstance(value, int) else (-1e9, 1e9))
+            bound = lower if function == 'min' else upper
+            return (bound, bound) if isinstance(value, tuple) else bound
+        elif desc == 'XYScanner.move':
+            target = self.get('XYScanner.Target_Position')
+            self.properties['XYScanner.XY_Position_Report'] = target
+            if self.get('XYScanner.Trigger_Execute_At_Target_Position'):
+                self._begin('spectroscopy', _Spectroscopy(self, now))
+        elif desc == 'Spectroscopy.execute':
+            self._begin('spectroscopy', _Spectroscopy(self, now))
+        return None
+
+    def _set(self, desc, value):
+        if desc is None:
+            return RMT_UNKNOWNOBJECT
+        element, prop = desc.rsplit('.', 1)
+        self.properties[desc] = value
+        if element in clock_channels.values() and prop == 'Enable':
+            if value:
+                self._begin(element, _Clock(self, self.now(), element))
+            else:
+                self._end(element)
+        elif desc == 'XYScanner.Points' and self.get('XYScanner.Points_Lines_Constrained'):
+            self.properties['XYScanner.Lines'] = value
+        elif desc == 'XYScanner.Width' and self.get('XYScanner.Width_Height_Constrained'):
+            self.properties['XYScanner.Height'] = value
+        elif desc == 'XYScanner.Return_To_Stored_Position' and value:
+            self.properties['XYScanner.XY_Position_Report'] = self.get('XYScanner.Stored_Position') or (0.0, 0.0)
+        elif desc == 'XYScanner.Store_Current_Position' and value:
+            self.properties['XYScanner.Stored_Position'] = self.get('XYScanner.XY_Position_Report')
+        return RMT_SUCCESS
+
+    # Synthetic data
+
+    def _noisy(self, values, scale):
+        return values + self.noise * scale * self.rng.standard_normal(np.shape(values))
+
+    def scan_line(self, channel, x_direction, line):
+        """One pass of a scan line, in the order scanned."""
+        points, lines = self.get('XYScanner.Points'), self.get('XYScanner.Lines')
+        width, height = self.get('XYScanner.Width'), self.get('XYScanner.Height')
+        u = (np.arange(points) / max(points - 1, 1) - 0.5) * width
+        v = (line / max(lines - 1, 1) - 0.5) * height
+        if x_direction == 'Bw':
+            u = u[::-1]
+        angle = np.radians(self.get('XYScanner.Angle'))
+        x = self.get('XYScanner.X_Offset') + u * np.cos(angle) - v * np.sin(angle)
+        y = self.get('XYScanner.Y_Offset') + u * np.sin(angle) + v * np.cos(angle)
+        z = self.surface.height(x, y)
+        if channel == 'Z':
+            return self._noisy(z, 1e-10)
+        if channel == 'I':
+            # The feedback loop lags behind steps in the surface
+            error = np.gradient(z) / self.surface.lattice
+            return self._noisy(self.get('Regulator.Setpoint_1') * (1 + error), self.get('Regulator.Setpoint_1'))
+        if channel == 'Df':
+            return self._noisy(-2.0 - z / 1e-10, 1.0)
+        return self._noisy(np.zeros(points), 1.0)
+
+    def continuous_signal(self, channel, start, samples, period):
+        """A buffer of a continuous signal, from start in simulated time."""
+        t = start + np.arange(samples) * period
+        scale = {'I_t': self.get('Regulator.Setpoint_1'), 'Z_t': 1e-10}.get(channel, 1.0)
+        # Slow drift plus a little mains pickup
+        return self._noisy(scale * (1 + 0.05 * np.sin(2 * np.pi * 0.1 * t) + 0.01 * np.sin(2 * np.pi * 50 * t)),
+                           scale)
+
+    def spectrum(self, channel, sweep):
+        """One sweep of a spectrum, at the values of the swept device in the order swept."""
+        if channel == 'I_V':
+            # A tunnelling junction with a gap-like onset
+            return self._noisy(1e-9 * (0.2 * sweep + np.sinh(2 * sweep) / 2), 1e-10)
+        if channel == 'Z_V':
+            return self._noisy(1e-10 * np.log1p(np.abs(sweep)), 1e-12)
+        if channel == 'I_Z':
+            return self._noisy(1e-9 * np.exp(-2e10 * (np.asarray(sweep) - sweep.min())), 1e-11)
+        return self._noisy(np.zeros(len(sweep)), 1.0)
+
+    # The library functions
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _desc(self, desc):
+        desc = desc.decode()
+        # Descriptors may be qualified by their scope, as when probing for experiments
+        scope, _, name = desc.rpartition('::')
+        if scope and scope != self.scope:
+            return None
+        return name
+
+    def setHost(self, host):
+        self._count('setHost')
+        return RMT_SUCCESS
+
+    def init(self, installation_directory):
+        self._count('init')
+        return RMT_SUCCESS
+
+    def rundown(self):
+        self._count('rundown')
+        self.observed.clear()
+        self.activities.clear()
+        self.queue = []
+        return RMT_SUCCESS
+
+    def setScopeName(self, scope):
+        self._count('setScopeName')
+        return RMT_SUCCESS
+
+    def _get(self, name, desc):
+        self._count(name)
+        desc = self._desc(desc)
+        if desc is None:
+            return None, RMT_UNKNOWNOBJECT
+        return self.get(desc), RMT_SUCCESS
+
+    def getStringPropertyByDesc(self, desc, index, p_s):
+        value, rc = self._get('getStringPropertyByDesc', desc)
+        if rc == RMT_SUCCESS:
+            s = _value(p_s).contents
+            s.text = (value or '').encode()[:255]
+            s.length = len(s.text)
+        return rc
+
+    def getBooleanProperty(self, desc, index, b):
+        value, rc = self._get('getBooleanProperty', desc)
+        _value(b).value = b'\x01' if value else b'\x00'
+        return rc
+
+    def getIntegerProperty(self, desc, index, i):
+        value, rc = self._get('getIntegerProperty', desc)
+        _value(i).value = int(value or 0)
+        return rc
+
+    def getEnumProperty(self, desc, index, e):
+        value, rc = self._get('getEnumProperty', desc)
+        _value(e).value = int(value or 0)
+        return rc
+
+    def getDoubleProperty(self, desc, index, d):
+        value, rc = self._get('getDoubleProperty', desc)
+        _value(d).value = float(value or 0)
+        return rc
+
+    def getPairProperty(self, desc, index, d1, d2):
+        value, rc = self._get('getPairProperty', desc)
+        _value(d1).value, _value(d2).value = value or (0.0, 0.0)
+        return rc
+
+    def getDoubleArrayProperty(self, desc, index, count, p_values):
+        value, rc = self._get('getDoubleArrayProperty', desc)
+        value = np.asarray(value if value is not None and np.ndim(value) else [], dtype=np.float64)
+        n = min(value.size, _value(count).value)
+        if n:
+            np.ctypeslib.as_array(_value(p_values), shape=(n,))[:] = value[:n]
+        _value(count).value = n
+        return rc
+
+    def getEntityEventByDesc(self, p_prop, value_count, p_values, timeout):
+        self._count('getEntityEventByDesc')
+        event = self._next_event()
+        if event is None:
+            return RMT_NOEVENT
+        view, (cycle, packet), data = event
+        data = np.asarray(data(), dtype=np.float64)
+        real_array = _value(p_values)[0].values[0].realArray[0][0]
+        n = min(data.size, len(real_array.values))
+        np.ctypeslib.as_array(real_array.values)[:n] = data[:n]
+        real_array.length = n
+        self.properties.update({f'View.{view}.Data_Size': n, f'View.{view}.Run_Count': max(self.run_count, 1),
+                                f'View.{view}.Cycle_Count': cycle, f'View.{view}.Packet_Count': packet})
+        prop = _value(p_prop).contents
+        prop.text = f'{self.scope}::View.{view}.Data'.encode()
+        prop.length = len(prop.text)
+        _value(value_count).value = 1
+        return RMT_SUCCESS
+
+    def triggerProperty(self, desc, index):
+        self._count('triggerProperty')
+        return RMT_SUCCESS if self._desc(desc) is not None else RMT_UNKNOWNOBJECT
+
+    def setStringProperty(self, desc, index, value):
+        self._count('setStringProperty')
+        return self._set(self._desc(desc), value.decode())
+
+    def setBooleanProperty(self, desc, index, value):
+        self._count('setBooleanProperty')
+        return self._set(self._desc(desc), bool(value))
+
+    def setIntegerProperty(self, desc, index, value):
+        self._count('setIntegerProperty')
+        return self._set(self._desc(desc), int(value))
+
+    def setEnumProperty(self, desc, index, value):
+        self._count('setEnumProperty')
+        return self._set(self._desc(desc), int(value))
+
+    def setDoubleProperty(self, desc, index, value):
+        self._count('setDoubleProperty')
+        return self._set(self._desc(desc), float(value.value))
+
+    def setDoubleArrayProperty(self, desc, index, size, p_values):
+        self._count('setDoubleArrayProperty')
+        return self._set(self._desc(desc), np.ctypeslib.as_array(p_values, shape=(size,)).copy())
+
+    def setPairProperty(self, desc, index, d1, d2):
+        self._count('setPairProperty')
+        return self._set(self._desc(desc), (float(d1.value), float(d2.value)))
+
+    def setObservedEntity(self, desc, observe):
+        self._count('setObservedEntity')
+        desc = self._desc(desc)
+        if observe:
+            self.observed.add(desc)
+        else:
+            self.observed.discard(desc)
+        return RMT_SUCCESS
+
+    def callFunctionByDesc(self, desc, flat_value, p_args):
+        self._count('callFunctionByDesc')
+        args = _value(p_args).contents.values[0]
+        arg = args.string[0][0].text[:args.string[0][0].length].decode() if args.type == 3 else None
+        out = self._function(self._desc(desc), arg)
+        o = _value(flat_value)
+        if isinstance(out, bool):
+            o.type, o.boolean = 4, out
+        elif isinstance(out, int):
+            o.type, o.integer = 1, out
+        elif isinstance(out, float):
+            o.type, o.real = 2, out
+        elif isinstance(out, tuple):
+            o.type, o.pairX, o.pairY = 6, out[0], out[1]
+        return RMT_SUCCESS
@@ -4,13 +4,44 @@ from nOmicron.mate import objects as mo
 from nOmicron.utils import utils
 
 
-def connect():
-    """Connect to the Matrix. Matrix must be open and initalised."""
+def connect(prefetch_limits=False, limits_file=None, warm_start=True, backend=None):
+    """Connect to the Matrix. Matrix must be open and initalised.
+
+    Parameters
+    ----------
+    prefetch_limits : bool, optional
+        Read the limits of all settable parameters now, rather than on the first write of each. This is over a hundred
+        calls to the Matrix, so is best done once with a limits_file to save them to. Default is False
+    limits_file : str or None, optional
+        A json file of parameter limits, per Matrix version and experiment, to load from (e.g.
+        ~/.nOmicron/min_max.json), and save to if prefetch_limits. Default is None, to keep limits for this session
+        only
+    warm_start : bool, optional
+        Reuse the Matrix paths saved by the last successful connection, rather than searching for the running Matrix.
+        Stale paths fall back to a search. Default is True
+    backend : str, Backend, Simulator or None, optional
+        How to reach the Matrix (see nOmicron.mate.backends): 'ctypes' for the remote access library, 'fake' or a
+        Simulator for a simulated Matrix, e.g. to develop or benchmark off the instrument, or a backend such as a
+        RecordBackend or ReplayBackend. Default is None, for 'ctypes'
+
+    Examples
+    --------
+    >>> from nOmicron.mate.simulator import Simulator
+    >>> IO.connect(backend=Simulator(speed=10))
+    """
 
     print("Connecting to the Matrix...")
     mo.mate.testmode = False
-    mo.mate.connect()
+    mo.property_cache.clear()
+    utils.clear_min_max()
+    mo.mate.connect(warm_start, backend)
     utils.is_online()
+    if limits_file is not None:
+        utils.load_min_max(limits_file)
+    if prefetch_limits:
+        utils.prefetch_min_max()
+        if limits_file is not None:
+            utils.save_min_max(limits_file)
     print("Connected Successfully!")
 
 
@@ -19,6 +50,7 @@ def disconnect():
     print("Disconnecting...")
     mo.experiment.stop()
     mo.mate.disconnect()
+    mo.property_cache.clear()
     print("Disconnected Successfully!")
 
 
@@ -37,9 +69,7 @@ def enable_channel(channel_name):
         utils.is_channel_real(channel_name[:-3])
     else:
         utils.is_channel_real(channel_name)
-
-    if len(channel_name) != 1 and channel_name[-1] != "t" and channel_name[-1] != "w":
-        channel_name += "_Spec"
+        channel_name = mo.mate.channel(channel_name).spectroscopy or channel_name
 
     mo.channel_name = channel_name
     if channel_name[-1] == "t":
@@ -48,8 +78,18 @@ def enable_channel(channel_name):
     mo.view.Deliver_Data(True)
 
 
-def disable_channel():
-    """Disables a channel from passing data."""
+def disable_channel(channel_name=None):
+    """Disables a channel from passing data.
+
+    Parameters
+    ----------
+    channel_name : str or None, optional
+        The full channel name, e.g. I_Fw, of one of several enabled channels. Default is None, for the channel enabled
+        last
+    """
+    if channel_name is not None:
+        mo.get_view(channel_name).Deliver_Data(False)
+        return
     if mo.channel_name == '':
         raise IOError("No channel to disable")
 
@@ -76,7 +116,7 @@ def set_clock(sample_time, sample_points):
     >>> IO.enable_channel("Z_t")
     >>> IO.set_clock(1e-2, 200)  # 100 milliseconds, 200 points will be acquired on next trigger
     """
-    if "Clock" not in mo.mate.deployment_parameter(mo.mate.scope, mo.channel_name, 'Trigger'):
+    if "Clock" not in mo.mate.channel(mo.channel_name).trigger:
         raise IOError("Attempted to set a clock for a non-clock object")
 
     mo.clock.Enable(False)
@@ -1,7 +1,5 @@
 from nOmicron.mate import objects as mo
 
-mo.pll.PLL_Enable(True)
-
 
 def enable_pll():
     mo.pll.PLL_Enable(True)
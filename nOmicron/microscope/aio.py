@@ -0,0 +1,242 @@
+# Oliver Gordon, 2019
+
+import asyncio
+import functools
+
+import numpy as np
+
+from nOmicron.mate import objects as mo
+from nOmicron.microscope import IO
+from nOmicron.microscope.xy_scanner import _xy_scan
+
+
+def _element(element):
+    return mo.elements[element] if isinstance(element, str) else element
+
+
+def _locked(func, *args, **kwargs):
+    # mate.rc and the ctypes values MATE reuses are shared by all threads, so a whole call, and the check of its return
+    # code, must not interleave with another
+    with mo.mate.lock:
+        return func(*args, **kwargs)
+
+
+async def _run(func, *args, **kwargs):
+    """Run a blocking call to the Matrix in the default executor, leaving the event loop free."""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(_locked, func, *args, **kwargs))
+
+
+async def get_property(element, prop):
+    """
+    Read a property without blocking the event loop.
+
+    Parameters
+    ----------
+    element : str or object
+        The element name, e.g. "xy_scanner", or the element itself, e.g. mo.xy_scanner
+    prop : str
+        The property name, e.g. "Points"
+
+    Returns
+    -------
+    value
+
+    Examples
+    --------
+    >>> from nOmicron.microscope import aio
+    >>> points = await aio.get_property("xy_scanner", "Points")
+    """
+    return await _run(getattr(_element(element), prop))
+
+
+async def set_property(element, prop, value):
+    """
+    Write a property without blocking the event loop.
+
+    Parameters
+    ----------
+    element : str or object
+        The element name, e.g. "gap_voltage_control", or the element itself
+    prop : str
+        The property name, e.g. "Voltage"
+    value
+        The value to write
+
+    Returns
+    -------
+    value
+        The value read back, as for the blocking setter
+    """
+    return await _run(getattr(_element(element), prop), value)
+
+
+async def wait_for_event(until=None):
+    """
+    The asyncio version of mo.wait_for_event. Polls for events with the mo.event_wait strategy, but sleeps between
+    empty polls with asyncio.sleep, so other tasks run while waiting. Callbacks run on the event loop.
+
+    Parameters
+    ----------
+    until : callable or None, optional
+        Stop waiting, or dispatching pending events, as soon as this returns True. Default is None
+    """
+    polls = mo.event_wait.polls_for_event(until)
+    try:
+        while True:
+            delay = _locked(next, polls, None)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+    finally:
+        _locked(polls.close)
+
+
+async def _drive_scan(lines, channel_name, x_direction, y_direction, num_lines, mode):
+    """Runs a scan, putting each line into the queue as it arrives, then None, or the exception that ended the scan."""
+    scan = _xy_scan(channel_name, x_direction, y_direction, num_lines, mode)
+    entering = asyncio.ensure_future(_run(scan.__enter__))
+    try:
+        pending, done = await asyncio.shield(entering)
+        while not done() and mo.mate.rc == mo.mate.rcs['RMT_SUCCESS']:
+            await wait_for_event(until=lambda: bool(pending))
+            while pending:
+                lines.put_nowait(pending.popleft())
+        lines.put_nowait(None)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        lines.put_nowait(e)
+    finally:
+        if not entering.done():
+            # The setup carries on in its thread when cancelled, so must finish before it can be undone
+            await asyncio.wait([entering])
+        if not entering.cancelled() and entering.exception() is None:
+            # Called directly rather than in the executor, so that it also runs when closed during shutdown
+            _locked(scan.__exit__, None, None, None)
+            channel_names = [channel_name] if isinstance(channel_name, str) else channel_name
+            x_direction_strings = [{"Forward": "Fw", "Backward": "Bw"}[x_dir] for x_dir in x_direction.split("-")]
+            for name in channel_names:
+                for x_direction_string in x_direction_strings:
+                    _locked(IO.disable_channel, f"{name}_{x_direction_string}")
+
+
+async def scan(channel_name, x_direction="Forward", y_direction="Up", num_lines='all', mode='new'):
+    """
+    Acquire an xy scan line by line, as an asynchronous generator. The asyncio version of xy_scanner.iter_xy_scan.
+
+    Parameters
+    ----------
+    channel_name : str or list of str
+        The channel to acquire from, e.g. Z, I, Aux1, Aux2, Df, or a list of channels to acquire from at once
+    x_direction : str, optional
+        Forward, Backward, or Forward-Backward. Default is Forward
+    y_direction : str, optional
+        Up or Up-Down. Default is Up
+    num_lines : int or str, optional
+        Number of lines to acquire, or 'all' (default)
+    mode : str, optional
+        "new" to start a new scan and stop it at the end (default), "pause" to resume a paused scan and pause it at the
+        end, or "continue" to read from a scan already running
+
+    Yields
+    ------
+    line : ScanLine
+        As from iter_xy_scan
+
+    Examples
+    --------
+    >>> from nOmicron.microscope import aio
+    >>> async for line in aio.scan("Z", x_direction="Forward-Backward", num_lines=10):
+    >>>     print(line.line, line.x_direction, line.data.mean())
+
+    The scan runs in a task of its own, which stops the scan and unregisters the channels when it ends. It ends when
+    the task iterating is cancelled or finishes, even while suspended in the body of the loop, or when the generator is
+    closed, e.g. after breaking out of the loop.
+    """
+    lines = asyncio.Queue()
+    driver = asyncio.ensure_future(_drive_scan(lines, channel_name, x_direction, y_direction, num_lines, mode))
+
+    def stop(task):
+        driver.cancel()
+
+    consumer = asyncio.current_task()
+    consumer.add_done_callback(stop)
+    try:
+        while True:
+            line = await lines.get()
+            if line is None:
+                break
+            if isinstance(line, Exception):
+                raise line
+            yield line
+    finally:
+        consumer.remove_done_callback(stop)
+        driver.cancel()
+        await asyncio.wait([driver])
+
+
+async def point_spectra(channel_name, target_position, start_end, sample_time, sample_points, repeats=1,
+                        forward_back=True):
+    """
+    Go to a position and perform fixed point spectroscopy, without blocking the event loop. Parameters and returns are
+    as for continuous_spectroscopy.get_point_spectra.
+
+    Examples
+    --------
+    >>> from nOmicron.microscope import aio
+    >>> v, I = await aio.point_spectra("I(V)", target_position=[0, 0], start_end=[0, 1], sample_time=10e-3,
+    >>>                                sample_points=50, repeats=3)
+
+    Cancelling the task unregisters the channel and returns the tip to where it was.
+    """
+    modes = {"V": 0, "Z": 1, "Varied Z": 2}
+    max_count = repeats * (forward_back + 1)
+    y_data = [[None] * (bool(forward_back) + 1) for i in range(repeats)]
+    received = []
+
+    def view_spectroscopy_callback():
+        cycle_count = mo.view.Cycle_Count() - 1
+        packet_count = mo.view.Packet_Count() - 1
+        data = mo.sample_data(mo.view.Data_Size()) * 1e-9
+        y_data[cycle_count][packet_count] = np.flip(data) if packet_count == 1 else data
+        received.append(data.size)
+
+    def setup():
+        IO.enable_channel(channel_name)
+        device = modes[channel_name[-2]] + 1
+        with mo.fast_writes(verify=True):
+            mo.spectroscopy.Spectroscopy_Mode(modes[channel_name[-2]])
+            getattr(mo.spectroscopy, f"Device_{device}_Points")(sample_points)
+            getattr(mo.spectroscopy, f"Raster_Time_{device}")(sample_time)
+            getattr(mo.spectroscopy, f"Device_{device}_Start")(start_end[0])
+            getattr(mo.spectroscopy, f"Device_{device}_End")(start_end[1])
+            getattr(mo.spectroscopy, f"Device_{device}_Repetitions")(repeats)
+            getattr(mo.spectroscopy, f"Enable_Device_{device}_Ramp_Reversal")(forward_back)
+        mo.xy_scanner.Store_Current_Position(True)
+        mo.xy_scanner.Target_Position(target_position)
+        mo.xy_scanner.Trigger_Execute_At_Target_Position(True)
+        mo.xy_scanner.move()
+        mo.allocate_sample_memory(sample_points)
+        mo.view.Data(view_spectroscopy_callback)
+
+    setting_up = asyncio.ensure_future(_run(setup))
+    try:
+        await asyncio.shield(setting_up)
+        while len(received) < max_count and mo.mate.rc == mo.mate.rcs['RMT_SUCCESS']:
+            await wait_for_event(until=lambda: len(received) >= max_count)
+    finally:
+        if not setting_up.done():
+            # The setup carries on in its thread when cancelled, so must finish before it can be undone
+            await asyncio.wait([setting_up])
+        _locked(mo.view.Data)
+        _locked(mo.xy_scanner.Trigger_Execute_At_Target_Position, False)
+        _locked(mo.xy_scanner.Return_To_Stored_Position, True)
+        _locked(mo.xy_scanner.Store_Current_Position, False)
+        _locked(IO.disable_channel)
+
+    x_data = np.linspace(start_end[0], start_end[1], received[-1]) if received else None
+    if not forward_back:
+        y_data = [item[0] for item in y_data]
+    if repeats == 1:
+        y_data = y_data[0]
+    return x_data, y_data
@@ -9,9 +9,17 @@ from nOmicron.utils.errors import MatrixUnsupportedOperationError
 
 BLACK_BOX_IP = "10.0.42.2"
 
-if "Received = 1" not in subprocess.check_output(f"ping {BLACK_BOX_IP} -n 1", shell=True).decode("utf-8"):
-    raise MatrixUnsupportedOperationError("Remote black box control is unavailable in this hardware configuration. \n"
-                                          f"Check that {BLACK_BOX_IP} can be loaded")
+_is_reachable = False
+
+
+def check_connection():
+    """Pings the black box, raising MatrixUnsupportedOperationError if it cannot be reached. Called before the first
+    button press, or explicitly to check up front."""
+    global _is_reachable
+    if "Received = 1" not in subprocess.check_output(f"ping {BLACK_BOX_IP} -n 1", shell=True).decode("utf-8"):
+        raise MatrixUnsupportedOperationError("Remote black box control is unavailable in this hardware configuration. \n"
+                                              f"Check that {BLACK_BOX_IP} can be loaded")
+    _is_reachable = True
 
 
 @backoff.on_exception(backoff.expo,
@@ -31,6 +39,8 @@ def _wait_for_approach():
 @backoff.on_exception(backoff.expo,
                       requests.exceptions.RequestException)
 def _press_button(button_name):
+    if not _is_reachable:
+        check_connection()
     requests.get(f"http://{BLACK_BOX_IP}?{button_name}={button_name}")
 
 
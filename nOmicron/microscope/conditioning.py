@@ -145,12 +145,8 @@ def ink():
     pass
 
 
-from nOmicron.microscope import IO
-IO.connect()
-
 # TO SATURATE
 # Turn off feedback loop
-mo.regulator.Feedback_Loop_Enabled(False)
 # while True
     # Lower dZ on regulator by increment
     # Read current feedback loop for very short amount of time
@@ -1,9 +1,13 @@
 # Oliver Gordon, 2019
 
+import time
+from collections import deque, namedtuple
+
 import numpy as np
 
 from nOmicron.mate import objects as mo
 from nOmicron.microscope import IO
+from nOmicron.utils.dataset import DatasetWriter
 from tqdm import tqdm
 
 def get_continuous_signal(channel_name, sample_time, sample_points):
@@ -54,7 +58,7 @@ def get_continuous_signal(channel_name, sample_time, sample_points):
         data_size = mo.view.Data_Size()
         period = mo.clock.Period()
         x_data = np.linspace(0, (data_size - 1) * period, data_size)
-        y_data = np.array(mo.sample_data(data_size))
+        y_data = mo.sample_data(data_size, copy=True)
 
     IO.enable_channel(channel_name)
     IO.set_clock(sample_time, sample_points)
@@ -64,7 +68,7 @@ def get_continuous_signal(channel_name, sample_time, sample_points):
 
     pbar = tqdm(total=1)
     while view_count < 1 and mo.mate.rc == mo.mate.rcs['RMT_SUCCESS']:
-        mo.wait_for_event()
+        mo.wait_for_event(until=lambda: view_count >= 1)
     mo.clock.Enable(False)
     mo.view.Data()
 
@@ -73,8 +77,106 @@ def get_continuous_signal(channel_name, sample_time, sample_points):
     return x_data, y_data
 
 
+Chunk = namedtuple('Chunk', ['index', 'timestamps', 'data', 'gap', 'gaps'])
+
+
+def stream_continuous_signal(channel_name, sample_time, sample_points, num_chunks=None, ring_chunks=8,
+                             gap_tolerance=None, dataset=None):
+    """Acquire a continuous signal as a stream of fixed-size chunks, re-arming the clock as soon as each buffer is
+    delivered.
+
+    Parameters
+    -----------
+    channel_name : str
+        The continuous channel to view, e.g. I_t, Z_t, Df_t, Aux1_t
+    sample_time : float
+        The time to acquire each chunk over, in seconds
+    sample_points : int
+        The number of points in each chunk
+    num_chunks : int or None, optional
+        The number of chunks to acquire. Default is None, to carry on until the generator is closed
+    ring_chunks : int, optional
+        The number of chunks kept in the ring buffer. The data and timestamps of a chunk are views into the ring, and
+        are overwritten ring_chunks chunks later, so copy them to keep them for longer. Default is 8
+    gap_tolerance : float or None, optional
+        How late in seconds a chunk may start, after the end of the one before, before it is counted as a gap. Default
+        is None, for 10% of sample_time
+    dataset : str, DatasetWriter or None, optional
+        Also write each chunk to disk, into a new dataset at this path or an open DatasetWriter of shape
+        (num_chunks, sample_points), with the time of its first sample. Requires num_chunks. Default is None
+
+    Yields
+    ------
+    chunk : Chunk
+        The chunk number, absolute timestamps (seconds since the epoch) and data of each sample, the estimated seconds
+        lost before this chunk, and the number of gaps so far. Timestamps are estimated from the time each chunk is
+        delivered
+
+    Examples
+    --------
+    Record I(t) in 1 s chunks of 1000 points for an hour
+    >>> for chunk in stream_continuous_signal("I(t)", 1, 1000, num_chunks=3600):
+    >>>     np.save(f"chunk_{chunk.index}.npy", np.stack([chunk.timestamps, chunk.data]))
+    >>> chunk.gaps
+    """
+    period = sample_time / sample_points
+    if isinstance(dataset, str):
+        if num_chunks is None:
+            raise ValueError("num_chunks must be set to write to a dataset")
+        dataset = DatasetWriter(dataset, (num_chunks, sample_points), parameters=dict(
+            channel_name=channel_name, sample_time=sample_time, sample_points=sample_points, period=period))
+    if gap_tolerance is None:
+        gap_tolerance = 0.1 * sample_time
+    ring = np.empty((ring_chunks, sample_points))
+    ring_times = np.empty((ring_chunks, sample_points))
+    offsets = np.arange(sample_points) * period
+    pending = deque()
+    state = dict(received=0, end=None, gaps=0)
+
+    def view_continuous_callback():
+        received = time.time()
+        # Re-arm straight away, so that the next buffer fills while this one is copied out
+        mo.clock.Enable(False)
+        mo.clock.Enable(True)
+
+        data_size = min(mo.view.Data_Size(), sample_points)
+        slot = state['received'] % ring_chunks
+        start = received - data_size * period
+        gap = 0.0
+        if state['end'] is not None and start - state['end'] > gap_tolerance:
+            gap = start - state['end']
+            state['gaps'] += 1
+        state['end'] = received
+        ring[slot, :data_size] = mo.sample_data(data_size)
+        ring_times[slot, :data_size] = start + offsets[:data_size]
+        pending.append(Chunk(state['received'], ring_times[slot, :data_size], ring[slot, :data_size], gap,
+                             state['gaps']))
+        if dataset is not None:
+            dataset.write(state['received'], ring[slot, :data_size], start)
+        state['received'] += 1
+
+    IO.enable_channel(channel_name)
+    IO.set_clock(sample_time, sample_points)
+
+    mo.view.Data(view_continuous_callback)
+    mo.allocate_sample_memory(sample_points)
+
+    try:
+        while (num_chunks is None or state['received'] < num_chunks) and \
+                mo.mate.rc == mo.mate.rcs['RMT_SUCCESS']:
+            mo.wait_for_event(until=lambda: bool(pending))
+            while pending:
+                yield pending.popleft()
+    finally:
+        mo.clock.Enable(False)
+        mo.view.Data()
+        IO.disable_channel()
+        if dataset is not None:
+            dataset.flush()
+
+
 def get_point_spectra(channel_name, target_position, start_end, sample_time, sample_points,
-                      repeats=1, forward_back=True, return_filename=False):
+                      repeats=1, forward_back=True, return_filename=False, dataset=None):
     """
     Go to a position and perform fixed point spectroscopy.
 
@@ -96,6 +198,9 @@ def get_point_spectra(channel_name, target_position, start_end, sample_time, sam
         Scan in both directions, or just one.
     return_filename : bool, optional
         If the full file name of the scan should be returned along with the data. Default is False
+    dataset : str, DatasetWriter or None, optional
+        Also write each spectrum to disk as it arrives, into a new dataset at this path or an open DatasetWriter of
+        shape (repeats, 1 or 2 directions, sample_points). Default is None
 
     Returns
     -------
@@ -137,19 +242,28 @@ def get_point_spectra(channel_name, target_position, start_end, sample_time, sam
         packet_count = mo.view.Packet_Count() - 1
         data_size = mo.view.Data_Size()
         x_data = np.linspace(start_end[0], start_end[1], data_size)
-        y_data[cycle_count][packet_count] = np.array(mo.sample_data(data_size))*1e-9
+        y_data[cycle_count][packet_count] = mo.sample_data(data_size) * 1e-9
         if packet_count == 1:
             y_data[cycle_count][packet_count] = np.flip(y_data[cycle_count][packet_count])
+        if dataset is not None:
+            dataset.write((cycle_count, packet_count), y_data[cycle_count][packet_count], run_count=view_name[0],
+                          cycle_count=view_name[1])
+
+    if isinstance(dataset, str):
+        dataset = DatasetWriter(dataset, (repeats, bool(forward_back) + 1, sample_points), parameters=dict(
+            channel_name=channel_name, target_position=[float(i) for i in target_position],
+            start_end=[float(i) for i in start_end], sample_time=sample_time, sample_points=sample_points))
 
     # Set all the parameters
     IO.enable_channel(channel_name)
-    mo.spectroscopy.Spectroscopy_Mode(modes[channel_name[-2]])
-    getattr(mo.spectroscopy, f"Device_{modes[channel_name[-2]] + 1}_Points")(sample_points)
-    getattr(mo.spectroscopy, f"Raster_Time_{modes[channel_name[-2]] + 1}")(sample_time)
-    getattr(mo.spectroscopy, f"Device_{modes[channel_name[-2]] + 1}_Start")(start_end[0])
-    getattr(mo.spectroscopy, f"Device_{modes[channel_name[-2]] + 1}_End")(start_end[1])
-    getattr(mo.spectroscopy, f"Device_{modes[channel_name[-2]] + 1}_Repetitions")(repeats)
-    getattr(mo.spectroscopy, f"Enable_Device_{modes[channel_name[-2]] + 1}_Ramp_Reversal")(forward_back)
+    with mo.fast_writes(verify=True):
+        mo.spectroscopy.Spectroscopy_Mode(modes[channel_name[-2]])
+        getattr(mo.spectroscopy, f"Device_{modes[channel_name[-2]] + 1}_Points")(sample_points)
+        getattr(mo.spectroscopy, f"Raster_Time_{modes[channel_name[-2]] + 1}")(sample_time)
+        getattr(mo.spectroscopy, f"Device_{modes[channel_name[-2]] + 1}_Start")(start_end[0])
+        getattr(mo.spectroscopy, f"Device_{modes[channel_name[-2]] + 1}_End")(start_end[1])
+        getattr(mo.spectroscopy, f"Device_{modes[channel_name[-2]] + 1}_Repetitions")(repeats)
+        getattr(mo.spectroscopy, f"Enable_Device_{modes[channel_name[-2]] + 1}_Ramp_Reversal")(forward_back)
 
     # Set up spec
     mo.xy_scanner.Store_Current_Position(True)
@@ -163,7 +277,7 @@ def get_point_spectra(channel_name, target_position, start_end, sample_time, sam
 
     pbar = tqdm(total=max_count)
     while view_count < max_count and mo.mate.rc == mo.mate.rcs['RMT_SUCCESS']:
-        mo.wait_for_event()
+        mo.wait_for_event(until=lambda: view_count >= max_count)
     mo.view.Data()
 
     # Return to normal
@@ -171,6 +285,8 @@ def get_point_spectra(channel_name, target_position, start_end, sample_time, sam
     mo.xy_scanner.Return_To_Stored_Position(True)
     mo.xy_scanner.Store_Current_Position(False)
     IO.disable_channel()
+    if dataset is not None:
+        dataset.flush()
 
     if not forward_back:
         y_data = [item[0] for item in y_data]
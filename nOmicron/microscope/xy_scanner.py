@@ -1,11 +1,14 @@
 # Oliver Gordon, 2019
 
+import time
 import warnings
+from collections import deque, namedtuple
+from contextlib import contextmanager
 
 import nOmicron.mate.objects as mo
 import numpy as np
 from nOmicron.microscope import IO
-from nOmicron.utils.plotting import plot_xy
+from nOmicron.utils.dataset import DatasetWriter
 from tqdm import tqdm
 from time import sleep
 
@@ -16,19 +19,19 @@ def set_gap_voltage(voltage):
 def set_scan_position(xy_pos=None, width_height=None, angle=None):
     mo.xy_scanner.Enable_Scan(False)
 
-    if width_height[0] != width_height[1]:
-        mo.xy_scanner.Width_Height_Constrained(False)
+    with mo.fast_writes(verify=True):
+        if width_height is not None:
+            if width_height[0] != width_height[1]:
+                mo.xy_scanner.Width_Height_Constrained(False)
+            mo.xy_scanner.Width(width_height[0])
+            mo.xy_scanner.Height(width_height[1])
 
-    if width_height is not None:
-        mo.xy_scanner.Width(width_height[0])
-        mo.xy_scanner.Height(width_height[1])
+        if xy_pos is not None:
+            mo.xy_scanner.X_Offset(xy_pos[0])
+            mo.xy_scanner.Y_Offset(xy_pos[1])
 
-    if xy_pos is not None:
-        mo.xy_scanner.X_Offset(xy_pos[0])
-        mo.xy_scanner.Y_Offset(xy_pos[1])
-
-    if angle is not None:
-        mo.xy_scanner.Angle(angle)
+        if angle is not None:
+            mo.xy_scanner.Angle(angle)
 
     mo.xy_scanner.Enable_Scan(True)
 
@@ -108,14 +111,254 @@ def set_scan_speed(scan=None, move=None, speed_adjust_mode="Frequency"):
     mo.xy_scanner.Move_Raster_Time(move)
 
 
-def get_xy_scan(channel_name, x_direction, y_direction, num_lines='all', mode='new', return_filename=False):
+ScanLine = namedtuple('ScanLine', ['channel', 'y_direction', 'x_direction', 'line', 'timestamp', 'run_count',
+                                   'cycle_count', 'data'])
+
+
+@contextmanager
+def _xy_scan(channel_name, x_direction, y_direction, num_lines='all', mode='new'):
+    """Sets up and starts an xy scan, with parameters as for get_xy_scan. Yields the deque that the lines are appended
+    to as they arrive, as ScanLine, and a function returning if all lines have been received. On exit the scan is
+    stopped (or paused) and every view observed is unregistered."""
+    allowed = ["new", "pause", "continue"]
+    if mode not in allowed:
+        raise ValueError(f"Mode must be one of {allowed}")
+    if y_direction not in ("Up", "Up-Down"):
+        raise ValueError("y_direction must be one of ['Up', 'Up-Down']")
+
+    channel_names = [channel_name] if isinstance(channel_name, str) else list(channel_name)
+
+    if num_lines == 'all':
+        num_lines = mo.xy_scanner.Lines()
+
+    x_dir_dict = {"Forward": "Fw",
+                  "Backward": "Bw"}
+    x_direction_strings = [x_dir_dict[x_dir] for x_dir in x_direction.split("-")]
+    y_direction_strings = y_direction.split("-")
+
+    # Set triggers. Backward lines are only scanned on the retrace
+    if x_direction == "Forward":
+        mo.xy_scanner.X_Retrace(False)
+    else:
+        mo.xy_scanner.X_Retrace(True)
+
+    if y_direction == "Up-Down":
+        if num_lines != 'all' and num_lines != mo.xy_scanner.Lines():  # Force set lines instead?
+            raise ValueError("If scanning in both directions, num_lines cannot be set")
+        mo.xy_scanner.Y_Retrace(True)
+    else:
+        mo.xy_scanner.Y_Retrace(False)
+
+    # while not mo.xy_scanner.Enable_Scan():  # Enforce that we won't take data during relocation and confuse the CU
+    #     print("waiting")
+    #     sleep(0.1)
+
+    # Each channel and direction is observed separately, so events are routed to the right line by their descriptor
+    line_counts = {}
+    pending = deque()
+
+    def view_xy_callback(name, x_direction_string):
+        view = mo.get_view(f"{name}_{x_direction_string}")
+        line_count = line_counts[name, x_direction_string]
+        line_counts[name, x_direction_string] += 1
+        pending.append(ScanLine(name, line_count // num_lines, int(x_direction_string == "Bw"), line_count % num_lines,
+                                time.time(), view.Run_Count(), view.Cycle_Count(),
+                                mo.sample_data(view.Data_Size(), copy=True)))
+
+    max_packets = num_lines * len(x_direction_strings) * len(y_direction_strings) * len(channel_names)
+    try:
+        # Enable channels
+        for name in channel_names:
+            for x_direction_string in x_direction_strings:
+                IO.enable_channel(f"{name}_{x_direction_string}")
+                line_counts[name, x_direction_string] = 0
+                mo.get_view(f"{name}_{x_direction_string}").Data(view_xy_callback, name, x_direction_string)
+        mo.allocate_sample_memory(mo.xy_scanner.Points())
+
+        if mode == 'new':
+            mo.experiment.start()
+        elif mode == 'pause':
+            mo.experiment.resume()
+        else:
+            pass
+
+        yield pending, lambda: sum(line_counts.values()) >= max_packets
+    finally:
+        if mode == 'new':
+            mo.experiment.stop()
+        elif mode == 'pause':
+            mo.experiment.pause()
+        else:
+            pass
+
+        for name, x_direction_string in line_counts:
+            mo.get_view(f"{name}_{x_direction_string}").Data()
+
+
+def iter_xy_scan(channel_name, x_direction, y_direction, num_lines='all', mode='new'):
+    """
+    Perform an xy scan, yielding each line as it arrives.
+
+    Parameters are as for get_xy_scan. Only the lines not yet yielded are held, so memory stays constant however long
+    the scan. Closing the generator early, e.g. by breaking out of the loop, stops (or pauses) the scan.
+
+    Yields
+    ------
+    line : ScanLine
+        The channel name, the y_direction (0 up, 1 down) and x_direction (0 forward, 1 backward) indices, the line
+        number from the first line acquired, the time it was received, the run and cycle counters of the view, and the
+        line data
+
+    Examples
+    --------
+    Stop as soon as the topography drifts out of range
+    >>> for line in iter_xy_scan("Z", x_direction="Forward", y_direction="Up"):
+    >>>     if np.ptp(line.data) > 5e-9:
+    >>>         break
+
+    Keep the frames as well
+    >>> lines = list(iter_xy_scan(["Z", "I"], x_direction="Forward-Backward", y_direction="Up"))
+    >>> frames = assemble_frames(lines, mo.xy_scanner.Lines(), mo.xy_scanner.Points(), "Forward-Backward", "Up")
+    """
+    with _xy_scan(channel_name, x_direction, y_direction, num_lines, mode) as (pending, done):
+        while not done() and mo.mate.rc == mo.mate.rcs['RMT_SUCCESS']:
+            mo.wait_for_event(until=lambda: bool(pending))
+            while pending:
+                yield pending.popleft()
+
+
+class FrameAssembler(object):
+    """
+    Assembles the lines from iter_xy_scan into frames, in the orientation get_xy_scan returns them.
+
+    Only the planes of the directions scanned are allocated, each line is written straight into its final row, and
+    which lines have been received is kept in a boolean mask rather than by NaN filling.
+
+    Parameters
+    ----------
+    num_lines : int
+        Number of lines per frame
+    points : int
+        Number of points per line
+    x_direction : str, optional
+        'Forward', 'Backward', or 'Forward-Backward', as for get_xy_scan. Default is 'Forward'
+    y_direction : str, optional
+        'Up' or 'Up-Down', as for get_xy_scan. Default is 'Up'
+    channel_names : list of str, optional
+        Channels to allocate a frame for up front. Frames for other channels are allocated on their first line
+    dtype : data-type, optional
+        Of the frames, e.g. np.float32 to halve their memory. Default is np.float64
+
+    Attributes
+    ----------
+    frames : dict
+        Per channel, an array of shape ([y_up/y_down,] [x_forward/x_backward,] line, point), where the direction axes
+        are only present if both directions were scanned
+    masks : dict
+        Per channel, a boolean array of the frame's shape without the point axis, True where a line was received
+
+    Examples
+    --------
+    >>> assembler = FrameAssembler(256, 256, "Forward-Backward", dtype=np.float32)
+    >>> for line in iter_xy_scan(["Z", "I"], x_direction="Forward-Backward", y_direction="Up", num_lines=256):
+    >>>     assembler.add(line)
+    >>> assembler.frames["Z"].shape, assembler.complete
+    """
+
+    def __init__(self, num_lines, points, x_direction="Forward", y_direction="Up", channel_names=(), dtype=np.float64):
+        self.num_lines = num_lines
+        self.points = points
+        self.dtype = np.dtype(dtype)
+        x_dir_dict = {"Forward": 0,
+                      "Backward": 1}
+        self.x_planes = {x_dir_dict[x_dir]: i for i, x_dir in enumerate(x_direction.split("-"))}
+        self.y_planes = {i: i for i in range(len(y_direction.split("-")))}
+        self.shape = tuple(len(planes) for planes in (self.y_planes, self.x_planes) if len(planes) == 2) + \
+                     (num_lines, points)
+        self.frames = {}
+        self.masks = {}
+        for name in channel_names:
+            self._allocate(name)
+
+    def _allocate(self, name):
+        self.frames[name] = np.zeros(self.shape, self.dtype)
+        self.masks[name] = np.zeros(self.shape[:-1], bool)
+
+    def index(self, line):
+        """The index of a line's row in its frame. Rows are in reverse order of acquisition."""
+        index = (self.num_lines - 1 - line.line,)
+        if len(self.x_planes) == 2:
+            index = (self.x_planes[line.x_direction],) + index
+        if len(self.y_planes) == 2:
+            index = (self.y_planes[line.y_direction],) + index
+        return index
+
+    def add(self, line):
+        if line.channel not in self.frames:
+            self._allocate(line.channel)
+        index = self.index(line)
+        self.frames[line.channel][index][:line.data.size] = line.data
+        self.masks[line.channel][index] = True
+
+    def extend(self, lines):
+        for line in lines:
+            self.add(line)
+
+    @property
+    def complete(self):
+        """If every line of every frame has been received."""
+        return all(mask.all() for mask in self.masks.values())
+
+    def fill_missing(self, value=np.nan):
+        """Overwrite the lines not received with a value, e.g. NaN to match the output of a partial get_xy_scan."""
+        for name, frame in self.frames.items():
+            frame[~self.masks[name]] = value
+
+
+def assemble_frames(lines, num_lines, points, x_direction="Forward-Backward", y_direction="Up-Down",
+                    channel_names=(), dtype=np.float64):
+    """
+    Assemble the lines from iter_xy_scan into full frames, with NaN where no line was received. See FrameAssembler to
+    also keep the mask of received lines.
+
+    Parameters
+    ----------
+    lines : iterable of ScanLine
+    num_lines : int
+        Number of lines per frame
+    points : int
+        Number of points per line
+    x_direction : str, optional
+        As scanned. Default is 'Forward-Backward'
+    y_direction : str, optional
+        As scanned. Default is 'Up-Down'
+    channel_names : list of str, optional
+        Channels to make a frame for even if they have no lines. Default is only the channels in lines
+    dtype : data-type, optional
+        Default is np.float64
+
+    Returns
+    -------
+    frames : dict
+        An array per channel, shaped as get_xy_scan returns it
+    """
+    assembler = FrameAssembler(num_lines, points, x_direction, y_direction, channel_names, dtype)
+    assembler.extend(lines)
+    if not assembler.complete and assembler.dtype.kind == 'f':
+        assembler.fill_missing()
+    return assembler.frames
+
+
+def get_xy_scan(channel_name, x_direction, y_direction, num_lines='all', mode='new', return_filename=False,
+                dtype=np.float64, dataset=None):
     """
     Perform and get an xy scan
 
     Parameters
     ----------
-    channel_name : str
-        The channel to acquire from, e.g. Z, I, Aux1, Aux2
+    channel_name : str or list of str
+        The channel to acquire from, e.g. Z, I, Aux1, Aux2, or a list of channels to acquire from all at once in the
+        same pass, e.g. ["Z", "I"]
     x_direction : str
         Must be one of 'Forward', 'Backward', or 'Forward-Backward'
     y_direction : str
@@ -127,12 +370,22 @@ def get_xy_scan(channel_name, x_direction, y_direction, num_lines='all', mode='n
         Must be one of ['new', 'pause', 'continue']. Default is 'new'
     return_filename : bool, optional
         If the full file name of the scan should be returned along with the data. Default is False
+    dtype : data-type, optional
+        Of the returned array, e.g. np.float32 to halve its memory. Default is np.float64
+    dataset : str, DatasetWriter or None, optional
+        Write each line to disk as it arrives, into a new dataset at this path or an open DatasetWriter of shape
+        (channel,) + the shape of xydata. The returned arrays are then memory-mapped from the dataset, rather than held
+        in memory, and lines not received are zero and marked not done. A scan cannot be resumed from the lines missing
+        in a dataset, so every line is scanned and written again. Default is None
 
     Returns
     -------
-    xydata : ndarray
+    xydata : ndarray or dict
         Max 4 dimensions (y_up/y_down, x_up/x_down, x, y). First two dimensions will only appear if
-        y_direction is "Up-Down" and x_direction is "Forward-Backward" - will be missing as appropriate
+        y_direction is "Up-Down" and x_direction is "Forward-Backward" - will be missing as appropriate.
+        If channel_name is a list, a dict of one such array per channel
+    filename : str or dict
+        Only if return_filename. If channel_name is a list, a dict of one file name per channel
 
     Examples
     --------
@@ -143,117 +396,69 @@ def get_xy_scan(channel_name, x_direction, y_direction, num_lines='all', mode='n
     >>> plot_xy(xydata, pixel_scale=mo.xy_scanner.Width() * 1e9 / mo.xy_scanner.Points())
     >>> IO.disconnect()
 
+    Record topography and current from the same raster
+    >>> xydata = get_xy_scan(["Z", "I"], x_direction="Forward-Backward", y_direction="Up")
+    >>> xydata["Z"].shape, xydata["I"].shape
+
     Warnings
     --------
     Quite often (but unreliably!), running this function will get Matrix into a state in which it will return one/two
     lines (unless play/pause is clicked manually) when operating manually. To restore this functionality, run
     utils.utils.restore_z_functionality() and restart your scan.
     """
-    global scan_dir_x, scan_dir_y, line_count_y, view_count, tot_packets, xydata
-
-    # Setup and parsing parameters
-    allowed = ["new", "pause", "continue"]
-    if mode not in allowed:
-        raise ValueError(f"Mode must be one of {allowed}")
+    global view_count, tot_packets, xydata
 
+    channel_names = [channel_name] if isinstance(channel_name, str) else list(channel_name)
     if num_lines == 'all':
         num_lines = mo.xy_scanner.Lines()
 
-    x_dir_dict = {"Forward": "Fw",
-                  "Backward": "Bw"}
-    x_direction_strings = [x_dir_dict[x_dir] for x_dir in x_direction.split("-")]
-    y_direction_strings = y_direction.split("-")
-
-    # Set triggers
-    if x_direction == "Forward-Backward":
-        mo.xy_scanner.X_Retrace(True)
-    else:
-        mo.xy_scanner.X_Retrace(False)
-
-    if y_direction == "Up-Down":
-        if num_lines != 'all' and num_lines != mo.xy_scanner.Lines():  # Force set lines instead?
-            raise ValueError("If scanning in both directions, num_lines cannot be set")
-        mo.xy_scanner.Y_Retrace(True)
-    else:
-        mo.xy_scanner.Y_Retrace(False)
-
-    # while not mo.xy_scanner.Enable_Scan():  # Enforce that we won't take data during relocation and confuse the CU
-    #     print("waiting")
-    #     sleep(0.1)
-
-    # Set counters and pre-allocate
     view_count = [None, None]
-    scan_dir_y = 0
-    scan_dir_x = 1
-    line_count_y = 0
     tot_packets = 0
-    xydata = np.zeros((2, 2, num_lines, mo.xy_scanner.Points()))
-    xydata[:] = np.nan
-
-    def view_xy_callback():
-        global scan_dir_x, scan_dir_y, line_count_y, view_count, tot_packets, xydata
-        tot_packets += 1
-        mo.tot_packets = tot_packets
-        line_count_y += 1
-        if x_direction == "Forward-Backward":
-            scan_dir_x = int(not (bool(scan_dir_x)))
-            line_count_y = line_count_y - scan_dir_x
-        scan_dir_y = (line_count_y - 1) // num_lines
-
-        data_size = mo.view.Data_Size()
-        data_pts = np.array(mo.sample_data(data_size))
-
-        xydata[scan_dir_y, int(not (bool(scan_dir_x))), (line_count_y - (num_lines * scan_dir_y)) - 1, :] = data_pts
-        view_count = [mo.view.Run_Count(), mo.view.Cycle_Count()]
-
-        # pbar.update(1)
-        # # pbar.set_postfix({"Scanline": mo.view.Packet_Count()})
-        # if tot_packets % 2 == 1:
-        #     pbar.set_postfix({"Scanline": mo.view.Packet_Count()+1})
-
-    # Enable channels
-    for x_direction_string in x_direction_strings:
-        IO.enable_channel(f"{channel_name}_{x_direction_string}")
-        mo.view.Data(view_xy_callback)
-        mo.allocate_sample_memory(mo.xy_scanner.Points())
 
-    if mode == 'new':
-        mo.experiment.start()
-    elif mode == 'pause':
-        mo.experiment.resume()
+    def counted(lines):
+        global view_count, tot_packets
+        for line in lines:
+            tot_packets += 1
+            mo.tot_packets = tot_packets
+            view_count = [line.run_count, line.cycle_count]
+            yield line
+
+    lines = counted(iter_xy_scan(channel_name, x_direction, y_direction, num_lines, mode))
+    if dataset is None:
+        xydata = assemble_frames(lines, num_lines, mo.xy_scanner.Points(), x_direction, y_direction, channel_names,
+                                 dtype)
     else:
-        pass
-
-    # Get the data
-    # pbar = tqdm(total=num_lines * len(x_direction_strings) * len(y_direction_strings))
-    while tot_packets < num_lines * len(x_direction_strings) * len(y_direction_strings) \
-            and mo.mate.rc == mo.mate.rcs['RMT_SUCCESS']:
-        mo.wait_for_event()
-
-    if mode == 'new':
-        mo.experiment.stop()
-    elif mode == 'pause':
-        mo.experiment.pause()
-    else:
-        pass
-
-    # Pretty the output to make physical sense
-    xydata = np.flip(xydata, axis=2)
-    if len(x_direction_strings) != 2:
-        xydata = xydata[:, 0, :, :]
-    if len(y_direction_strings) != 2:
-        xydata = xydata[0, :, :, :]
-    np.squeeze(xydata)
+        assembler = FrameAssembler(num_lines, mo.xy_scanner.Points(), x_direction, y_direction)
+        if isinstance(dataset, str):
+            dataset = DatasetWriter(dataset, (len(channel_names),) + assembler.shape, dtype,
+                                    dict(channel_names=channel_names, x_direction=x_direction,
+                                         y_direction=y_direction, width=mo.xy_scanner.Width(),
+                                         height=mo.xy_scanner.Height()))
+        for line in lines:
+            dataset.write((channel_names.index(line.channel),) + assembler.index(line), line.data, line.timestamp,
+                          line.run_count, line.cycle_count)
+        dataset.flush()
+        xydata = {name: dataset.data[i] for i, name in enumerate(channel_names)}
 
     # Return nicely
     if return_filename:
-        filename = f"{mo.experiment.Result_File_Path()}\\{mo.experiment.Result_File_Name()}--{mo.view.Run_Count()}_{mo.view.Cycle_Count()}.Z_mtrx"
-        return xydata, filename
+        filenames = {}
+        for name in channel_names:
+            view = mo.get_view(f"{name}_{'Bw' if x_direction == 'Backward' else 'Fw'}")
+            filenames[name] = f"{mo.experiment.Result_File_Path()}\\{mo.experiment.Result_File_Name()}--" \
+                              f"{view.Run_Count()}_{view.Cycle_Count()}.{name}_mtrx"
+        if isinstance(channel_name, str):
+            return xydata[channel_name], filenames[channel_name]
+        return xydata, filenames
+    elif isinstance(channel_name, str):
+        return xydata[channel_name]
     else:
         return xydata
 
 
 if __name__ == "__main__":
+    from nOmicron.utils.plotting import plot_xy
+
     IO.connect()
     set_points_lines(128)
     xydata1 = get_xy_scan(channel_name="Z", x_direction="Forward", y_direction="Up", num_lines=1)
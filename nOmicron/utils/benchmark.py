@@ -0,0 +1,588 @@
+# Oliver Gordon, 2019
+
+import ctypes
+import os
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from nOmicron.mate.mate import MATE
+from nOmicron.utils import errors, mtrx
+
+
+class _Text(object):
+
+    def __init__(self, text=''):
+        self.text = text
+
+    def AppendText(self, text):
+        self.text += text
+
+
+class _StubLibrary(object):
+    """Stands in for RemoteAccess_API.dll, answering every call with RMT_SUCCESS and a fixed value."""
+
+    def __init__(self, value=1.0):
+        self.value = value
+        self.arrays = {}
+
+    def getDoubleProperty(self, desc, index, p_d):
+        p_d._obj.value = self.value
+        return 1
+
+    def getIntegerProperty(self, desc, index, p_i):
+        p_i._obj.value = int(self.value)
+        return 1
+
+    def getPairProperty(self, desc, index, p_d1, p_d2):
+        p_d1._obj.value = p_d2._obj.value = self.value
+        return 1
+
+    def setDoubleProperty(self, desc, index, d):
+        return 1
+
+    def getDoubleArrayProperty(self, desc, index, p_count, p_p_values):
+        values = self.arrays.get(desc, np.zeros(0))
+        count = min(p_count._obj.value, values.size)
+        ctypes.memmove(p_p_values._obj, values.ctypes.data, count * ctypes.sizeof(ctypes.c_double))
+        p_count._obj.value = count
+        return 1
+
+    def setDoubleArrayProperty(self, desc, index, count, p_values):
+        self.arrays[desc] = np.ctypeslib.as_array(p_values, shape=(count,)).copy()
+        return 1
+
+
+def _legacy_rc_key(mate, rc):
+    return list(mate.rcs.keys())[list(mate.rcs.values()).index(rc)]
+
+
+def _legacy_check_for_response_error(mate, rc):
+    rc_key = _legacy_rc_key(mate, rc)
+
+    if rc_key == "RMT_UNEXPECTEDRESPONSE":
+        raise errors.MatrixUnexpectedResponseError
+    elif rc_key == "RMT_LIBNOTLOADABLE":
+        raise errors.MateLibNotLoadableError
+    elif rc_key == "RMT_INTERNALFAILURE":
+        raise errors.MatrixCriticalHardwareFailureError
+    elif rc_key == "RMT_NOSERVER":
+        raise errors.MatrixNotInitialisedError
+    elif rc_key == "RMT_INCOMPATIBLEPROTOCOL":
+        raise errors.MatrixIncompatibleProtocolError
+    elif rc_key == "RMT_UNSUPPORTEDREQ":
+        raise errors.MatrixUnsupportedReqError
+    elif rc_key in ["RMT_UNKNOWNOBJECT", "RMT_UNKNOWNPROPERTY"]:
+        raise errors.MatrixUnsupportedOperationError
+    elif rc_key == "RMT_INVALIDTYPE":
+        raise errors.MatrixInvalidDataTypeError
+    elif rc_key == "RMT_REJECTED":
+        raise errors.MatrixRejectedError
+
+
+def _legacy_remote_access(mate, p, rc):
+    """MATE.remote_access and its rc checks as they were before the table-driven call layer, unchanged but for self
+    becoming mate, kept only as a baseline to benchmark against."""
+    if rc == mate.rcs['RMT_SUCCESS'] or rc == mate.rcs['RMT_NOEVENT']:
+        if len(p) > 2:
+            p[2] = p[2].encode()
+        if p[1] == 'getString':
+            s = mate.String(255)
+            p_s = ctypes.pointer(s)
+            rc = mate.lib_mate.getStringPropertyByDesc(p[2], -1,
+                                                       ctypes.byref(p_s))
+            out = s.text[:].decode()
+        elif p[1] == 'getBoolean':
+            b = ctypes.c_char()
+            rc = mate.lib_mate.getBooleanProperty(p[2], -1,
+                                                  ctypes.byref(b))
+            out = bool(ord(b.value))
+        elif p[1] == 'getInteger':
+            if len(p) == 4:
+                i = p[3]
+            else:
+                i = ctypes.c_int()
+            rc = mate.lib_mate.getIntegerProperty(p[2], -1,
+                                                  ctypes.byref(i))
+            out = i.value
+        elif p[1] == 'getEnum':
+            e = ctypes.c_int()
+            rc = mate.lib_mate.getEnumProperty(p[2], -1,
+                                               ctypes.byref(e))
+            out = e.value
+        elif p[1] == 'getDouble':
+            d = ctypes.c_double()
+            rc = mate.lib_mate.getDoubleProperty(p[2], -1,
+                                                 ctypes.byref(d))
+            out = d.value
+        elif p[1] == 'getDoubleArray':
+            count = ctypes.c_int(len(p[0]))
+            p_values = ctypes.pointer(list(map(ctypes.c_double, p[0])))
+            rc = mate.lib_mate.getDoubleArrayProperty(p[2], -1,
+                                                      ctypes.byref(count),
+                                                      ctypes.byref(p_values)
+                                                      )
+            out = p_values[0][:count]
+        elif p[1] == 'getPair':
+            d1 = ctypes.c_double()
+            d2 = ctypes.c_double()
+            rc = mate.lib_mate.getPairProperty(p[2], -1,
+                                               ctypes.byref(d1),
+                                               ctypes.byref(d2))
+            out = d1.value, d2.value
+        elif p[1] == 'getEvent':
+            prop = mate.String(255)
+            p_prop = ctypes.pointer(prop)
+            value_count = ctypes.c_int()
+            p_values = p[0][2]
+            rc = mate.lib_mate.getEntityEventByDesc(ctypes.byref(p_prop),
+                                                    ctypes.
+                                                    byref(value_count),
+                                                    ctypes.
+                                                    byref(p_values), 0)
+            out = prop.text[:].decode(), value_count.value, p_values
+        elif p[1] == 'trigger':
+            rc = mate.lib_mate.triggerProperty(p[2], -1)
+            out = None
+        elif p[1] == 'setString':
+            rc = mate.lib_mate.setStringProperty(p[2], -1,
+                                                 p[3].encode())
+            out = None
+        elif p[1] == 'setBoolean':
+            rc = mate.lib_mate.setBooleanProperty(p[2], -1, p[3])
+            out = None
+        elif p[1] == 'setInteger':
+            rc = mate.lib_mate.setIntegerProperty(p[2], -1, p[3])
+            out = None
+        elif p[1] == 'setEnum':
+            rc = mate.lib_mate.setEnumProperty(p[2], -1, p[3])
+            out = None
+        elif p[1] == 'setDouble':
+            d = ctypes.c_double(p[3])
+            rc = mate.lib_mate.setDoubleProperty(p[2], -1, d)
+            out = None
+        elif p[1] == 'setDoubleArray':
+            count = len(p[3])
+            p_value = ctypes.pointer(list(map(ctypes.c_double, p[3])))
+            rc = mate.lib_mate.setDoubleArrayProperty(p[2], -1,
+                                                      count, p_value)
+            out = None
+        elif p[1] == 'setPair':
+            d1 = ctypes.c_double(p[3])
+            d2 = ctypes.c_double(p[4])
+            rc = mate.lib_mate.setPairProperty(p[2], -1, d1, d2)
+            out = None
+        elif p[1] == 'setObserved':
+            rc = mate.lib_mate.setObservedEntity(p[2], p[3])
+            out = None
+        elif p[1] == 'function':
+            flat_value = p[0]
+            p_args = p[3]
+            rc = mate.lib_mate.callFunctionByDesc(p[2],
+                                                  ctypes.byref(flat_value),
+                                                  ctypes.byref(p_args))
+            out = flat_value
+        else:
+            rc = 0
+            out = p[0]
+        if (rc != mate.rcs['RMT_SUCCESS'] and
+                rc != mate.rcs['RMT_NOEVENT'] and
+                rc != mate.rcs['RMT_UNKNOWNOBJECT']):
+            out = p[0]
+            mate.log.AppendText('MATRIX error, response: ' +
+                                _legacy_rc_key(mate, rc) + '.\n')
+    else:
+        out = p[0]
+    _legacy_check_for_response_error(mate, rc)
+    return out, rc
+
+
+def _stub_mate():
+    mate = MATE(_Text(), lambda: None, True)
+    mate.lib_mate = _StubLibrary()
+    return mate
+
+
+def remote_access_overhead(number=100000, repeat=5):
+    """
+    Measures the per-call overhead of MATE.remote_access against a stub library, before and after the table-driven
+    call layer.
+
+    Parameters
+    ----------
+    number : int
+        Number of calls per timing run. Default is 100000
+    repeat : int
+        Number of timing runs, of which the fastest is kept. Default is 5
+
+    Returns
+    -------
+    timings : dict
+        Maps each operation to a (legacy, current) tuple of seconds per call
+
+    Examples
+    --------
+    >>> from nOmicron.utils.benchmark import remote_access_overhead
+    >>> remote_access_overhead()
+    """
+    mate = _stub_mate()
+    calls = {'getDouble': lambda: [None, 'getDouble', 'Regulator.Z_Out'],
+             'getPair': lambda: [None, 'getPair', 'XYScanner.Target_Position'],
+             'getInteger': lambda: [None, 'getInteger', 'View.Z_Fw.Data_Size', ctypes.c_uint()],
+             'setDouble': lambda: [None, 'setDouble', 'GapVoltageControl.Voltage', 1.0]}
+
+    timings = {}
+    for operation, func_params in calls.items():
+        legacy = min(timeit.repeat(lambda: _legacy_remote_access(mate, func_params(), 1),
+                                   number=number, repeat=repeat)) / number
+        current = min(timeit.repeat(lambda: mate.remote_access(func_params(), 1),
+                                    number=number, repeat=repeat)) / number
+        timings[operation] = (legacy, current)
+        print(f"{operation}: {legacy * 1e6:.2f} us -> {current * 1e6:.2f} us per call")
+    return timings
+
+
+def double_array_throughput(size=1024, number=1000, repeat=5):
+    """
+    Measures writing and reading back a ramp table as one array property, against a stub library, compared with
+    writing it one scalar property at a time.
+
+    Parameters
+    ----------
+    size : int
+        Number of values in the table. Default is 1024
+    number : int
+        Number of tables per timing run. Default is 1000
+    repeat : int
+        Number of timing runs, of which the fastest is kept. Default is 5
+
+    Returns
+    -------
+    timings : dict
+        Seconds per table for each method, and the array values per second
+    """
+    mate = _stub_mate()
+    ramp = np.linspace(-1, 1, size)
+    out = np.zeros(size)
+
+    def scalar():
+        for value in ramp:
+            mate.remote_access([None, 'setDouble', 'Spectroscopy.Device_1_Start', value], 1)
+
+    def array():
+        mate.remote_access([None, 'setDoubleArray', 'Spectroscopy.Ramp', ramp], 1)
+        mate.remote_access([out, 'getDoubleArray', 'Spectroscopy.Ramp'], 1)
+
+    timings = {'scalar': min(timeit.repeat(scalar, number=max(number // 100, 1), repeat=repeat)) /
+                         max(number // 100, 1),
+               'array': min(timeit.repeat(array, number=number, repeat=repeat)) / number}
+    timings['values_per_second'] = 2 * size / timings['array']
+    print(f"{size} values: {timings['scalar'] * 1e3:.3f} ms as scalars, {timings['array'] * 1e3:.3f} ms as an array "
+          f"set + get ({timings['values_per_second']:.3g} values/s)")
+    return timings
+
+
+def _legacy_deployment_parameter(path, eei_name, dp_name):
+    """The parse-per-call MATE.deployment_parameter, kept only as a baseline to benchmark against."""
+    try:
+        root = ET.parse(path).getroot()
+        p = re.compile(r'^{.*?}(.*)')
+        elements = [i for i in root if p.match(i.tag).group(1) == 'ExperimentElementInstance']
+        eei = [i for i in elements if i.get('name') == eei_name]
+        if len(eei) == 1:
+            dp = [i for i in eei[0] if i.get('name') == dp_name]
+            value = dp[0].get('value').split('::')[0] if len(dp) == 1 else ''
+        else:
+            value = ''
+    except:
+        value = ''
+    return value
+
+
+def _write_exps(path, elements, parameters):
+    namespace = 'http://www.omicron.de/ExperimentStructure'
+    with open(path, 'w') as f:
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<ExperimentStructure xmlns="{namespace}">\n')
+        for i in range(elements):
+            f.write(f'  <ExperimentElementInstance name="Element_{i}">\n')
+            for j in range(parameters):
+                f.write(f'    <DeploymentParameter name="Parameter_{j}" value="Clock{j}::Value"/>\n')
+            f.write('  </ExperimentElementInstance>\n')
+        f.write('</ExperimentStructure>\n')
+
+
+def deployment_parameter_lookup(elements=2000, parameters=20, number=20, repeat=3):
+    """
+    Measures MATE.deployment_parameter on a synthetic .exps file, parsing the file on every call versus looking up the
+    cached index.
+
+    Parameters
+    ----------
+    elements : int
+        Number of experiment element instances in the file. Default is 2000
+    parameters : int
+        Number of deployment parameters per element. Default is 20
+    number : int
+        Number of lookups per timing run. Default is 20
+    repeat : int
+        Number of timing runs, of which the fastest is kept. Default is 3
+
+    Returns
+    -------
+    timings : tuple
+        (legacy, current) seconds per lookup
+    """
+    mate = _stub_mate()
+    with tempfile.TemporaryDirectory() as directory:
+        mate.experiments_directory = directory
+        path = os.path.join(directory, 'Synthetic.exps')
+        _write_exps(path, elements, parameters)
+        eei_name, dp_name = f'Element_{elements - 1}', f'Parameter_{parameters - 1}'
+        legacy = min(timeit.repeat(lambda: _legacy_deployment_parameter(path, eei_name, dp_name),
+                                   number=number, repeat=repeat)) / number
+        current = min(timeit.repeat(lambda: mate.deployment_parameter('Synthetic', eei_name, dp_name),
+                                    number=number * 1000, repeat=repeat)) / (number * 1000)
+    print(f"{elements} x {parameters} .exps: {legacy * 1e3:.2f} ms -> {current * 1e6:.2f} us per lookup")
+    return legacy, current
+
+
+def import_time(modules=('nOmicron', 'nOmicron.mate.mate', 'nOmicron.mate.objects')):
+    """
+    Measures the cumulative import time of each module in a fresh interpreter with -X importtime.
+
+    Parameters
+    ----------
+    modules : tuple of str
+        Modules to import, each in its own interpreter. Default is the package, MATE and the objects module
+
+    Returns
+    -------
+    timings : dict
+        Seconds to import each module
+
+    Examples
+    --------
+    >>> from nOmicron.utils.benchmark import import_time
+    >>> import_time(('nOmicron', 'nOmicron.mate.objects'))
+    """
+    timings = {}
+    for module in modules:
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                capture_output=True, text=True, check=True)
+        # Lines are "import time: self [us] | cumulative | imported package"; the module itself is listed last
+        cumulative = {line.split('|')[2].strip(): int(line.split('|')[1])
+                      for line in result.stderr.splitlines() if line.startswith('import time:') and '[us]' not in line}
+        timings[module] = cumulative[module] * 1e-6
+        print(f"import {module}: {timings[module] * 1e3:.1f} ms")
+    return timings
+
+
+def _mtrx_block(tag, content, timestamp=None):
+    header = tag[::-1].encode('ascii') + struct.pack('<I', len(content))
+    return header + (b'' if timestamp is None else struct.pack('<Q', timestamp)) + content
+
+
+def _mtrx_string(string):
+    return struct.pack('<I', len(string)) + string.encode('utf-16-le')
+
+
+def _mtrx_value(value):
+    if isinstance(value, bool):
+        return b'LOOB' + struct.pack('<I', value)
+    if isinstance(value, int):
+        return b'GNOL' + struct.pack('<i', value)
+    if isinstance(value, float):
+        return b'BUOD' + struct.pack('<d', value)
+    return b'GRTS' + _mtrx_string(value)
+
+
+def write_data_file(path, values, intended_points=None, timestamp=0):
+    """Writes a synthetic *_mtrx data file of int32 values, e.g. to check mtrx.DataFile against."""
+    values = np.asarray(values, '<i4')
+    intended_points = values.size if intended_points is None else intended_points
+    content = _mtrx_block('DESC', struct.pack('<II', intended_points, values.size)) + \
+              _mtrx_block('DATA', values.tobytes())
+    with open(path, 'wb') as f:
+        f.write(mtrx.SIGNATURE + _mtrx_block('BKLT', content, timestamp))
+
+
+def write_parameter_file(path, changes, bricklets):
+    """
+    Writes a synthetic session .mtrx file, e.g. to check mtrx.ParameterLog against.
+
+    Parameters
+    ----------
+    path : str
+    changes : list of tuple
+        (timestamp, element, parameter, unit, value) for each parameter change
+    bricklets : list of tuple
+        (timestamp, filename) for each bricklet, written after the changes with the same or an earlier timestamp
+    """
+    blocks = [(timestamp, 0, _mtrx_block('PMOD', struct.pack('<I', 0) + _mtrx_string(element) +
+                                         _mtrx_string(parameter) + _mtrx_string(unit) + _mtrx_value(value), timestamp))
+              for timestamp, element, parameter, unit, value in changes]
+    blocks += [(timestamp, 1, _mtrx_block('BREF', _mtrx_string(filename), timestamp))
+               for timestamp, filename in bricklets]
+    with open(path, 'wb') as f:
+        f.write(mtrx.SIGNATURE + b''.join(block for _, _, block in sorted(blocks, key=lambda b: b[:2])))
+
+
+def mtrx_lookup(changes=100000, parameters=50, bricklets=1000, number=1000):
+    """
+    Measures looking up a parameter for a bricklet in a synthesised session .mtrx file, with the indexed
+    mtrx.ParameterLog versus scanning every change before it.
+
+    Parameters
+    ----------
+    changes : int
+        Number of parameter changes in the session. Default is 100000
+    parameters : int
+        Number of distinct parameters changed. Default is 50
+    bricklets : int
+        Number of bricklets in the session. Default is 1000
+    number : int
+        Number of lookups per timing run. Default is 1000
+
+    Returns
+    -------
+    timings : tuple
+        (scan, indexed) seconds per lookup
+    """
+    rng = np.random.default_rng(0)
+    start = int(time.time())
+    with tempfile.TemporaryDirectory() as directory:
+        # Several changes per second, as MATRIX writes them
+        log = [(start + i // 10, f'Element_{i % parameters}', 'Value', 'V', float(i)) for i in range(changes)]
+        references = [(log[i][0], f'default--{n}_1.Z_mtrx')
+                      for n, i in enumerate(sorted(rng.choice(changes, bricklets, replace=False)), 1)]
+        path = os.path.join(directory, 'default.mtrx')
+        write_parameter_file(path, log, references)
+        parameters_log = mtrx.ParameterLog(path)
+
+        def scan(name, filename):
+            reference = parameters_log.bricklets[filename]
+            value = None
+            for change in parameters_log.changes[:reference.index]:
+                if f"{change.element}.{change.parameter}" == name:
+                    value = change.value
+            return value
+
+        name = f'Element_{parameters - 1}.Value'
+        filename = references[-1][1]
+        slow = min(timeit.repeat(lambda: scan(name, filename), number=max(number // 100, 1), repeat=3)) / \
+               max(number // 100, 1)
+        position = parameters_log.bricklets[filename].index
+        fast = min(timeit.repeat(lambda: parameters_log._value_before(name, position), number=number, repeat=3)) / \
+               number
+    print(f"Parameter for a bricklet in {changes} changes: {slow * 1e3:.2f} ms scanning -> {fast * 1e6:.2f} us indexed")
+    return slow, fast
+
+
+def simulated_scan(points=128, lines=32, raster_time=1e-3, speed=100.0):
+    """
+    Runs a Forward-Backward scan of Z and I through the whole microscope layer against the simulated Matrix, and
+    compares its time to the raster time of the scan.
+
+    Parameters
+    ----------
+    points : int
+        Points per line. Default is 128
+    lines : int
+        Lines to scan. Default is 32
+    raster_time : float
+        Seconds per point. Default is 1e-3
+    speed : float
+        Simulated seconds per second. Default is 100
+
+    Returns
+    -------
+    timings : dict
+        The seconds taken and expected, the library calls made, and the event polling counters
+    """
+    from nOmicron.mate import objects as mo
+    from nOmicron.mate.simulator import Simulator
+    from nOmicron.microscope import IO, xy_scanner
+
+    simulator = Simulator(speed=speed)
+    IO.connect(backend=simulator, prefetch_limits=False)
+    try:
+        mo.xy_scanner.Points(points)
+        mo.xy_scanner.Raster_Time(raster_time)
+        mo.event_wait.reset_counters()
+        t = time.perf_counter()
+        xy_scanner.get_xy_scan(["Z", "I"], "Forward-Backward", "Up", num_lines=lines)
+        elapsed = time.perf_counter() - t
+    finally:
+        IO.disconnect()
+    expected = 2 * lines * points * raster_time / speed
+    timings = dict(elapsed=elapsed, expected=expected, calls=sum(simulator.calls.values()), **mo.event_wait.stats())
+    print(f"Simulated {points} x {lines} scan: {elapsed:.3f} s for {expected:.3f} s of raster, "
+          f"{timings['calls']} library calls, mean latency {timings['mean_latency'] * 1e3:.2f} ms")
+    return timings
+
+
+def backend_overhead(number=2000, backends=('fake', 'record', 'replay')):
+    """
+    Measures the cost of reading a property through each backend, from the accessor down, and within the library
+    call alone as timed by the shared cost model. Backends other than fake run on a recording of the fake session.
+
+    Parameters
+    ----------
+    number : int
+        Number of reads. Default is 2000
+    backends : tuple of str
+        Any of 'fake', 'record' and 'replay', or 'ctypes' when connected to the Matrix. Default is all but ctypes
+
+    Returns
+    -------
+    timings : dict
+        Per backend, (seconds per read, seconds per library call)
+    """
+    from nOmicron.mate import objects as mo
+    from nOmicron.mate.backends import RecordBackend, ReplayBackend, costs
+    from nOmicron.microscope import IO
+
+    timings = {}
+    enabled, cached = costs.enabled, mo.property_cache.enabled
+    with tempfile.TemporaryDirectory() as directory:
+        recording = os.path.join(directory, 'session.jsonl')
+        made = dict(fake=lambda: 'fake', ctypes=lambda: 'ctypes',
+                    record=lambda: RecordBackend('fake', recording), replay=lambda: ReplayBackend(recording))
+        try:
+            mo.property_cache.enabled = False
+            for name in backends:
+                backend = made[name]()
+                costs.enabled = False
+                IO.connect(backend=backend, prefetch_limits=False)
+                costs.reset()
+                costs.enabled = True
+                t = time.perf_counter()
+                for i in range(number):
+                    mo.xy_scanner.Points()
+                elapsed = (time.perf_counter() - t) / number
+                costs.enabled = False
+                IO.disconnect()
+                if name == 'record':
+                    backend.close()
+                timings[name] = elapsed, costs.stats()['getIntegerProperty']['mean']
+                print(f"{name}: {elapsed * 1e6:.2f} us per read, {timings[name][1] * 1e6:.2f} us in the library")
+        finally:
+            costs.enabled, mo.property_cache.enabled = enabled, cached
+    return timings
+
+
+if __name__ == '__main__':
+    remote_access_overhead()
+    double_array_throughput()
+    deployment_parameter_lookup()
+    import_time()
+    mtrx_lookup()
+    simulated_scan()
+    backend_overhead()
@@ -0,0 +1,119 @@
+# Oliver Gordon, 2019
+
+import json
+import os
+import time
+
+import numpy as np
+
+line_dtype = np.dtype([('done', bool), ('time', np.float64), ('run_count', np.int64), ('cycle_count', np.int64)])
+
+
+class DatasetWriter(object):
+    """
+    An acquisition written line by line into preallocated memory-mapped .npy files, so that memory use stays flat
+    however long the run, and everything written survives a crash or disconnection.
+
+    A dataset at path is three files:
+    - path.npy: the data, of the full shape of the run, with lines along the last axis
+    - path.lines.npy: a record per line of if it has been written, when, and the view's run and cycle counters
+    - path.json: the shape, dtype and acquisition parameters
+
+    Opening an existing path without a shape reopens it to read, or to resume an acquisition made point by point,
+    such as a grid of spectra, by acquiring only the points with lines missing(). A raster scan cannot be restarted
+    partway, so get_xy_scan does not resume: given a dataset, it scans and writes every line again.
+
+    Parameters
+    ----------
+    path : str
+        Path of the dataset, without extension
+    shape : tuple or None, optional
+        Shape of the data, the last axis being points per line. Default is None, to reopen an existing dataset
+    dtype : data-type, optional
+        Of the data. Default is np.float32
+    parameters : dict or None, optional
+        Anything JSON serialisable describing the acquisition, e.g. channel names, scan size, bias
+
+    Examples
+    --------
+    A 16 x 16 grid of forward and backward I(V) spectra, which picks up where it left off if run again
+    >>> if os.path.exists("grid.json"):
+    >>>     dataset = DatasetWriter("grid")
+    >>> else:
+    >>>     dataset = DatasetWriter("grid", shape=(16, 16, 2, 100), parameters={"channel": "I(V)"})
+    >>> with dataset:
+    >>>     for x, y in sorted({index[:2] for index in dataset.missing()}):
+    >>>         v, I = get_point_spectra("I(V)", target_position=[x / 8 - 1, y / 8 - 1], start_end=[-1, 1],
+    >>>                                  sample_time=1e-3, sample_points=100, forward_back=True)
+    >>>         dataset.write((x, y), I)
+    """
+
+    def __init__(self, path, shape=None, dtype=np.float32, parameters=None):
+        self.path = path
+        if shape is None:
+            with open(path + '.json') as f:
+                sidecar = json.load(f)
+            self.parameters = sidecar['parameters']
+            self.data = np.lib.format.open_memmap(path + '.npy', mode='r+')
+            self.lines = np.lib.format.open_memmap(path + '.lines.npy', mode='r+')
+        else:
+            self.parameters = dict(parameters or {})
+            self.data = np.lib.format.open_memmap(path + '.npy', mode='w+', dtype=dtype, shape=tuple(shape))
+            self.lines = np.lib.format.open_memmap(path + '.lines.npy', mode='w+', dtype=line_dtype,
+                                                   shape=tuple(shape[:-1]))
+            self.write_sidecar()
+
+    def write_sidecar(self):
+        """Atomically (re)write path.json, e.g. after changing parameters."""
+        sidecar = dict(shape=self.data.shape, dtype=self.data.dtype.str, parameters=self.parameters)
+        with open(self.path + '.json.tmp', 'w') as f:
+            json.dump(sidecar, f, indent=4)
+        os.replace(self.path + '.json.tmp', self.path + '.json')
+
+    @property
+    def completed(self):
+        """Boolean array per line, True where the line has been written."""
+        return self.lines['done']
+
+    @property
+    def complete(self):
+        return bool(self.lines['done'].all())
+
+    def missing(self):
+        """Indices of the lines not yet written, in order."""
+        return [tuple(int(i) for i in index) for index in np.argwhere(~self.lines['done'])]
+
+    def write(self, index, values, timestamp=None, run_count=-1, cycle_count=-1):
+        """
+        Write a line, or a block of lines, and mark them done.
+
+        Parameters
+        ----------
+        index : tuple or int
+            Of the line, i.e. a position in all axes but the last, or of a block of lines, e.g. (x, y) for both
+            directions of the spectrum at x, y in a dataset of shape (x, y, direction, point)
+        values : array-like
+            The line, or lines of the block's shape. May be shorter than the points axis
+        timestamp : float or None, optional
+            When the line was acquired, in seconds since the epoch. Default is None, for now
+        run_count : int, optional
+        cycle_count : int, optional
+            The view's counters when the line was acquired. Default is -1, for unknown
+        """
+        values = np.asarray(values)
+        self.data[index][..., :values.shape[-1]] = values
+        self.lines[index] = (True, time.time() if timestamp is None else timestamp, run_count, cycle_count)
+
+    def flush(self):
+        self.data.flush()
+        self.lines.flush()
+
+    def close(self):
+        self.flush()
+        del self.data, self.lines
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
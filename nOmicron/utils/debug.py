@@ -7,11 +7,7 @@ from nOmicron.microscope import IO
 
 
 def view_channel_properties(channel_name):
-    # TODO: Rewrite!
-    def read_prop(obj, prop):
-        out = getattr(obj, prop)()
-        print(prop + ':', out)
-
+    """Connects, enables a channel, and prints the state of the main experiment elements read in one call."""
     channel_props = ['Enable']
     clock_props = ['Enable', 'Period', 'Samples']
     experiment_props = ['Bricklet_Written', 'Name', 'Result_File_Name',
@@ -30,18 +26,23 @@ def view_channel_properties(channel_name):
                         'X_Drift', 'X_Retrace', 'X_Retrace_Trigger',
                         'X_Trace_Trigger', 'Y_Drift', 'Y_Retrace',
                         'Y_Retrace_Trigger', 'Y_Trace_Trigger']
+    spectroscopy_props = list(mo.property_types['_Spectroscopy'])
 
-    obj_names = ['channel', 'clock', 'experiment', 'gap_voltage_control',
-                 'regulator', 'view', 'xy_scanner', 'spectroscopy']
+    obj_props = {'channel': channel_props, 'clock': clock_props, 'experiment': experiment_props,
+                 'gap_voltage_control': gap_voltage_control_props, 'regulator': regulator_props,
+                 'view': view_props, 'xy_scanner': xy_scanner_props, 'spectroscopy': spectroscopy_props}
     IO.connect()
     IO.enable_channel(channel_name)
-    for obj_name in obj_names:
-        obj = getattr(mo, obj_name)
+    snapshot = mo.read_many([(obj_name, prop) for obj_name, props in obj_props.items() for prop in props])
+    for obj_name, props in obj_props.items():
         print()
         print('Object ' + obj_name + ':')
         print('--------------------------------------------------------------')
-        for prop in eval(obj_name + '_props'):
-            read_prop(obj, prop)
+        for prop in props:
+            key = obj_name + '.' + prop
+            print(prop + ':', snapshot.errors[key] if key in snapshot.errors else snapshot[key])
+    print()
+    print(f'Read {len(snapshot.timings)} properties in {snapshot.total_time * 1e3:.1f} ms')
 
     mo.mate.disconnect()
 
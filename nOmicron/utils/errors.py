@@ -76,6 +76,14 @@ class MatrixRejectedError(Exception):
         super().__init__(self.message)
 
 
+class MatrixReplayMismatchError(Exception):
+    """A call to a ReplayBackend differs from the recording"""
+
+    def __init__(self, message=f"The calls made differ from those recorded"):
+        self.message = message
+        super().__init__(self.message)
+
+
 class MatrixParameterOutOfRangeWarning(Warning):
     def __init__(self, message="Requested parameter value is outside of tolerable range. \n "
                                "Matrix may behave oddly or die "):
@@ -84,3 +92,12 @@ class MatrixParameterOutOfRangeWarning(Warning):
 
     def __str__(self):
         return repr(self.message)
+
+
+class MatrixWriteNotConfirmedWarning(Warning):
+    def __init__(self, message="Matrix did not confirm a written value"):
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return repr(self.message)
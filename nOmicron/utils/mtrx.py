@@ -0,0 +1,247 @@
+# Oliver Gordon, 2019
+
+"""
+Readers for the files MATRIX writes as it acquires: the *_mtrx data files of each bricklet (e.g. .Z_mtrx, .I_mtrx,
+.I(V)_mtrx), and the session .mtrx file logging every parameter change.
+
+Both are a 12 byte signature, b'ONTMATRX0101', followed by blocks. Each block is a 4 character tag, stored reversed
+(e.g. b'TLKB' for BKLT), and the uint32 length of its content. Blocks of the session file, and the bricklet block of
+a data file, then have a uint64 timestamp in seconds since the epoch. All numbers are little endian, and strings are a
+uint32 number of characters followed by UTF-16.
+"""
+
+import bisect
+import ntpath
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+SIGNATURE = b'ONTMATRX0101'
+
+Block = namedtuple('Block', ['tag', 'offset', 'length', 'timestamp'])
+ParameterChange = namedtuple('ParameterChange', ['timestamp', 'index', 'element', 'parameter', 'unit', 'value'])
+BrickletReference = namedtuple('BrickletReference', ['timestamp', 'index', 'filename'])
+
+_value_formats = {b'BOOL': '<I', b'LONG': '<i', b'DOUB': '<d'}
+
+
+def _check_signature(buffer, path):
+    if bytes(buffer[:len(SIGNATURE)]) != SIGNATURE:
+        raise ValueError(f"{path} is not a MATRIX file")
+
+
+def _read_blocks(buffer, offset, end, timestamped):
+    """Yields the blocks between offset and end of a buffer."""
+    header = 16 if timestamped else 8
+    while offset + header <= end:
+        tag = bytes(buffer[offset:offset + 4])[::-1]
+        length, = struct.unpack_from('<I', buffer, offset + 4)
+        timestamp = struct.unpack_from('<Q', buffer, offset + 8)[0] if timestamped else None
+        yield Block(tag.decode('ascii', 'replace'), offset + header, length, timestamp)
+        offset += header + length
+
+
+def _read_string(buffer, offset):
+    n, = struct.unpack_from('<I', buffer, offset)
+    offset += 4
+    return bytes(buffer[offset:offset + 2 * n]).decode('utf-16-le'), offset + 2 * n
+
+
+def _read_value(buffer, offset):
+    kind = bytes(buffer[offset:offset + 4])[::-1]
+    offset += 4
+    if kind == b'STRG':
+        return _read_string(buffer, offset)
+    value, = struct.unpack_from(_value_formats[kind], buffer, offset)
+    return (bool(value) if kind == b'BOOL' else value), offset + struct.calcsize(_value_formats[kind])
+
+
+class DataFile(object):
+    """
+    A *_mtrx data file, memory-mapped rather than read. The raw values are a view straight onto the file.
+
+    Parameters
+    ----------
+    path : str
+
+    Attributes
+    ----------
+    timestamp : int
+        When the bricklet was started, in seconds since the epoch
+    intended_points : int
+        Number of points the bricklet was set up to acquire
+    raw : Numpy memmap
+        The int32 values captured so far, in order of acquisition
+
+    Examples
+    --------
+    >>> xydata, filename = get_xy_scan("Z", "Forward-Backward", "Up", return_filename=True)
+    >>> data = DataFile(filename)
+    >>> data.image(points=256, lines=256, x_retrace=True)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.buffer = np.memmap(path, np.uint8, 'r')
+        _check_signature(self.buffer, path)
+        bricklet = next(_read_blocks(self.buffer, len(SIGNATURE), self.buffer.size, True))
+        if bricklet.tag != 'BKLT':
+            raise ValueError(f"{path} has no bricklet")
+        self.timestamp = bricklet.timestamp
+        self.intended_points = None
+        self.raw = np.zeros(0, np.int32)
+        for block in _read_blocks(self.buffer, bricklet.offset, min(bricklet.offset + bricklet.length,
+                                                                    self.buffer.size), False):
+            if block.tag == 'DESC':
+                self.intended_points, captured_points = struct.unpack_from('<II', self.buffer, block.offset)
+            elif block.tag == 'DATA':
+                count = min(block.length, self.buffer.size - block.offset) // 4
+                self.raw = np.memmap(path, '<i4', 'r', offset=block.offset, shape=(count,))
+
+    @property
+    def captured_points(self):
+        return self.raw.size
+
+    @property
+    def complete(self):
+        return self.intended_points is not None and self.captured_points >= self.intended_points
+
+    def scaled(self, factor=1.0, offset=0.0):
+        """The values in physical units, (raw - offset) / factor, as with the channel's linear transfer function."""
+        return (self.raw - offset) / factor
+
+    def image(self, points, lines, x_retrace=False, y_retrace=False):
+        """
+        The raw values arranged as an image, as a view without copying. Lines not yet captured are left out.
+
+        Parameters
+        ----------
+        points : int
+            XYScanner.Points at the time of the bricklet
+        lines : int
+            XYScanner.Lines
+        x_retrace : bool
+            XYScanner.X_Retrace, if each line was scanned forward then backward
+        y_retrace : bool
+            XYScanner.Y_Retrace, if the frame was scanned up then down
+
+        Returns
+        -------
+        image : Numpy memmap
+            Of shape (y_up/y_down, line, x_forward/x_backward, point), in order of acquisition. Backward lines are in
+            the order they were scanned, i.e. right to left
+        """
+        x_dirs = 1 + bool(x_retrace)
+        y_dirs = 1 + bool(y_retrace)
+        per_line = x_dirs * points
+        captured_lines = min(self.captured_points // per_line, y_dirs * lines)
+        image = self.raw[:captured_lines * per_line].reshape(captured_lines, x_dirs, points)
+        if captured_lines == y_dirs * lines:
+            image = image.reshape(y_dirs, lines, x_dirs, points)
+        return image
+
+
+class ParameterLog(object):
+    """
+    The parameter changes and bricklets of a session .mtrx file, indexed to look up the parameters in force at any
+    time, or for any bricklet, in O(log n).
+
+    Parameters
+    ----------
+    path : str
+
+    Attributes
+    ----------
+    changes : list of ParameterChange
+        In order of the file
+    bricklets : dict
+        BrickletReference for each data file name
+
+    Examples
+    --------
+    >>> log = ParameterLog("default_2019Oct01-120000_STM-STM_Spectroscopy.mtrx")
+    >>> log.parameters_for("default_2019Oct01-120000_STM-STM_Spectroscopy--1_1.Z_mtrx")["XYScanner.Points"]
+    >>> log.value_at("GapVoltageControl.Voltage", timestamp)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.changes = []
+        self.bricklets = {}
+        buffer = np.memmap(path, np.uint8, 'r')
+        _check_signature(buffer, path)
+        for block in _read_blocks(buffer, len(SIGNATURE), buffer.size, True):
+            if block.offset + block.length > buffer.size:
+                break  # Still being written
+            if block.tag == 'PMOD':
+                element, offset = _read_string(buffer, block.offset + 4)
+                parameter, offset = _read_string(buffer, offset)
+                unit, offset = _read_string(buffer, offset)
+                value, offset = _read_value(buffer, offset)
+                self.changes.append(ParameterChange(block.timestamp, len(self.changes), element, parameter, unit,
+                                                    value))
+            elif block.tag == 'BREF':
+                filename, offset = _read_string(buffer, block.offset)
+                # MATRIX writes Windows paths, so split on either separator wherever this runs
+                filename = ntpath.basename(filename)
+                self.bricklets[filename] = BrickletReference(block.timestamp, len(self.changes), filename)
+        del buffer
+
+        # Per parameter, the position in the file of each change, to bisect
+        self._index = {}
+        for change in self.changes:
+            self._index.setdefault(f"{change.element}.{change.parameter}", []).append(change.index)
+
+    @property
+    def names(self):
+        """Names of every parameter changed in the session, as "Element.Parameter"."""
+        return list(self._index)
+
+    def _value_before(self, name, index):
+        positions = self._index[name]
+        i = bisect.bisect_left(positions, index)
+        return self.changes[positions[i - 1]].value if i else None
+
+    def value_at(self, name, timestamp):
+        """
+        The value of a parameter at a time.
+
+        Parameters
+        ----------
+        name : str
+            "Element.Parameter", e.g. "XYScanner.Points"
+        timestamp : float
+            Seconds since the epoch
+
+        Returns
+        -------
+        value
+            The last value set at or before timestamp, or None if it had not been set
+        """
+        return self._value_before(name, self._position(timestamp))
+
+    def _position(self, timestamp):
+        # Timestamps only have a resolution of a second, so changes in the same second count as before
+        if not hasattr(self, '_timestamps'):
+            self._timestamps = [change.timestamp for change in self.changes]
+        return bisect.bisect_right(self._timestamps, timestamp)
+
+    def parameters_at(self, timestamp):
+        """All parameters at a time, as {"Element.Parameter": value}."""
+        position = self._position(timestamp)
+        return {name: value for name, value in ((name, self._value_before(name, position)) for name in self._index)
+                if value is not None}
+
+    def parameters_for(self, filename):
+        """
+        All parameters in force when a bricklet was started, as {"Element.Parameter": value}.
+
+        Parameters
+        ----------
+        filename : str
+            The data file of the bricklet, with or without its directory
+        """
+        position = self.bricklets[ntpath.basename(filename)].index
+        return {name: value for name, value in ((name, self._value_before(name, position)) for name in self._index)
+                if value is not None}
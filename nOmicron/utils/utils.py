@@ -1,16 +1,18 @@
 # Oliver Gordon, 2019
 
-import inspect
 import json
-import sys
+import os
 import warnings
 
-from bs4 import BeautifulSoup
+import numpy as np
 
 from nOmicron.mate import objects as mo
 from nOmicron.utils.errors import MatrixNotInitialisedError, MatrixParameterOutOfRangeWarning, \
     MatrixUnsupportedOperationError, MatrixInvalidDataTypeError
 
+_min_max_cache = {}
+_min_max_path = os.path.join(os.path.expanduser("~"), ".nOmicron", "min_max.json")
+
 
 def is_online():
     """Tests if matrix is connected and running."""
@@ -30,7 +32,7 @@ def is_channel_real(channel_name):
     """
 
     is_online()
-    response = mo.mate.deployment_parameter(mo.mate.scope, channel_name, 'Trigger') == ''
+    response = mo.mate.channel(channel_name).trigger == ''
     if response:
         raise MatrixUnsupportedOperationError(f"Requested channel '{channel_name}' is not available in this \n"
                                               f"experiment. Available channels = {get_allowed_channels()}")
@@ -60,6 +62,7 @@ def is_parameter_within_allowed_range(parameter_name, parameter_value, config_fi
 def _force_set_scope(scope_name):
     """Forcibly sets the experiment scope e.g. STM_Basic"""
     mo.mate.scope = scope_name
+    mo.mate.channels = None
     mo.mate.lib_mate.setScopeName(scope_name)
 
 
@@ -90,7 +93,8 @@ def is_parameter_allowable(value, experiment_element, parameter, test=0):
     """
     Checks if a parameter is allowable within the reported operating range of the equipment.
 
-    Using this before sending an out of range prevents possible locking up/hard crashes of Matrix.
+    Using this before sending an out of range prevents possible locking up/hard crashes of Matrix. Whole arrays (e.g.
+    the values of a sweep) are checked against the limits at once.
 
     Attributes
     ----------
@@ -99,7 +103,7 @@ def is_parameter_allowable(value, experiment_element, parameter, test=0):
     parameter : str
         The parameter to be tested
     value :
-        The value of the parameter
+        The value of the parameter, or an array of values
 
     Returns
     -------
@@ -108,6 +112,7 @@ def is_parameter_allowable(value, experiment_element, parameter, test=0):
     Examples
     --------
     >>> is_parameter_allowable(100, "xy_scanner", "Points")
+    >>> is_parameter_allowable(np.linspace(-2, 2, 500), "gap_voltage_control", "Voltage")
 
     """
     if value is None:
@@ -116,10 +121,13 @@ def is_parameter_allowable(value, experiment_element, parameter, test=0):
         min_max = read_min_max(experiment_element, parameter, test)
         if min_max:
             try:
-                response = min_max[0] <= value <= min_max[1]
+                values = np.asarray(value)
+                response = bool(np.all((min_max[0] <= values) & (values <= min_max[1])))
             except:
                 raise MatrixInvalidDataTypeError
             if not response:
+                if values.ndim:
+                    value = f"{values.min()} to {values.max()}"
                 warnings.warn(
                     f"{parameter} ({value}) should be within range {min_max[0]} <= {parameter} <= {min_max[1]}. Matrix may die",
                     MatrixParameterOutOfRangeWarning)
@@ -132,6 +140,10 @@ def read_min_max(experiment_element, parameter, test=0):
     """
     Reads the minimum and maximum allowed values for settable parameters.
 
+    Limits are fixed for a deployed experiment, so are only read from the Matrix once per session (or not at all, if
+    loaded with load_min_max). They are kept per object the Matrix knows, e.g. Clock2.Samples, so the limits of the
+    clock, channel or view in use are returned.
+
     Attributes
     ----------
     experiment_element : str
@@ -149,24 +161,95 @@ def read_min_max(experiment_element, parameter, test=0):
     >>> read_min_max("xy_scanner", "Points")
     """
 
-    p = 'function'
     experiment_element = _friendly_name_to_mate(experiment_element)
-    members = inspect.getmembers(sys.modules['nOmicron.mate.objects'], inspect.isclass)
-    inspected = [item[1] for item in members if item[0] == experiment_element][0]
+    element = [v for v in mo.elements.values() if v.__class__.__name__ == experiment_element][0]
+    key = mo._object_name(element, parameter)
+    try:
+        return _min_max_cache[key]
+    except KeyError:
+        pass
+
+    p = 'function'
 
     def get_value(min_max):
-        if experiment_element == "_Clock":
-            out = mo._process(p, [inspected(1.0), min_max], parameter, test)
-        else:
-            out = mo._process(p, [inspected(), min_max], parameter, test)
+        out = mo._process(p, [element, min_max], parameter, test)
         if type(out) is tuple:
             out = out[0]
         return out
 
     outs = [get_value("min"), get_value("max")]
+    if mo.mate.rc == mo.mate.rcs['RMT_SUCCESS']:
+        _min_max_cache[key] = outs
     return outs
 
 
+def prefetch_min_max():
+    """Reads the limits of every settable numeric parameter into the session cache, skipping those already known, and
+    those of the clock, channel and view while none is in use."""
+    for element in mo.elements.values():
+        experiment_element = element.__class__.__name__
+        volatile = getattr(element, '_volatile', ())
+        for parameter, p in mo.property_types[experiment_element].items():
+            if p in ('double', 'integer', 'unsigned_integer', 'pair') and parameter not in volatile and \
+                    '' not in mo._object_name(element, parameter).split('.'):
+                try:
+                    read_min_max(experiment_element, parameter)
+                except Exception:
+                    pass
+
+
+def clear_min_max():
+    """Forgets all cached parameter limits."""
+    _min_max_cache.clear()
+
+
+def _min_max_scope():
+    return f"{getattr(mo.mate, 'matrix_dir', '')}/{mo.mate.scope}"
+
+
+def save_min_max(path=_min_max_path):
+    """
+    Saves the cached parameter limits to disk, under the current Matrix version and experiment scope.
+
+    Parameters
+    ----------
+    path : str
+        The json file to save to. Default is ~/.nOmicron/min_max.json
+    """
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        saved = {}
+    saved[_min_max_scope()] = _min_max_cache
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(saved, f, indent=1)
+
+
+def load_min_max(path=_min_max_path):
+    """
+    Loads parameter limits previously saved for the current Matrix version and experiment scope into the cache.
+
+    Parameters
+    ----------
+    path : str
+        The json file to load from. Default is ~/.nOmicron/min_max.json
+
+    Returns
+    -------
+    loaded : int
+        The number of parameters loaded
+    """
+    try:
+        with open(path) as f:
+            saved = json.load(f).get(_min_max_scope(), {})
+    except (OSError, ValueError):
+        saved = {}
+    _min_max_cache.update(saved)
+    return len(saved)
+
+
 def restore_z_functionality():
     mo.xy_scanner.X_Trace_Trigger(False)
     mo.xy_scanner.X_Retrace_Trigger(False)
@@ -175,14 +258,4 @@ def restore_z_functionality():
 
 
 def get_allowed_channels():
-    experiment_name = mo.mate.scope
-    install_path = mo.mate.installation_directory
-    experiment_path = f"{install_path}\Templates\default\Experiments\{experiment_name}.expd"
-
-    experiment_file = open(experiment_path, "r").read()
-    soup = BeautifulSoup(experiment_file, "xml")
-
-    raw_entries = soup.findAll(panelType="ChannelControl")
-    allowed_channels = [line.attrs["experimentElementInstanceName"] for line in raw_entries]
-
-    return allowed_channels
+    return list(mo.mate.channel_registry())
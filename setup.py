@@ -12,8 +12,9 @@ setup(
     packages=find_packages(),
     install_requires=['numpy', 'scipy', 'tqdm', 'matplotlib', 'natsort', 'pefile', 'psutil', 'requests', 'backoff',
                       'bs4', 'lxml'],
+    python_requires='>=3.7',
     classifiers=[
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
         "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
         "Operating System :: Microsoft :: Windows"]
 )
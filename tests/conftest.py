@@ -0,0 +1,23 @@
+# Oliver Gordon, 2019
+
+import pytest
+
+from nOmicron.utils.benchmark import _stub_mate
+
+
+@pytest.fixture
+def stub_mate():
+    """A MATE calling a stub of the remote access library, which answers every call with success."""
+    return _stub_mate()
+
+
+@pytest.fixture
+def simulator():
+    """Connects to a simulated Matrix, running a hundred times faster than real time, for the length of a test."""
+    from nOmicron.mate.simulator import Simulator
+    from nOmicron.microscope import IO
+
+    simulator = Simulator(speed=100)
+    IO.connect(backend=simulator)
+    yield simulator
+    IO.disconnect()
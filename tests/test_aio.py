@@ -0,0 +1,105 @@
+# Oliver Gordon, 2019
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from nOmicron.mate import objects as mo
+from nOmicron.microscope import aio
+
+
+def _state(simulator):
+    return simulator.properties[f'{simulator.scope}.State']
+
+
+def test_properties(simulator):
+    assert asyncio.run(aio.set_property("xy_scanner", "Points", 32)) == 32
+    assert asyncio.run(aio.get_property(mo.xy_scanner, "Points")) == 32
+
+
+def test_scan(simulator):
+    mo.xy_scanner.Points(32)
+    mo.xy_scanner.Raster_Time(1e-3)
+
+    async def acquire():
+        return [line async for line in aio.scan(["Z", "I"], "Forward-Backward", num_lines=4)]
+
+    lines = asyncio.run(acquire())
+    assert [(line.channel, line.x_direction, line.line) for line in lines] == \
+           [(channel, x_direction, line) for line in range(4) for x_direction in (0, 1) for channel in ("Z", "I")]
+    assert all(line.data.shape == (32,) and np.isfinite(line.data).all() for line in lines)
+    assert _state(simulator) == 'idle' and not simulator.observed
+
+
+def test_cancel_stops_scan(simulator):
+    mo.xy_scanner.Points(64)
+    mo.xy_scanner.Raster_Time(1e-2)
+
+    async def acquire(started):
+        async for line in aio.scan("Z", "Forward-Backward"):
+            started.set()
+            await asyncio.sleep(60)
+
+    async def cancel():
+        started = asyncio.Event()
+        task = asyncio.ensure_future(acquire(started))
+        await started.wait()
+        assert _state(simulator) == 'running' and simulator.observed
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert _state(simulator) == 'idle' and not simulator.observed
+
+
+def test_break_stops_scan(simulator):
+    mo.xy_scanner.Points(64)
+    mo.xy_scanner.Raster_Time(1e-2)
+
+    async def acquire():
+        async for line in aio.scan("Z", "Forward-Backward"):
+            break
+
+    asyncio.run(acquire())
+    assert _state(simulator) == 'idle' and not simulator.observed
+
+
+def test_scan_down_rejected(simulator):
+    async def acquire():
+        async for line in aio.scan("Z", y_direction="Down"):
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(acquire())
+    assert _state(simulator) == 'idle' and not simulator.observed
+
+
+def test_point_spectra(simulator):
+    v, I = asyncio.run(aio.point_spectra("I(V)", target_position=[0, 0], start_end=[0, 1], sample_time=1e-3,
+                                         sample_points=50, repeats=2))
+    np.testing.assert_allclose(v, np.linspace(0, 1, 50))
+    assert len(I) == 2 and all(data.shape == (50,) for repeat in I for data in repeat)
+    assert not simulator.observed
+
+
+def test_cancel_point_spectra_during_setup(simulator):
+    from nOmicron.mate.backends import costs
+
+    async def cancel():
+        task = asyncio.ensure_future(aio.point_spectra("I(V)", target_position=[1e-9, 1e-9], start_end=[0, 1],
+                                                       sample_time=1e-3, sample_points=50))
+        await asyncio.sleep(0.03)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    costs.latency = {None: 0.005}
+    try:
+        asyncio.run(cancel())
+    finally:
+        costs.latency = {}
+    assert not simulator.observed
+    assert not simulator.get('XYScanner.Trigger_Execute_At_Target_Position')
+    assert not simulator.get('XYScanner.Store_Current_Position')
@@ -0,0 +1,48 @@
+# Oliver Gordon, 2019
+
+import numpy as np
+import pytest
+
+from nOmicron.mate import objects as mo
+from nOmicron.mate.backends import RecordBackend, ReplayBackend
+from nOmicron.microscope import IO
+
+RAMP = np.linspace(-1, 1, 16)
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """A session setting and reading back a ramp table, and reading the number of points, on a simulated Matrix."""
+    path = str(tmp_path / 'session.jsonl')
+    backend = RecordBackend('fake', path)
+    IO.connect(backend=backend)
+    mo.set_double_array(mo.spectroscopy, 'Ramp', RAMP)
+    points = mo.xy_scanner.Points()
+    IO.disconnect()
+    backend.close()
+    return path, points
+
+
+def test_replay(recording):
+    path, points = recording
+    IO.connect(backend=ReplayBackend(path))
+    try:
+        np.testing.assert_array_equal(mo.set_double_array(mo.spectroscopy, 'Ramp', RAMP), RAMP)
+        assert mo.xy_scanner.Points() == points
+    finally:
+        IO.disconnect()
+
+
+def test_replay_array_into_smaller_buffer(recording):
+    path, points = recording
+    buffer = np.full(RAMP.size, np.nan)
+    IO.connect(backend=ReplayBackend(path))
+    try:
+        values = mo.set_double_array(mo.spectroscopy, 'Ramp', RAMP, test=buffer[:4])
+        assert mo.xy_scanner.Points() == points
+    finally:
+        IO.disconnect()
+    np.testing.assert_array_equal(values, RAMP[:4])
+    # Nothing is written past the end of the buffer passed in
+    assert np.isnan(buffer[4:]).all()
+
@@ -0,0 +1,65 @@
+# Oliver Gordon, 2019
+
+import time
+
+import numpy as np
+import pytest
+
+from nOmicron.microscope.continuous_spectroscopy import stream_continuous_signal
+from nOmicron.utils.dataset import DatasetWriter
+
+
+def _clock_enabled(simulator):
+    return simulator.get('Clock1.Enable')
+
+
+def test_stream(simulator):
+    chunks = [(chunk.index, chunk.timestamps.copy(), chunk.data.copy(), chunk.gaps)
+              for chunk in stream_continuous_signal("I_t", 0.1, 50, num_chunks=5)]
+    assert [index for index, _, _, _ in chunks] == list(range(5))
+    for _, timestamps, data, gaps in chunks:
+        assert timestamps.shape == data.shape == (50,) and np.isfinite(data).all()
+        np.testing.assert_allclose(np.diff(timestamps), 0.1 / 50, atol=1e-6)
+        assert gaps == 0
+    assert not _clock_enabled(simulator) and not simulator.observed
+
+
+def test_ring_slots_reused(simulator):
+    chunks = list(stream_continuous_signal("I_t", 0.1, 50, num_chunks=3, ring_chunks=2))
+    assert np.shares_memory(chunks[0].data, chunks[2].data)
+    assert not np.shares_memory(chunks[0].data, chunks[1].data)
+
+
+def test_gaps(simulator):
+    chunks = []
+    for chunk in stream_continuous_signal("I_t", 0.1, 50, num_chunks=3, gap_tolerance=0.05):
+        chunks.append((chunk.gap, chunk.gaps))
+        if chunk.index == 1:
+            # The next chunk is only delivered once asked for, so starts well after this one ended
+            time.sleep(0.3)
+    assert chunks[:2] == [(0.0, 0), (0.0, 0)]
+    assert chunks[2][0] > 0.05 and chunks[2][1] == 1
+
+
+def test_close_early(simulator):
+    stream = stream_continuous_signal("I_t", 0.1, 50)
+    assert [next(stream).index, next(stream).index] == [0, 1]
+    assert _clock_enabled(simulator) and simulator.observed
+    stream.close()
+    assert not _clock_enabled(simulator) and not simulator.observed
+
+
+def test_dataset(simulator, tmp_path):
+    path = str(tmp_path / 'signal')
+    chunks = [(chunk.timestamps[0], chunk.data.copy())
+              for chunk in stream_continuous_signal("I_t", 0.1, 50, num_chunks=3, dataset=path)]
+    dataset = DatasetWriter(path)
+    assert dataset.complete and dataset.parameters['channel_name'] == "I_t"
+    np.testing.assert_allclose(dataset.data, [data for _, data in chunks], rtol=1e-6)
+    np.testing.assert_array_equal(dataset.lines['time'], [start for start, _ in chunks])
+    dataset.close()
+
+
+def test_dataset_needs_num_chunks(simulator, tmp_path):
+    with pytest.raises(ValueError):
+        next(stream_continuous_signal("I_t", 0.1, 50, dataset=str(tmp_path / 'signal')))
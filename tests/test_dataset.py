@@ -0,0 +1,60 @@
+# Oliver Gordon, 2019
+
+import numpy as np
+
+from nOmicron.mate import objects as mo
+from nOmicron.microscope import continuous_spectroscopy, xy_scanner
+from nOmicron.utils.dataset import DatasetWriter
+
+
+def test_write_and_reopen(tmp_path):
+    path = str(tmp_path / 'grid')
+    dataset = DatasetWriter(path, shape=(2, 3, 4), parameters={"channel": "I(V)"})
+    assert dataset.missing() == [(x, y) for x in range(2) for y in range(3)]
+    dataset.write((0, 0), [1, 2, 3, 4], timestamp=10.0, run_count=1, cycle_count=2)
+    dataset.write(1, np.arange(12).reshape(3, 4))
+    dataset.write((0, 2), [5, 6])
+    dataset.close()
+
+    dataset = DatasetWriter(path)
+    assert dataset.parameters == {"channel": "I(V)"} and dataset.data.dtype == np.float32
+    assert dataset.missing() == [(0, 1)] and not dataset.complete
+    np.testing.assert_array_equal(dataset.data[0, 0], [1, 2, 3, 4])
+    np.testing.assert_array_equal(dataset.data[1], np.arange(12).reshape(3, 4))
+    np.testing.assert_array_equal(dataset.data[0, 2, :2], [5, 6])
+    assert tuple(dataset.lines[0, 0]) == (True, 10.0, 1, 2)
+
+    # Resume, writing only what is missing
+    with dataset:
+        for index in dataset.missing():
+            dataset.write(index, [7, 8, 9, 10])
+    dataset = DatasetWriter(path)
+    assert dataset.complete and dataset.missing() == []
+    np.testing.assert_array_equal(dataset.data[0, 1], [7, 8, 9, 10])
+    dataset.close()
+
+
+def test_xy_scan(simulator, tmp_path):
+    path = str(tmp_path / 'scan')
+    mo.xy_scanner.Points(32)
+    mo.xy_scanner.Raster_Time(1e-3)
+    xydata = xy_scanner.get_xy_scan(["Z", "I"], "Forward-Backward", "Up", num_lines=8, dataset=path)
+
+    dataset = DatasetWriter(path)
+    assert dataset.complete and dataset.data.shape == (2, 2, 8, 32)
+    assert dataset.parameters['channel_names'] == ["Z", "I"]
+    for i, name in enumerate(["Z", "I"]):
+        np.testing.assert_array_equal(dataset.data[i], xydata[name])
+        assert np.isfinite(dataset.data[i]).all()
+    assert (dataset.lines['run_count'] >= 0).all()
+    dataset.close()
+
+
+def test_point_spectra(simulator, tmp_path):
+    path = str(tmp_path / 'spectra')
+    v, I = continuous_spectroscopy.get_point_spectra("I(V)", target_position=[0, 0], start_end=[0, 1],
+                                                     sample_time=1e-3, sample_points=50, repeats=2, dataset=path)
+    dataset = DatasetWriter(path)
+    assert dataset.complete and dataset.data.shape == (2, 2, 50)
+    np.testing.assert_allclose(dataset.data, np.asarray(I, np.float32))
+    dataset.close()
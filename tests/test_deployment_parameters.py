@@ -0,0 +1,77 @@
+# Oliver Gordon, 2019
+
+import os
+
+import pytest
+
+from nOmicron.utils.benchmark import _legacy_deployment_parameter, _write_exps
+
+EXPS = '''<?xml version="1.0" encoding="UTF-8"?>
+<ExperimentStructure xmlns="http://www.omicron.de/ExperimentStructure">
+  <ExperimentElementInstance name="XYScanner">
+    <DeploymentParameter name="Trigger" value="XYScanner::Trigger"/>
+    <DeploymentParameter name="Twice" value="A::Value"/>
+    <DeploymentParameter name="Twice" value="B::Value"/>
+    <DeploymentParameter name="Thrice" value="A::Value"/>
+    <DeploymentParameter name="Thrice" value="B::Value"/>
+    <DeploymentParameter name="Thrice" value="C::Value"/>
+  </ExperimentElementInstance>
+  <ExperimentElementInstance name="Duplicate">
+    <DeploymentParameter name="Trigger" value="A::Trigger"/>
+  </ExperimentElementInstance>
+  <ExperimentElementInstance name="Duplicate">
+    <DeploymentParameter name="Trigger" value="B::Trigger"/>
+  </ExperimentElementInstance>
+  <ExperimentElementInstance name="Empty">
+    <DeploymentParameter name="Trigger"/>
+  </ExperimentElementInstance>
+</ExperimentStructure>
+'''
+
+
+@pytest.fixture
+def exps(stub_mate, tmp_path):
+    stub_mate.experiments_directory = str(tmp_path)
+    path = tmp_path / 'Synthetic.exps'
+    path.write_text(EXPS)
+    return str(path)
+
+
+@pytest.mark.parametrize('eei_name, dp_name', [('XYScanner', 'Trigger'), ('XYScanner', 'Twice'),
+                                               ('XYScanner', 'Thrice'), ('XYScanner', 'Missing'),
+                                               ('Duplicate', 'Trigger'), ('Empty', 'Trigger'),
+                                               ('Missing', 'Trigger')])
+def test_matches_legacy(stub_mate, exps, eei_name, dp_name):
+    assert stub_mate.deployment_parameter('Synthetic', eei_name, dp_name) == \
+           _legacy_deployment_parameter(exps, eei_name, dp_name)
+
+
+def test_values(stub_mate, exps):
+    assert stub_mate.deployment_parameter('Synthetic', 'XYScanner', 'Trigger') == 'XYScanner'
+    assert stub_mate.deployment_parameter('Synthetic', 'XYScanner', 'Thrice') == ''
+    assert stub_mate.deployment_parameter('Synthetic', 'Duplicate', 'Trigger') == ''
+
+
+def test_large_file(stub_mate, tmp_path):
+    stub_mate.experiments_directory = str(tmp_path)
+    path = str(tmp_path / 'Synthetic.exps')
+    _write_exps(path, 200, 20)
+    assert stub_mate.deployment_parameter('Synthetic', 'Element_199', 'Parameter_19') == \
+           _legacy_deployment_parameter(path, 'Element_199', 'Parameter_19') == 'Clock19'
+
+
+def test_reparsed_on_change(stub_mate, exps):
+    assert stub_mate.deployment_parameter('Synthetic', 'XYScanner', 'Trigger') == 'XYScanner'
+    mtime = os.stat(exps).st_mtime_ns
+    with open(exps, 'w') as f:
+        f.write(EXPS.replace('XYScanner::Trigger', 'Other::Trigger'))
+    os.utime(exps, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+    assert stub_mate.deployment_parameter('Synthetic', 'XYScanner', 'Trigger') == 'Other'
+
+
+@pytest.mark.parametrize('content', [None, 'Not XML'])
+def test_missing_or_malformed(stub_mate, tmp_path, content):
+    stub_mate.experiments_directory = str(tmp_path)
+    if content is not None:
+        (tmp_path / 'Synthetic.exps').write_text(content)
+    assert stub_mate.deployment_parameter('Synthetic', 'XYScanner', 'Trigger') == ''
@@ -0,0 +1,47 @@
+# Oliver Gordon, 2019
+
+import numpy as np
+
+from nOmicron.mate import objects as mo
+
+
+def test_set_then_get(stub_mate):
+    ramp = np.linspace(-1, 1, 1024)
+    stub_mate.remote_access([None, 'setDoubleArray', 'Spectroscopy.Ramp', ramp], 1)
+    out = np.zeros(ramp.size)
+    values, rc = stub_mate.remote_access([out, 'getDoubleArray', 'Spectroscopy.Ramp'], 1)
+    assert rc == 1
+    assert values.dtype == np.float64
+    np.testing.assert_array_equal(values, ramp)
+
+
+def test_get_reads_into_buffer(stub_mate):
+    stub_mate.remote_access([None, 'setDoubleArray', 'Spectroscopy.Ramp', np.arange(8.0)], 1)
+    out = np.zeros(8)
+    values, _ = stub_mate.remote_access([out, 'getDoubleArray', 'Spectroscopy.Ramp'], 1)
+    assert np.shares_memory(values, out)
+
+
+def test_get_truncates_to_count(stub_mate):
+    stub_mate.remote_access([None, 'setDoubleArray', 'Spectroscopy.Ramp', np.arange(4.0)], 1)
+    values, _ = stub_mate.remote_access([np.zeros(10), 'getDoubleArray', 'Spectroscopy.Ramp'], 1)
+    np.testing.assert_array_equal(values, np.arange(4.0))
+
+
+def test_get_at_most_size(stub_mate):
+    stub_mate.remote_access([None, 'setDoubleArray', 'Spectroscopy.Ramp', np.arange(16.0)], 1)
+    values, _ = stub_mate.remote_access([np.zeros(4), 'getDoubleArray', 'Spectroscopy.Ramp'], 1)
+    np.testing.assert_array_equal(values, np.arange(4.0))
+
+
+def test_set_converts_to_float64(stub_mate):
+    stub_mate.remote_access([None, 'setDoubleArray', 'Spectroscopy.Ramp', np.arange(6.0)[::2]], 1)
+    np.testing.assert_array_equal(stub_mate.lib_mate.arrays[b'Spectroscopy.Ramp'], [0.0, 2.0, 4.0])
+
+
+def test_accessors(simulator):
+    ramp = np.linspace(0, 1, 5)
+    np.testing.assert_array_equal(mo.set_double_array(mo.spectroscopy, 'Ramp', ramp), ramp)
+    np.testing.assert_array_equal(mo.get_double_array(mo.spectroscopy, 'Ramp', 3), ramp[:3])
+    np.testing.assert_array_equal(mo.get_double_array(mo.spectroscopy, 'Ramp', 10), ramp)
+    np.testing.assert_array_equal(mo.set_double_array(mo.spectroscopy, 'Ramp', [1, 2]), [1.0, 2.0])
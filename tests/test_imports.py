@@ -0,0 +1,63 @@
+# Oliver Gordon, 2019
+
+import subprocess
+import sys
+
+import pytest
+
+from nOmicron.utils.benchmark import import_time
+
+# Seconds each module may take to import in a fresh interpreter, well above what they take, to catch a heavy import
+# or a call to the hardware creeping back in
+BUDGET = {'nOmicron': 0.05, 'nOmicron.mate.objects': 1.0}
+
+
+def _run(code):
+    """Runs code in a fresh interpreter, so that imports are not already cached."""
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+
+def test_package_import_is_lazy():
+    _run("import sys, nOmicron\n"
+         "assert not [m for m in sys.modules if m.startswith('nOmicron.')], sys.modules\n"
+         "assert 'numpy' not in sys.modules")
+
+
+def test_lazy_attributes():
+    _run("import sys, nOmicron\n"
+         "from nOmicron.mate.mate import MATE\n"
+         "assert nOmicron.MATE is MATE and nOmicron.mate.MATE is MATE\n"
+         "assert nOmicron.objects is sys.modules['nOmicron.mate.objects']\n"
+         "assert nOmicron.microscope is sys.modules['nOmicron.microscope']")
+
+
+@pytest.mark.parametrize('module', ['nOmicron', 'nOmicron.mate'])
+def test_unknown_attribute(module):
+    _run(f"import {module}\n"
+         f"try:\n"
+         f"    {module}.Nonexistent\n"
+         f"except AttributeError:\n"
+         f"    pass\n"
+         f"else:\n"
+         f"    raise AssertionError")
+
+
+def test_bitness_without_pefile():
+    _run("import sys, nOmicron.mate.objects\n"
+         "assert 'pefile' not in sys.modules")
+
+
+def test_microscope_imports_have_no_side_effects():
+    # Any call to the Matrix, or shelling out as to ping, fails the import
+    _run("import subprocess\n"
+         "from nOmicron.mate import objects as mo\n"
+         "def fail(*args, **kwargs):\n"
+         "    raise AssertionError(args)\n"
+         "mo.mate.remote_access = mo.mate.connect = subprocess.Popen = fail\n"
+         "import nOmicron.microscope.PLL, nOmicron.microscope.conditioning, nOmicron.microscope.black_box")
+
+
+def test_import_budget():
+    timings = import_time(tuple(BUDGET))
+    over = {module: timings[module] for module in BUDGET if timings[module] > BUDGET[module]}
+    assert not over, f"Imports over budget: {over}"
@@ -0,0 +1,128 @@
+# Oliver Gordon, 2019
+
+import os
+
+import numpy as np
+import pytest
+
+from nOmicron.utils import mtrx
+from nOmicron.utils.benchmark import write_data_file, write_parameter_file
+
+START = 1570000000
+
+
+@pytest.fixture
+def values():
+    return np.random.default_rng(0).integers(-2 ** 31, 2 ** 31, 2 * 8 * 2 * 16, dtype=np.int64).astype('<i4')
+
+
+@pytest.fixture
+def data_file(tmp_path, values):
+    path = str(tmp_path / 'default--1_1.Z_mtrx')
+    write_data_file(path, values, timestamp=START)
+    return path
+
+
+def test_data_file(data_file, values):
+    data = mtrx.DataFile(data_file)
+    assert data.timestamp == START
+    assert data.intended_points == data.captured_points == values.size and data.complete
+    np.testing.assert_array_equal(data.raw, values)
+    np.testing.assert_array_equal(data.scaled(2.0, 1.0), (values - 1.0) / 2.0)
+
+
+def test_data_file_is_memory_mapped(data_file):
+    data = mtrx.DataFile(data_file)
+    assert isinstance(data.raw, np.memmap) and not data.raw.flags.owndata
+    image = data.image(16, 8, x_retrace=True, y_retrace=True)
+    assert np.shares_memory(image, data.raw)
+
+
+def test_image(data_file, values):
+    data = mtrx.DataFile(data_file)
+    np.testing.assert_array_equal(data.image(16, 8, x_retrace=True, y_retrace=True), values.reshape(2, 8, 2, 16))
+    np.testing.assert_array_equal(data.image(32, 16), values.reshape(1, 16, 1, 32))
+
+
+def test_data_file_being_written(data_file, values):
+    # Cut short within the thirteenth line, as if still being acquired
+    with open(data_file, 'r+b') as f:
+        f.truncate(os.path.getsize(data_file) - 3 * 2 * 16 * 4 - 2)
+    data = mtrx.DataFile(data_file)
+    assert not data.complete and data.captured_points == values.size - 3 * 2 * 16 - 1
+    image = data.image(16, 8, x_retrace=True, y_retrace=True)
+    assert image.shape == (12, 2, 16)
+    np.testing.assert_array_equal(image, values[:12 * 2 * 16].reshape(12, 2, 16))
+
+
+def test_not_a_matrix_file(tmp_path):
+    path = tmp_path / 'default.Z_mtrx'
+    path.write_bytes(b'Not a MATRIX file')
+    with pytest.raises(ValueError):
+        mtrx.DataFile(str(path))
+    with pytest.raises(ValueError):
+        mtrx.ParameterLog(str(path))
+
+
+@pytest.fixture
+def parameter_file(tmp_path):
+    changes = [(START, 'XYScanner', 'X_Retrace', '', True),
+               (START, 'XYScanner', 'Points', '', 256),
+               (START, 'Comment', 'Text', '', 'Tip pulse'),
+               (START + 1, 'GapVoltageControl', 'Voltage', 'V', 1.5),
+               (START + 2, 'XYScanner', 'Points', '', 512),
+               (START + 3, 'GapVoltageControl', 'Voltage', 'V', -0.5)]
+    bricklets = [(START + 1, 'C:\\Data\\default--1_1.Z_mtrx'), (START + 3, 'default--2_1.Z_mtrx')]
+    path = str(tmp_path / 'default.mtrx')
+    write_parameter_file(path, changes, bricklets)
+    return path
+
+
+def test_parameter_log(parameter_file):
+    log = mtrx.ParameterLog(parameter_file)
+    assert len(log.changes) == 6 and set(log.bricklets) == {'default--1_1.Z_mtrx', 'default--2_1.Z_mtrx'}
+    assert sorted(log.names) == ['Comment.Text', 'GapVoltageControl.Voltage', 'XYScanner.Points',
+                                 'XYScanner.X_Retrace']
+    assert log.changes[1] == mtrx.ParameterChange(START, 1, 'XYScanner', 'Points', '', 256)
+
+
+def test_value_at(parameter_file):
+    log = mtrx.ParameterLog(parameter_file)
+    assert log.value_at('Comment.Text', START - 1) is None
+    assert log.value_at('XYScanner.X_Retrace', START) is True
+    assert log.value_at('XYScanner.Points', START + 1) == 256
+    assert log.value_at('XYScanner.Points', START + 2) == 512
+    assert log.value_at('GapVoltageControl.Voltage', START + 10) == -0.5
+    assert log.parameters_at(START) == {'XYScanner.X_Retrace': True, 'XYScanner.Points': 256,
+                                        'Comment.Text': 'Tip pulse'}
+
+
+def test_parameters_for(parameter_file):
+    log = mtrx.ParameterLog(parameter_file)
+    # Bricklets are logged after the changes of the same second, so see them
+    assert log.parameters_for('default--1_1.Z_mtrx') == {'XYScanner.X_Retrace': True, 'XYScanner.Points': 256,
+                                                         'Comment.Text': 'Tip pulse',
+                                                         'GapVoltageControl.Voltage': 1.5}
+    assert log.parameters_for('D:\\Data\\default--2_1.Z_mtrx')['GapVoltageControl.Voltage'] == -0.5
+
+
+def test_parameters_for_matches_scan(tmp_path):
+    rng = np.random.default_rng(0)
+    changes = [(START + i // 10, f'Element_{i % 7}', 'Value', 'V', float(i)) for i in range(2000)]
+    bricklets = [(changes[i][0], f'default--{n}_1.Z_mtrx')
+                 for n, i in enumerate(sorted(rng.choice(len(changes), 50, replace=False)), 1)]
+    path = str(tmp_path / 'default.mtrx')
+    write_parameter_file(path, changes, bricklets)
+    log = mtrx.ParameterLog(path)
+    for _, filename in bricklets:
+        expected = {}
+        for change in log.changes[:log.bricklets[filename].index]:
+            expected[f"{change.element}.{change.parameter}"] = change.value
+        assert log.parameters_for(filename) == expected
+
+
+def test_parameter_log_being_written(parameter_file):
+    with open(parameter_file, 'r+b') as f:
+        f.truncate(os.path.getsize(parameter_file) - 4)
+    log = mtrx.ParameterLog(parameter_file)
+    assert len(log.changes) == 6 and list(log.bricklets) == ['default--1_1.Z_mtrx']
@@ -0,0 +1,29 @@
+# Oliver Gordon, 2019
+
+import numpy as np
+import pytest
+
+from nOmicron.mate import objects as mo
+from nOmicron.microscope import xy_scanner
+
+
+@pytest.fixture
+def scanner(simulator):
+    mo.xy_scanner.Points(32)
+    mo.xy_scanner.Raster_Time(1e-3)
+    return simulator
+
+
+@pytest.mark.parametrize('x_direction, shape', [("Forward", (8, 32)), ("Backward", (8, 32)),
+                                                ("Forward-Backward", (2, 8, 32))])
+def test_get_xy_scan(scanner, x_direction, shape):
+    xydata = xy_scanner.get_xy_scan(["Z", "I"], x_direction, "Up", num_lines=8)
+    assert sorted(xydata) == ["I", "Z"]
+    assert all(v.shape == shape and np.isfinite(v).all() for v in xydata.values())
+    assert scanner.properties[f'{scanner.scope}.State'] == 'idle' and not scanner.observed
+
+
+def test_iter_xy_scan(scanner):
+    lines = list(xy_scanner.iter_xy_scan("Z", "Forward-Backward", "Up", num_lines=4))
+    assert [(line.x_direction, line.line) for line in lines] == [(x, line) for line in range(4) for x in (0, 1)]
+    assert xy_scanner.assemble_frames(lines, 4, 32, "Forward-Backward", "Up")["Z"].shape == (2, 4, 32)